@@ -1,14 +1,145 @@
+import argparse
+import logging
 import sys
-from PyQt5.QtWidgets import QApplication
-from gui.main_window import MainWindow
 
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Environment Setup Tool")
+    parser.add_argument("--export", dest="export_file", metavar="FILE",
+                        help="export all profiles as JSON lines to FILE ('-' for stdout) and exit")
+    parser.add_argument("--import", dest="import_file", metavar="FILE",
+                        help="import profiles from a JSON lines FILE ('-' for stdin) and exit")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parser processes used by --import and render processes used by --watch "
+                             "(0 works in the main process)")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve rendered setup scripts over HTTP instead of opening the GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port for --serve (default: 8765)")
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                        help="renders --serve runs at the same time (default: 8)")
+    parser.add_argument("--lock", dest="lock_profile", metavar="PROFILE",
+                        help="pin the packages of PROFILE to exact versions for --platform using the "
+                             "metadata --index and store the lockfile with the profile, then exit")
+    parser.add_argument("--platform", default="ubuntu", help="platform for --lock (default: ubuntu)")
+    parser.add_argument("--index", metavar="FILE", help="package metadata index (JSON) for --lock")
+    parser.add_argument("--watch", dest="watch_dir", metavar="DIR",
+                        help="keep the artifacts of every profile up to date in DIR, rebuilding the profiles "
+                             "that change in the database or in a --watch-file")
+    parser.add_argument("--watch-file", dest="watch_files", action="append", default=[], metavar="FILE",
+                        help="exported profiles (JSON lines) that --watch imports whenever they change; repeatable")
+    parser.add_argument("--platforms",
+                        help="comma-separated platforms --watch builds every profile for (default: its own os)")
+    parser.add_argument("--artifact", choices=["archive.zip", "install.sh"], default="archive.zip",
+                        help="what --watch builds (default: archive.zip)")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="seconds without changes before --watch rebuilds (default: 2)")
+    parser.add_argument("--once", action="store_true",
+                        help="with --watch, build what changed since the last run and exit")
+    parser.add_argument("--profile-dir", metavar="DIR",
+                        help="profile each operation with cProfile and tracemalloc, writing to a new run "
+                             "directory under DIR (also enabled by ENV_SETUP_PROFILE_DIR)")
+    args, qt_args = parser.parse_known_args()
+
+    # Modules only create named loggers; the application owns the logging configuration
+    logging.basicConfig(level=logging.INFO)
+    if args.profile_dir:
+        from backend import profiling
+        profiling.enable(args.profile_dir)
+
+    if args.export_file:
+        sys.exit(export_profiles(args.export_file))
+    if args.import_file:
+        sys.exit(import_profiles(args.import_file, args.workers))
+    if args.lock_profile:
+        if not args.index:
+            parser.error("--lock requires --index")
+        sys.exit(lock_profile(args.lock_profile, args.platform.lower(), args.index))
+    if args.watch_dir:
+        from backend.artifact_watcher import run_artifact_watcher
+        from backend.render_service import PLATFORMS
+        platforms = [platform.strip().lower() for platform in (args.platforms or "").split(",") if platform.strip()]
+        unknown = [platform for platform in platforms if platform not in PLATFORMS]
+        if unknown:
+            parser.error(f"unknown platforms for --platforms: {', '.join(unknown)}")
+        sys.exit(run_artifact_watcher(args.watch_dir, args.watch_files, platforms or None, args.artifact,
+                                      args.workers, args.debounce, args.once))
+    if args.serve:
+        from backend.render_service import run_render_service
+        run_render_service(args.host, args.port, args.max_concurrency)
+        return
+
+    from PyQt5.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+
+    app = QApplication(sys.argv[:1] + qt_args)
     main_window = MainWindow()
     main_window.show()
     sys.exit(app.exec_())
 
 
+def export_profiles(path):
+    from backend.profiling import profiled
+    from database.db_manager import DBManager
+    from database import profile_transfer
+
+    db_manager = DBManager()
+    with profiled("export"):
+        if path == "-":
+            profile_transfer.export_profiles(db_manager, sys.stdout)
+        else:
+            with open(path, "w") as output_file:
+                profile_transfer.export_profiles(db_manager, output_file,
+                                                 progress=profile_transfer.print_progress)
+            sys.stderr.write("\n")
+    return 0
+
+
+def import_profiles(path, workers):
+    from backend.profiling import profiled
+    from database.db_manager import DBManager
+    from database import profile_transfer
+
+    db_manager = DBManager()
+    with profiled("import"):
+        if path == "-":
+            report = profile_transfer.import_profiles(db_manager, sys.stdin, workers,
+                                                      progress=profile_transfer.print_progress)
+        else:
+            with open(path) as input_file:
+                report = profile_transfer.import_profiles(db_manager, input_file, workers,
+                                                          progress=profile_transfer.print_progress)
+    sys.stderr.write("\n")
+    for line_number, message in report.errors:
+        location = f"line {line_number}" if line_number else "inheritance"
+        sys.stderr.write(f"Invalid record ({location}): {message}\n")
+    sys.stderr.write(f"Imported {report.imported} profiles in {report.elapsed:.1f}s "
+                     f"({report.rate:.0f} profiles/s), {len(report.errors)} invalid.\n")
+    return 1 if report.errors else 0
+
+
+def lock_profile(profile_name, platform, index_path):
+    from backend.lockfile import LockError, MetadataIndex, lock_packages
+    from backend.profiling import profiled
+    from database.db_manager import DBManager
+
+    db_manager = DBManager()
+    with profiled(f"lock:{profile_name}:{platform}"):
+        profile = db_manager.load_profile(profile_name)
+        if profile is None:
+            sys.stderr.write(f"Profile '{profile_name}' not found.\n")
+            return 1
+        try:
+            lock = lock_packages(profile['packages'], platform, MetadataIndex.load(index_path))
+        except LockError as e:
+            for problem in e.problems:
+                sys.stderr.write(f"Cannot lock {problem}\n")
+            return 1
+        db_manager.save_lockfile(profile_name, platform, lock)
+    sys.stderr.write(f"Locked {len(lock['packages'])} packages and {len(lock['artifacts'])} downloads "
+                     f"of '{profile_name}' for {platform}.\n")
+    return 0
+
+
 if __name__ == "__main__":
     main()
@@ -1,23 +1,43 @@
 import shutil
 import os
+import io
+import zipfile
 import logging
+from backend.instrumentation import instrumented
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class ArchiveBuilder:
     def __init__(self, output_dir="output"):
         self.output_dir = output_dir
 
+    @instrumented("archive_builder.create_archive")
     def create_archive(self, archive_name="environment_setup.zip"):
         try:
             base_name = os.path.splitext(archive_name)[0]
             # Create the archive outside the output directory
             shutil.make_archive(base_name, 'zip', self.output_dir)
-            logging.info(f"Archive '{archive_name}' created successfully.")
+            logger.info(f"Archive '{archive_name}' created successfully.")
         except Exception as e:
-            logging.error(f"Error creating archive '{archive_name}': {str(e)}")
+            logger.error(f"Error creating archive '{archive_name}': {str(e)}")
+            raise e
+
+    @instrumented("archive_builder.create_archive_bytes")
+    def create_archive_bytes(self, files):
+        """Builds a zip archive in memory from a mapping of archive member name to content."""
+        try:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name, content in files.items():
+                    # A fixed timestamp keeps identical content byte-identical across builds
+                    member = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+                    member.external_attr = 0o100755 << 16  # Keep scripts executable when extracted
+                    member.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(member, content)
+            return buffer.getvalue()
+        except Exception as e:
+            logger.error(f"Error creating in-memory archive: {str(e)}")
             raise e
 
     def add_file_to_output(self, file_path):
@@ -28,9 +48,9 @@ class ArchiveBuilder:
             dest_path = os.path.join(self.output_dir, os.path.basename(file_path))
             if os.path.abspath(file_path) != os.path.abspath(dest_path):
                 shutil.copy(file_path, dest_path)
-                logging.info(f"File '{file_path}' copied to '{self.output_dir}'.")
+                logger.info(f"File '{file_path}' copied to '{self.output_dir}'.")
             else:
-                logging.info(f"File '{file_path}' is already in '{self.output_dir}'. Skipping copy.")
+                logger.info(f"File '{file_path}' is already in '{self.output_dir}'. Skipping copy.")
         except Exception as e:
-            logging.error(f"Error adding file '{file_path}' to output: {str(e)}")
+            logger.error(f"Error adding file '{file_path}' to output: {str(e)}")
             raise e
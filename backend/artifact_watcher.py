@@ -0,0 +1,298 @@
+"""
+Headless watch mode: keeps rendered artifacts (archive.zip or install.sh) of every profile up to
+date in an output directory, for CI jobs that publish them.
+
+Every stored change of a profile or its lockfile appends a row to the profile_changes table (see
+database.models.ProfileChange). The watcher polls that table for rows after the last sequence
+number it built, and re-imports watched JSON lines exports (see database.profile_transfer) when
+their size or modification time changes; unchanged records are skipped, so only edited profiles
+show up as changes. A changed profile affects itself and every profile that inherits from it, on
+each platform it is built for. Changes are collected until none arrived for ``debounce`` seconds
+(or ``max_delay`` passed since the first), then the affected profile/platform pairs are rendered
+by a pool of worker processes.
+
+Artifacts are written to <output_dir>/<profile>/<platform>/<artifact>. The sequence number that
+has been built, and the state of the watched files, are kept in <output_dir>/.watch_state.json,
+so a restarted watcher continues where it stopped; without that file everything is built once.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.instrumentation import instrumented
+from backend.lockfile import apply_lock
+from backend.render_service import PLATFORMS, render_artifact
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS = ("archive.zip", "install.sh")
+STATE_FILE = ".watch_state.json"
+POLL_INTERVAL = 0.5
+DEBOUNCE_DELAY = 2.0
+MAX_DEBOUNCE_DELAY = 30.0
+
+
+def affected_profiles(changed, graph):
+    """Returns the ``changed`` profiles and every profile that inherits from one of them, directly or not."""
+    children = defaultdict(list)
+    for name, parents in graph.items():
+        for parent in parents:
+            children[parent].append(name)
+    affected = set()
+    pending = list(changed)
+    while pending:
+        name = pending.pop()
+        if name not in affected:
+            affected.add(name)
+            pending.extend(children.get(name, ()))
+    return affected
+
+
+def profile_dir(output_dir, profile_name):
+    return os.path.join(output_dir, re.sub(r'[^\w\-]', '_', profile_name))
+
+
+def build_artifact(profile_data, platform, artifact, lock, path):
+    """Renders one artifact and replaces ``path`` with it atomically. Runs in the worker processes."""
+    if lock:
+        profile_data = dict(profile_data, packages=apply_lock(profile_data['packages'], lock))
+    body = render_artifact(profile_data, platform, artifact)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as artifact_file:
+        artifact_file.write(body)
+    os.replace(partial_path, path)
+    return len(body)
+
+
+class WatchReport:
+    def __init__(self):
+        self.built = []  # (profile_name, platform)
+        self.removed = []  # Profiles that no longer exist
+        self.errors = []  # (profile_name, platform or None if the profile failed to load, message)
+        self.elapsed = 0.0
+
+
+class ArtifactWatcher:
+    def __init__(self, db_manager, output_dir, watch_files=(), platforms=None, artifact="archive.zip",
+                 workers=None, debounce=DEBOUNCE_DELAY, max_delay=MAX_DEBOUNCE_DELAY, interval=POLL_INTERVAL):
+        if artifact not in ARTIFACTS:
+            raise ValueError(f"Unknown artifact '{artifact}', expected one of {', '.join(ARTIFACTS)}.")
+        for platform in platforms or []:
+            if platform not in PLATFORMS:
+                raise ValueError(f"Unknown platform '{platform}'.")
+        self.db_manager = db_manager
+        self.output_dir = output_dir
+        self.watch_files = [os.path.abspath(path) for path in watch_files]
+        self.platforms = list(platforms) if platforms else None  # None builds each profile for its own os
+        self.artifact = artifact
+        self.workers = workers  # 0 renders in this process
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.interval = interval
+        self.sequence = None  # Latest change seen by poll()
+        self.built_sequence = None  # Latest change whose artifacts are built
+        self.file_stats = {}  # Watched path -> [mtime_ns, size] when it was last imported
+        self._executor = None
+
+    @property
+    def state_path(self):
+        return os.path.join(self.output_dir, STATE_FILE)
+
+    def run(self, once=False, should_stop=lambda: False):
+        """
+        Builds what changed since the last run, then (unless ``once``) keeps polling until
+        ``should_stop()`` returns True. Returns the report of the last build.
+        """
+        report = self.catch_up()
+        if once:
+            return report
+        pending = set()
+        first_change = last_change = None
+        while not should_stop():
+            time.sleep(self.interval)
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                pending |= changed
+                last_change = now
+                first_change = first_change or now
+            # A burst of changes is built once, after it has been quiet for the debounce delay
+            if pending and (now - last_change >= self.debounce or now - first_change >= self.max_delay):
+                report = self.rebuild(pending, self.sequence)
+                pending = set()
+                first_change = last_change = None
+        return report
+
+    def catch_up(self):
+        """Imports changed watched files, then builds everything changed since the saved state."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = self._load_state()
+        self.file_stats = state.get('files', {})
+        self._import_changed_files()
+        if state.get('sequence') is None:
+            self.sequence = self.db_manager.get_change_sequence()
+            logger.info(f"No watch state in {self.output_dir}, building every profile.")
+            return self.rebuild(self.db_manager.get_all_profiles(), self.sequence)
+        self.sequence = self.built_sequence = state['sequence']
+        changed = self.poll()
+        if not changed:
+            logger.info(f"Artifacts in {self.output_dir} are up to date.")
+            return WatchReport()
+        return self.rebuild(changed, self.sequence)
+
+    def poll(self):
+        """Returns the names of the profiles changed since the last poll, importing changed watched files first."""
+        self.db_manager.refresh()
+        self._import_changed_files()
+        changes = self.db_manager.get_changes(self.sequence or 0)
+        if not changes:
+            return set()
+        self.sequence = changes[-1][0]
+        return {profile_name for _, profile_name in changes}
+
+    @instrumented("watcher.rebuild")
+    def rebuild(self, changed, sequence):
+        """Renders the artifacts of the changed profiles and their children, then records ``sequence`` as built."""
+        started = time.perf_counter()
+        report = WatchReport()
+        affected = affected_profiles(changed, self.db_manager.get_parent_graph())
+        jobs = []
+        for profile_name in sorted(affected):
+            # A profile that cannot be resolved (e.g. a parent is missing) fails alone, the others still build
+            try:
+                profile_jobs = self._profile_jobs(profile_name, report)
+            except Exception as e:
+                report.errors.append((profile_name, None, str(e)))
+                logger.error(f"Error loading profile '{profile_name}': {str(e)}")
+                continue
+            jobs.extend(profile_jobs)
+
+        for (profile_name, platform, _), outcome in zip(jobs, self._run_jobs([job[2] for job in jobs])):
+            if isinstance(outcome, Exception):
+                report.errors.append((profile_name, platform, str(outcome)))
+                logger.error(f"Error building {self.artifact} of '{profile_name}' for {platform}: {str(outcome)}")
+            else:
+                report.built.append((profile_name, platform))
+
+        # Failed builds are not retried until their profile changes again, like a failed CI run
+        self.built_sequence = sequence
+        self._save_state()
+        report.elapsed = time.perf_counter() - started
+        logger.info(f"Built {len(report.built)} artifacts for {len(changed)} changed profiles "
+                    f"({len(affected)} with children) in {report.elapsed:.2f}s, {len(report.errors)} failed.")
+        return report
+
+    def _profile_jobs(self, profile_name, report):
+        profile_data = self.db_manager.load_profile(profile_name)
+        if profile_data is None:
+            shutil.rmtree(profile_dir(self.output_dir, profile_name), ignore_errors=True)
+            report.removed.append(profile_name)
+            return []
+        platforms = self.platforms or [profile_data['os']]
+        self._remove_other_platforms(profile_name, platforms)
+        jobs = []
+        for platform in platforms:
+            path = os.path.join(profile_dir(self.output_dir, profile_name), platform, self.artifact)
+            lock = self.db_manager.load_lockfile(profile_name, platform)
+            jobs.append((profile_name, platform, (profile_data, platform, self.artifact, lock, path)))
+        return jobs
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _run_jobs(self, jobs):
+        """Returns the size of each built artifact, or the exception that stopped it, in job order."""
+        if self.workers == 0 or len(jobs) <= 1:
+            outcomes = []
+            for job in jobs:
+                try:
+                    outcomes.append(build_artifact(*job))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+        if self._executor is None:
+            # Kept for the lifetime of the watcher, so rebuilds do not pay for starting processes
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        futures = [self._executor.submit(build_artifact, *job) for job in jobs]
+        return [future.exception() or future.result() for future in futures]
+
+    def _import_changed_files(self):
+        from database import profile_transfer
+
+        for path in self.watch_files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            file_stat = [stat.st_mtime_ns, stat.st_size]
+            if self.file_stats.get(path) == file_stat:
+                continue
+            try:
+                with open(path) as input_file:
+                    report = profile_transfer.import_profiles(self.db_manager, input_file, workers=0,
+                                                              skip_unchanged=True)
+            except Exception as e:
+                # Retried once the file changes again; the other files still import
+                logger.error(f"Error importing profiles from {path}: {str(e)}")
+                self.file_stats[path] = file_stat
+                continue
+            for line_number, message in report.errors:
+                logger.error(f"Invalid record in {path} ({f'line {line_number}' if line_number else 'inheritance'}): "
+                             f"{message}")
+            logger.info(f"Imported {report.imported} changed profiles from {path}.")
+            self.file_stats[path] = file_stat
+
+    def _remove_other_platforms(self, profile_name, platforms):
+        # A profile built for its own os leaves the old platform behind when the os changes
+        directory = profile_dir(self.output_dir, profile_name)
+        if os.path.isdir(directory):
+            for platform in os.listdir(directory):
+                if platform not in platforms:
+                    shutil.rmtree(os.path.join(directory, platform), ignore_errors=True)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return {}
+        # Artifacts built for other platforms or another artifact type do not count
+        if state.get('platforms') != self.platforms or state.get('artifact') != self.artifact:
+            return {}
+        return state
+
+    def _save_state(self):
+        state = {
+            'sequence': self.built_sequence,
+            'platforms': self.platforms,
+            'artifact': self.artifact,
+            'files': self.file_stats,
+        }
+        partial_path = self.state_path + ".partial"
+        with open(partial_path, "w") as state_file:
+            json.dump(state, state_file, indent=2)
+        os.replace(partial_path, self.state_path)
+
+
+def run_artifact_watcher(output_dir, watch_files=(), platforms=None, artifact="archive.zip", workers=None,
+                         debounce=DEBOUNCE_DELAY, once=False):
+    """Runs the watcher on the default database until interrupted; returns 1 if the last build had errors."""
+    from database.db_manager import DBManager
+
+    watcher = ArtifactWatcher(DBManager(), output_dir, watch_files, platforms, artifact, workers, debounce)
+    try:
+        report = watcher.run(once=once)
+    except KeyboardInterrupt:
+        logger.info("Artifact watcher stopped.")
+        return 0
+    finally:
+        watcher.close()
+    return 1 if report.errors else 0
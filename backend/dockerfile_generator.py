@@ -0,0 +1,148 @@
+import hashlib
+import os
+import logging
+import posixpath
+import zlib
+from urllib.parse import urlsplit
+from backend.instrumentation import instrumented
+from backend.profile_ir import InstallFromUrl, InstallPackage, compile_profile
+
+logger = logging.getLogger(__name__)
+
+BASE_IMAGES = {
+    "ubuntu": "ubuntu:22.04",
+    "debian": "debian:bookworm",
+    "rhel": "registry.access.redhat.com/ubi9/ubi",
+    "centos": "quay.io/centos/centos:stream9",
+    "fedora": "fedora:latest",
+    "arch": "archlinux:latest",
+}
+# Package groups, and so install layers, stay below these counts on average (Docker allows 127 layers)
+MAX_PACKAGE_LAYERS = 16
+MAX_DOWNLOAD_LAYERS = 8
+MIN_GROUP_SPREAD = 8
+CONTEXT_DIR = "setup"
+LINE_CONTINUATION = " \\\n    "
+
+
+def group_packages(operations, max_groups=MAX_PACKAGE_LAYERS):
+    """
+    Sorts package operations by name and splits them into groups. A group ends after every name
+    whose CRC32 is a multiple of the spread, so a boundary depends only on the name at it: adding,
+    removing or re-pinning one package changes only the group it falls into. The spread is a power
+    of two, so the boundaries of a larger spread are a subset of those of a smaller one.
+    """
+    operations = sorted(operations, key=lambda operation: operation.name)
+    spread = MIN_GROUP_SPREAD
+    while len(operations) > spread * max_groups:
+        spread *= 2
+    groups, group = [], []
+    for operation in operations:
+        group.append(operation)
+        if zlib.crc32(operation.name.encode()) % spread == 0:
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _url_file_name(url):
+    # ADD names a downloaded file after the last segment of the URL path
+    return posixpath.basename(urlsplit(url).path)
+
+
+class DockerfileGenerator:
+    """
+    Builds a Dockerfile and its build context from a profile, as ScriptGenerator builds install.sh.
+    Steps that rarely change come first so Docker reuses their layers: the base image, the sorted
+    package groups, packages installed from URLs, then symlinks, environment variables and the
+    custom commands, which change most often.
+    """
+
+    def __init__(self, package_manager, symlinks, env_vars, custom_commands):
+        self.package_manager = package_manager
+        self.symlinks = symlinks
+        self.env_vars = env_vars
+        self.custom_commands = custom_commands
+
+    def compile(self, packages):
+        return compile_profile(packages, self.env_vars, self.symlinks, self.custom_commands)
+
+    def layers(self, packages, ir=None):
+        """Returns the Dockerfile instructions, one string per build step, in build order."""
+        return self._build(ir or self.compile(packages))[0]
+
+    def context_files(self, packages, ir=None):
+        """Returns the build context as a mapping of relative path to content, Dockerfile included."""
+        layers, scripts = self._build(ir or self.compile(packages))
+        return dict({"Dockerfile": "\n\n".join(layers) + "\n"}, **scripts)
+
+    def _build(self, ir):
+        platform = self.package_manager.platform
+        if platform not in BASE_IMAGES:
+            raise ValueError(f"Container images are not supported for platform '{platform}'.")
+        backend = self.package_manager.backend
+        layers = [f"FROM {BASE_IMAGES[platform]}"]
+        scripts = {}
+        if platform in ("ubuntu", "debian"):
+            layers.append("ENV DEBIAN_FRONTEND=noninteractive")
+
+        # Packages from the package manager, in groups that change independently
+        from_manager = [operation for operation in ir['packages'] if isinstance(operation, InstallPackage)]
+        for group in group_packages(from_manager):
+            package_list = LINE_CONTINUATION.join(backend.format_package(operation) for operation in group)
+            layers.append(f"RUN {backend.container_install_command(package_list)}")
+
+        # Packages from download URLs, grouped the same way; the image runs as root, so no sudo
+        downloads = [operation for operation in ir['packages'] if isinstance(operation, InstallFromUrl)]
+        for group in group_packages(downloads, MAX_DOWNLOAD_LAYERS):
+            steps = [backend.verify_command(op, f"/tmp/downloads/{_url_file_name(op.url)}", " && ")
+                     + backend.unpack_command(op, f"/tmp/downloads/{_url_file_name(op.url)}", "/opt/") + " && "
+                     f"ln -s /opt/{op.name}/bin/{op.name} /usr/local/bin/{op.name}" for op in group]
+            layers.append(f"ADD {LINE_CONTINUATION.join(op.url for op in group)} /tmp/downloads/\n"
+                          f"RUN {(' &&' + LINE_CONTINUATION).join(steps)} && rm -rf /tmp/downloads")
+
+        if ir['symlinks']:
+            script = "#!/bin/sh\nset -e\n" + "".join(
+                f'mkdir -p "$(dirname "{link}")"\nln -sf "{target}" "{link}"\n' for link, target in ir['symlinks'])
+            layers.append(self._run_context_script(scripts, "symlinks.sh", script, "sh"))
+        if ir['env_vars']:
+            layers.append("ENV " + LINE_CONTINUATION.join(self._env_assignment(operation)
+                                                          for operation in ir['env_vars']))
+        if ir['custom_commands']:
+            script = "#!/bin/bash\nset -e\n" + "".join(operation.command + "\n" for operation in ir['custom_commands'])
+            layers.append(self._run_context_script(scripts, "commands.sh", script, "bash"))
+        return layers, scripts
+
+    @instrumented("dockerfile_generator.generate_context")
+    def generate_context(self, packages, output_dir):
+        """Writes the Dockerfile and its context files into ``output_dir``."""
+        try:
+            for relative_path, content in self.context_files(packages).items():
+                path = os.path.join(output_dir, relative_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as context_file:
+                    context_file.write(content)
+                if path.endswith(".sh"):
+                    os.chmod(path, 0o755)
+            logger.info(f"Dockerfile and build context generated in {output_dir}")
+        except Exception as e:
+            logger.error(f"Error generating Dockerfile: {str(e)}")
+            raise e
+
+    def _run_context_script(self, scripts, name, script, shell):
+        # COPY caches on the file's content, so the step only reruns when the script changes. The
+        # digest comment makes that visible in the Dockerfile too.
+        relative_path = f"{CONTEXT_DIR}/{name}"
+        scripts[relative_path] = script
+        digest = hashlib.sha256(script.encode()).hexdigest()[:16]
+        path = f"/tmp/{relative_path}"
+        return f"# {relative_path} sha256:{digest}\nCOPY {relative_path} {path}\nRUN {shell} {path} && rm -f {path}"
+
+    def _env_assignment(self, operation):
+        value = operation.value.replace("\\", "\\\\").replace('"', '\\"')
+        if operation.name == "PATH":
+            # The install script prepends to PATH as well
+            return f'PATH="{value}:$PATH"'
+        return f'{operation.name}="{value}"'
@@ -0,0 +1,247 @@
+"""
+Metrics and tracing for DB access, script generation, package manager subprocesses and
+archiving. Disabled by default; enable with ENV_SETUP_METRICS=1 or by calling ``enable()``.
+ENV_SETUP_SPANS_FILE=<path> appends finished spans as JSON lines and ENV_SETUP_METRICS_FILE=<path>
+writes the Prometheus text exposition at exit. While disabled, an instrumented call costs one
+attribute check.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_BUFFERED_SPANS = 10000
+
+
+class _State:
+    enabled = False
+    span_file = None
+
+
+_state = _State()
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+class MetricsRegistry:
+    """Counters and latency histograms keyed by metric name and a sorted tuple of labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class Span:
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start", "duration", "status",
+                 "_started", "_token")
+
+    def __init__(self, name, attributes):
+        parent = _current_span.get()
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.status = "ok"
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+        metrics.inc("env_setup_operations_total", operation=self.name, status=self.status)
+        metrics.observe("env_setup_operation_duration_seconds", self.duration, operation=self.name)
+        spans.record(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+class SpanRecorder:
+    """Keeps the most recent finished spans and optionally appends each one to a JSON lines file."""
+
+    def __init__(self, max_spans=MAX_BUFFERED_SPANS):
+        self._lock = threading.Lock()
+        self.finished = deque(maxlen=max_spans)
+
+    def record(self, span):
+        span_dict = span.to_dict()
+        with self._lock:
+            self.finished.append(span_dict)
+            if _state.span_file:
+                try:
+                    with open(_state.span_file, "a") as span_file:
+                        span_file.write(json.dumps(span_dict) + "\n")
+                except OSError as e:
+                    logger.error(f"Error writing span to '{_state.span_file}': {str(e)}")
+
+    def export_json(self):
+        with self._lock:
+            return "".join(json.dumps(span_dict) + "\n" for span_dict in self.finished)
+
+    def reset(self):
+        with self._lock:
+            self.finished.clear()
+
+
+metrics = MetricsRegistry()
+spans = SpanRecorder()
+_NOOP_SPAN = _NoopSpan()
+
+
+def enable(span_file=None):
+    _state.span_file = span_file
+    _state.enabled = True
+
+
+def disable():
+    _state.enabled = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def span(name, **attributes):
+    """Context manager timing a block as an operation; a shared no-op when instrumentation is off."""
+    if not _state.enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def instrumented(name):
+    """Decorator recording each call of a function or coroutine function as a span named ``name``."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _state.enabled:
+                    return await func(*args, **kwargs)
+                with Span(name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(path):
+    try:
+        with open(path, "w") as metrics_file:
+            metrics_file.write(metrics.render_prometheus())
+    except OSError as e:
+        logger.error(f"Error writing metrics to '{path}': {str(e)}")
+
+
+if os.environ.get("ENV_SETUP_METRICS", "") not in ("", "0"):
+    enable(os.environ.get("ENV_SETUP_SPANS_FILE") or None)
+    if os.environ.get("ENV_SETUP_METRICS_FILE"):
+        atexit.register(write_prometheus, os.environ["ENV_SETUP_METRICS_FILE"])
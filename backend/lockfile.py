@@ -0,0 +1,145 @@
+"""
+Lockfiles pin every package of a profile to an exact version for one platform, so targets install
+the same versions without resolving anything themselves. Versions come from a local metadata
+index, a JSON file captured once from the package repositories (or written by hand for tests):
+
+    {
+      "platforms": {"ubuntu": {"git": ["1:2.34.1-1ubuntu1", "1:2.39.2-1ubuntu1"]}, ...},
+      "artifacts": {"https://example.com/tool.tar.gz": "<sha256>"}
+    }
+
+Packages with a download URL are locked to the sha256 of their archive, taken from the index's
+artifacts or computed by downloading the archive once.
+"""
+import hashlib
+import json
+import logging
+import re
+import urllib.request
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+LOCKFILE_VERSION = 1
+FETCH_TIMEOUT = 30.0
+CHUNK_SIZE = 64 * 1024
+VERSION_PART = re.compile(r"(\d+)|([A-Za-z]+)|(~)")
+
+
+def version_key(version):
+    """
+    Sort key approximating dpkg/rpm version ordering: an optional epoch, then numeric parts
+    compared as numbers, letters as text, and '~' before anything (pre-releases).
+    """
+    epoch, _, rest = version.rpartition(":")
+    parts = []
+    for number, letters, tilde in VERSION_PART.findall(rest):
+        if number:
+            parts.append((2, int(number), ""))
+        elif letters:
+            parts.append((1, 0, letters))
+        else:
+            parts.append((-1, 0, ""))
+    # The end of the version sorts after '~' but before any further part: 1.9~rc1 < 1.9 < 1.9a < 1.9.1
+    parts.append((0, 0, ""))
+    return int(epoch) if epoch.isdigit() else 0, parts
+
+
+class MetadataIndex:
+    def __init__(self, platforms=None, artifacts=None):
+        self.platforms = platforms or {}
+        self.artifacts = artifacts or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as index_file:
+            data = json.load(index_file)
+        return cls(data.get('platforms'), data.get('artifacts'))
+
+    def versions(self, platform, name):
+        return self.platforms.get(platform, {}).get(name, [])
+
+    def latest(self, platform, name):
+        versions = self.versions(platform, name)
+        return max(versions, key=version_key) if versions else None
+
+
+class LockError(ValueError):
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def fetch_sha256(url, timeout=FETCH_TIMEOUT):
+    """Downloads ``url`` (http, https or file) and returns the sha256 of its content."""
+    digest = hashlib.sha256()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lock_packages(packages, platform, index, fetch=fetch_sha256):
+    """
+    Resolves every package to an exact version (the newest in the index unless the profile pins
+    one) and every download URL to a sha256. Raises LockError listing all unresolvable packages.
+    """
+    locked, artifacts, problems = {}, {}, []
+    for package in packages:
+        name, version, url = package['name'], package.get('version', ''), package.get('download_url', '')
+        if url:
+            sha256 = index.artifacts.get(url)
+            if sha256 is None:
+                try:
+                    sha256 = fetch(url)
+                except Exception as e:
+                    problems.append(f"{name}: cannot download {url} ({str(e)})")
+                    continue
+            artifacts[name] = {'url': url, 'sha256': sha256}
+        elif version:
+            known = index.versions(platform, name)
+            if known and version not in known:
+                problems.append(f"{name}: pinned version {version} is not in the index for {platform}")
+                continue
+            locked[name] = version
+        else:
+            version = index.latest(platform, name)
+            if version is None:
+                problems.append(f"{name}: not in the index for {platform}")
+                continue
+            locked[name] = version
+    if problems:
+        raise LockError(problems)
+    logger.info(f"Locked {len(locked)} packages and {len(artifacts)} downloads for {platform}.")
+    return {
+        'version': LOCKFILE_VERSION,
+        'platform': platform,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'packages': locked,
+        'artifacts': artifacts,
+    }
+
+
+def apply_lock(packages, lock):
+    """
+    Returns copies of ``packages`` pinned to the lock's versions and archive hashes. Raises
+    LockError if the profile changed since it was locked (new packages, other pins or URLs).
+    """
+    pinned, problems = [], []
+    for package in packages:
+        name, version, url = package['name'], package.get('version', ''), package.get('download_url', '')
+        if url:
+            artifact = lock['artifacts'].get(name)
+            if artifact is None or artifact['url'] != url:
+                problems.append(f"{name}: download URL is not in the lockfile")
+                continue
+            pinned.append(dict(package, sha256=artifact['sha256']))
+        else:
+            locked_version = lock['packages'].get(name)
+            if locked_version is None or (version and version != locked_version):
+                problems.append(f"{name}: {'version ' + version if version else 'package'} is not in the lockfile")
+                continue
+            pinned.append(dict(package, version=locked_version))
+    if problems:
+        raise LockError([f"The lockfile for {lock['platform']} is out of date, lock the profile again"] + problems)
+    return pinned
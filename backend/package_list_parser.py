@@ -0,0 +1,114 @@
+"""
+Parses package lists captured on existing machines into profile package entries:
+
+    dpkg-selections   dpkg --get-selections               name<TAB>install
+    dpkg-query        dpkg-query -W                       name<TAB>version
+    rpm               rpm -qa                             name-version-release.arch
+    pacman            pacman -Q                           name version
+    brew              brew list --versions                name version [version ...]
+    brewfile          Brewfile / brew bundle dump         brew "name" / cask "name"
+    names             one package name per line
+
+Input is consumed line by line, so a file object can be parsed without reading it into memory.
+"""
+import logging
+import re
+import shlex
+from backend.profile_entries import Package
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ["auto", "dpkg-selections", "dpkg-query", "rpm", "pacman", "brew", "brewfile", "names"]
+DPKG_SELECTION_STATES = {"install", "hold", "deinstall", "purge"}
+BREWFILE_ENTRIES = {"brew", "cask"}
+BREWFILE_IGNORED = {"tap", "mas", "vscode", "whalebrew", "cask_args"}
+RPM_PACKAGE = re.compile(r"^(?P<name>.+)-(?P<version>[^-]+)-(?P<release>[^-]+)\.(?P<arch>[A-Za-z0-9_]+)$")
+
+
+class PackageListReport:
+    def __init__(self):
+        self.packages = []
+        self.duplicates = 0
+        self.existing = 0
+        self.skipped = []  # (line_number, line) pairs that are not package entries
+
+
+def detect_format(line):
+    """Guesses the list format from its first entry (with only the line ending removed)."""
+    fields = line.split()
+    if fields[0] in BREWFILE_ENTRIES | BREWFILE_IGNORED and '"' in line:
+        return "brewfile"
+    # dpkg-query prints "name<TAB>" for removed packages that kept their config files
+    if "\t" in line:
+        return "dpkg-selections" if fields[-1] in DPKG_SELECTION_STATES else "dpkg-query"
+    if len(fields) > 2:
+        return "brew"
+    if len(fields) == 2:
+        return "pacman"
+    if RPM_PACKAGE.match(fields[0]):
+        return "rpm"
+    return "names"
+
+
+def parse_line(line, list_format):
+    """Returns (name, version) for a package entry, (name, version, repo_url) for Brewfile entries, or None."""
+    fields = line.split()
+    if list_format == "dpkg-selections":
+        if len(fields) != 2 or fields[1] not in ("install", "hold"):
+            return None
+        return fields[0], ""
+    if list_format == "dpkg-query":
+        # An empty version is a removed package whose config files are still there
+        return (fields[0], fields[1]) if len(fields) == 2 else None
+    if list_format == "rpm":
+        match = RPM_PACKAGE.match(fields[0]) if len(fields) == 1 else None
+        if not match or match.group("name") == "gpg-pubkey":  # Imported signing keys are not packages
+            return None
+        return match.group("name"), f"{match.group('version')}-{match.group('release')}"
+    if list_format in ("pacman", "brew"):
+        if len(fields) < 2:
+            return None
+        return fields[0], fields[-1]  # brew lists every installed version, the newest last
+    if list_format == "brewfile":
+        try:
+            tokens = shlex.split(line, comments=True)  # brew "name", args: [...]  # comment
+        except ValueError:
+            return None
+        if len(tokens) < 2 or tokens[0] not in BREWFILE_ENTRIES:
+            return None
+        # Casks keep their kind through repo_url, which the macOS backend reads back (see brew_tap)
+        return tokens[1].rstrip(","), "", "homebrew/cask" if tokens[0] == "cask" else ""
+    return (fields[0], "") if len(fields) == 1 else None
+
+
+def parse_package_list(lines, list_format="auto", pin_versions=True, existing_packages=()):
+    """
+    Parses an iterable of lines into new package entries. Packages are deduplicated by name (the
+    first occurrence wins) and names already in ``existing_packages`` are left out.
+    """
+    report = PackageListReport()
+    seen = {package['name'] for package in existing_packages}
+    listed = set()
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if list_format == "auto":
+            list_format = detect_format(line)
+            logger.info(f"Detected package list format: {list_format}")
+        entry = parse_line(line, list_format)
+        if entry is None:
+            report.skipped.append((line_number, line))
+            continue
+        name, version = entry[:2]
+        if name in listed:
+            report.duplicates += 1
+            continue
+        listed.add(name)
+        if name in seen:
+            report.existing += 1
+            continue
+        report.packages.append(Package(name, version if pin_versions else "", entry[2] if len(entry) > 2 else ""))
+    logger.info(f"Parsed {len(report.packages)} new packages ({report.duplicates} duplicates, "
+                f"{report.existing} already in the profile, {len(report.skipped)} lines skipped).")
+    return report
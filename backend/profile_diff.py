@@ -0,0 +1,99 @@
+from collections import Counter
+
+
+class ProfileDiff:
+    """Structural differences between two resolved profile views."""
+
+    def __init__(self):
+        self.os_change = None  # (old_os, new_os) when the platform changed
+        self.packages_added = []
+        self.packages_removed = []
+        self.packages_repinned = []  # (old_package, new_package) with a different version
+        self.packages_changed = []  # (old_package, new_package) with different repo or download URLs
+        self.env_vars_added = {}
+        self.env_vars_removed = {}
+        self.env_vars_changed = {}  # name -> (old_value, new_value)
+        self.symlinks_added = []
+        self.symlinks_removed = []
+        self.commands_added = []
+        self.commands_removed = []
+
+    def is_empty(self):
+        return not (self.os_change or self.packages_added or self.packages_removed or self.packages_repinned
+                    or self.packages_changed or self.env_vars_added or self.env_vars_removed
+                    or self.env_vars_changed or self.symlinks_added or self.symlinks_removed
+                    or self.commands_added or self.commands_removed)
+
+    def summary(self):
+        """Returns a human readable, line-per-change description of the diff."""
+        lines = []
+        if self.os_change:
+            lines.append(f"~ os: {self.os_change[0]} -> {self.os_change[1]}")
+        lines += [f"+ package {pkg['name']} {pkg.get('version', '')}".rstrip() for pkg in self.packages_added]
+        lines += [f"- package {pkg['name']}" for pkg in self.packages_removed]
+        lines += [f"~ package {new['name']}: {old.get('version') or 'latest'} -> {new.get('version') or 'latest'}"
+                  for old, new in self.packages_repinned]
+        lines += [f"~ package {new['name']}: source changed" for old, new in self.packages_changed]
+        lines += [f"+ env {name}={value['value']}" for name, value in self.env_vars_added.items()]
+        lines += [f"- env {name}" for name in self.env_vars_removed]
+        lines += [f"~ env {name}: {old['value']} -> {new['value']}"
+                  for name, (old, new) in self.env_vars_changed.items()]
+        lines += [f"+ symlink {link} -> {target}" for link, target in self.symlinks_added]
+        lines += [f"- symlink {link} -> {target}" for link, target in self.symlinks_removed]
+        lines += [f"+ command {cmd['description']}" for cmd in self.commands_added]
+        lines += [f"- command {cmd['description']}" for cmd in self.commands_removed]
+        return lines
+
+
+def diff_profiles(old_view, new_view):
+    """Compares two resolved profile views by key instead of rendering and text-diffing scripts."""
+    diff = ProfileDiff()
+    if old_view['os'] != new_view['os']:
+        diff.os_change = (old_view['os'], new_view['os'])
+
+    old_packages = {pkg['name']: pkg for pkg in old_view['packages']}
+    new_packages = {pkg['name']: pkg for pkg in new_view['packages']}
+    for name, pkg in new_packages.items():
+        old = old_packages.get(name)
+        if old is None:
+            diff.packages_added.append(pkg)
+        elif old.get('version', '') != pkg.get('version', ''):
+            diff.packages_repinned.append((old, pkg))
+        elif old.get('repo_url', '') != pkg.get('repo_url', '') \
+                or old.get('download_url', '') != pkg.get('download_url', ''):
+            diff.packages_changed.append((old, pkg))
+    diff.packages_removed = [pkg for name, pkg in old_packages.items() if name not in new_packages]
+
+    old_env = old_view['env_vars']
+    new_env = new_view['env_vars']
+    for name, value in new_env.items():
+        if name not in old_env:
+            diff.env_vars_added[name] = value
+        elif old_env[name]['value'] != value['value'] or bool(old_env[name]['append']) != bool(value['append']):
+            diff.env_vars_changed[name] = (old_env[name], value)
+    diff.env_vars_removed = {name: value for name, value in old_env.items() if name not in new_env}
+
+    old_links = [tuple(link) for link in old_view['symlinks']]
+    new_links = [tuple(link) for link in new_view['symlinks']]
+    diff.symlinks_added = _multiset_difference(new_links, old_links, lambda link: link)
+    diff.symlinks_removed = _multiset_difference(old_links, new_links, lambda link: link)
+
+    command_key = lambda cmd: (cmd['description'], cmd['command'])
+    diff.commands_added = _multiset_difference(new_view['custom_commands'], old_view['custom_commands'],
+                                               command_key)
+    diff.commands_removed = _multiset_difference(old_view['custom_commands'], new_view['custom_commands'],
+                                                 command_key)
+    return diff
+
+
+def _multiset_difference(entries, other_entries, key):
+    """Returns the entries (in order) that are not matched one-for-one in ``other_entries``."""
+    remaining = Counter(key(entry) for entry in other_entries)
+    result = []
+    for entry in entries:
+        entry_key = key(entry)
+        if remaining[entry_key]:
+            remaining[entry_key] -= 1
+        else:
+            result.append(entry)
+    return result
@@ -0,0 +1,138 @@
+"""
+Immutable entry types for the sections of a profile. A loaded 50k-entry profile holds hundreds of
+thousands of these, so they use __slots__ instead of a per-entry dict, and the short strings that
+repeat across profiles, caches and platforms (package names, versions, variable names, platforms)
+are interned. Entries are read-only mappings: code written against the JSON dicts of a record
+(``entry['name']``, ``entry.get('version', '')``, ``dict(entry)``) works unchanged, and edits
+build a new entry with replace(). Because nothing can change an entry in place, a resolved view
+can be copied by copying its lists and dicts, sharing the entries themselves.
+
+Symlinks stay (link, target) tuples, which are already compact and immutable.
+"""
+import sys
+
+_intern = sys.intern
+_set = object.__setattr__
+EMPTY_DEFAULTS = ("", "", "", "")  # Missing fields of a record dict read as empty strings
+
+
+def intern_name(name):
+    """Interns a platform, package or variable name (non-strings are returned unchanged)."""
+    return _intern(name) if type(name) is str else name
+
+
+class Entry:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} entries are immutable, use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} entries are immutable, use replace()")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds an entry from a record dict (or any mapping); entries of this type are returned as is."""
+        if type(data) is cls:
+            return data
+        return cls(*map(data.get, cls.__slots__, EMPTY_DEFAULTS))
+
+    def replace(self, **changes):
+        return type(self)(**dict(self.items(), **changes))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def astuple(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    # Read-only mapping interface, as on the record dicts
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return self.astuple()
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    # Entries are hashable, so they only equal entries of the same type; compare to_dict() with record dicts
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self.astuple() == other.astuple()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + self.astuple())
+
+    def __reduce__(self):
+        return type(self), self.astuple()
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Package(Entry):
+    __slots__ = ('name', 'version', 'repo_url', 'download_url')
+
+    def __init__(self, name, version="", repo_url="", download_url=""):
+        _set(self, 'name', intern_name(name))
+        _set(self, 'version', intern_name(version) if version else "")
+        _set(self, 'repo_url', repo_url or "")
+        _set(self, 'download_url', download_url or "")
+
+
+class EnvVar(Entry):
+    """The value of an environment variable; its name is the key of the env_vars dict."""
+    __slots__ = ('value', 'append')
+
+    def __init__(self, value, append=False):
+        _set(self, 'value', value)
+        _set(self, 'append', bool(append))
+
+
+class Command(Entry):
+    __slots__ = ('description', 'command')
+
+    def __init__(self, description, command):
+        _set(self, 'description', description)
+        _set(self, 'command', command)
+
+
+def packages_from_dicts(packages):
+    from_dict = Package.from_dict
+    return [from_dict(package) for package in packages or ()]
+
+
+def env_vars_from_dicts(env_vars):
+    # The append flag of stored rows is 0/1, EnvVar keeps it as a bool
+    return {intern_name(name): entry if type(entry) is EnvVar else EnvVar(entry['value'], entry['append'])
+            for name, entry in (env_vars or {}).items()}
+
+
+def commands_from_dicts(custom_commands):
+    from_dict = Command.from_dict
+    return [from_dict(command) for command in custom_commands or ()]
@@ -0,0 +1,509 @@
+"""
+Compiled, platform-neutral form of a profile. compile_profile() validates the profile dicts once
+and turns every entry into a typed operation; a Backend (see get_backend) then lowers those
+operations to shell commands for one family of package managers. A ProfileIR is immutable, so it
+can be cached and lowered for any number of platforms.
+"""
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+from backend.profile_entries import Command, EnvVar, Package
+
+logger = logging.getLogger(__name__)
+
+SetEnvVar = namedtuple("SetEnvVar", ["name", "value", "append"])
+CreateSymlink = namedtuple("CreateSymlink", ["link", "target"])
+InstallPackage = namedtuple("InstallPackage", ["name", "version", "repo_url"])  # From the package manager
+# Downloaded and unpacked into /opt; a sha256 (from a lockfile) is checked before unpacking
+InstallFromUrl = namedtuple("InstallFromUrl", ["name", "url", "sha256", "archive_format"], defaults=["", "gz"])
+RunCommand = namedtuple("RunCommand", ["description", "command"])
+
+# Compression of downloaded archives by URL suffix; URLs without a known suffix are taken as .tar.gz
+ARCHIVE_SUFFIXES = (
+    (".tar.gz", "gz"), (".tgz", "gz"),
+    (".tar.xz", "xz"), (".txz", "xz"),
+    (".tar.zst", "zst"), (".tzst", "zst"),
+    (".zip", "zip"),
+)
+
+
+ARCHIVE_EXTENSIONS = {"gz": ".tar.gz", "xz": ".tar.xz", "zst": ".tar.zst", "zip": ".zip"}
+UNPACK_COMMANDS = {
+    "gz": "tar -xzf {path} -C {directory}",
+    "xz": "tar -xJf {path} -C {directory}",
+    "zst": "tar --zstd -xf {path} -C {directory}",
+    "zip": "unzip -qo {path} -d {directory}",
+}
+
+
+def archive_format(url):
+    path = url.split("?", 1)[0].split("#", 1)[0].lower()
+    for suffix, compression in ARCHIVE_SUFFIXES:
+        if path.endswith(suffix):
+            return compression
+    return "gz"
+
+
+# Chunked installs keep each command line well below ARG_MAX (2 MiB on Linux, 1 MiB on macOS, both
+# shared with the environment)
+MAX_COMMAND_BYTES = 128 * 1024
+
+
+def chunk_arguments(arguments, chunk_size, max_bytes=MAX_COMMAND_BYTES):
+    """Splits ``arguments`` in order into chunks of at most ``chunk_size`` items and ``max_bytes`` bytes."""
+    chunks, chunk, chunk_bytes = [], [], 0
+    for argument in arguments:
+        argument_bytes = len(argument.encode()) + 1
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + argument_bytes > max_bytes):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(argument)
+        chunk_bytes += argument_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class ProfileIR:
+    """
+    The operations of a profile, one tuple per script section. Lowered sections are memoized by
+    what their output depends on (see lowered()), so rendering the same IR for several platforms
+    only lowers each section once per shell or package manager family.
+    """
+
+    def __init__(self, env_vars=(), symlinks=(), packages=(), custom_commands=()):
+        self.sections = {
+            'env_vars': tuple(env_vars),
+            'symlinks': tuple(symlinks),
+            'packages': tuple(packages),
+            'custom_commands': tuple(custom_commands),
+        }
+        self._lowered = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, section):
+        return self.sections[section]
+
+    def lowered(self, section, key, lower):
+        """Returns ``lower(operations)`` for ``section``, computed once per ``key``."""
+        with self._lock:
+            lines = self._lowered.get((section, key))
+        if lines is None:
+            lines = lower(self.sections[section])
+            with self._lock:
+                self._lowered[(section, key)] = lines
+        return lines
+
+
+def compile_env_vars(env_vars):
+    for name in env_vars:
+        if not (name.isidentifier() and name.isascii()):  # [A-Za-z_][A-Za-z0-9_]*
+            raise ValueError(f"Invalid environment variable name: '{name}'")
+    # _make skips the keyword handling of the namedtuple constructor, which adds up on large profiles;
+    # attributes of EnvVar entries are read directly rather than through their mapping interface
+    return list(map(SetEnvVar._make, [(name, entry.value, entry.append) if type(entry) is EnvVar
+                                      else (name, entry['value'], bool(entry.get('append')))
+                                      for name, entry in env_vars.items()]))
+
+
+def compile_symlinks(symlinks):
+    for link, target in symlinks:
+        if not link or not target:
+            raise ValueError(f"Symlink needs both a link and a target: '{link}' -> '{target}'")
+    return list(map(CreateSymlink._make, symlinks))
+
+
+def compile_packages(packages):
+    operations = []
+    for package in packages:
+        if type(package) is Package:
+            name, version, repo_url, url, sha256 = package.name, package.version, package.repo_url, \
+                package.download_url, ''
+        else:
+            name, version, repo_url, url, sha256 = package.get('name', ''), package.get('version', ''), \
+                package.get('repo_url', ''), package.get('download_url'), package.get('sha256', '')
+        if not name or name.split()[0] != name:
+            raise ValueError(f"Invalid package name: '{name}'")
+        if url:
+            operations.append(InstallFromUrl._make((name, url, sha256, archive_format(url))))
+        else:
+            operations.append(InstallPackage._make((name, version, repo_url)))
+    return operations
+
+
+def compile_commands(custom_commands):
+    return list(map(RunCommand._make, [(command.description, command.command) if type(command) is Command
+                                       else (command['description'], command['command'])
+                                       for command in custom_commands]))
+
+
+SECTION_COMPILERS = {
+    'env_vars': compile_env_vars,
+    'symlinks': compile_symlinks,
+    'packages': compile_packages,
+    'custom_commands': compile_commands,
+}
+
+
+def compile_section(section, data):
+    return tuple(SECTION_COMPILERS[section](data))
+
+
+def compile_profile(packages, env_vars, symlinks, custom_commands):
+    """Validates a profile (raising ValueError for entries no backend can lower) and compiles it."""
+    return ProfileIR(compile_env_vars(env_vars), compile_symlinks(symlinks), compile_packages(packages),
+                     compile_commands(custom_commands))
+
+
+class Backend:
+    """Lowers package operations to the shell commands of one package manager."""
+    shebang = "#!/bin/bash\n"
+    shell_config_file = "~/.bashrc"
+    sed_in_place = "sed -i"  # GNU sed; BSD sed needs an explicit (empty) backup suffix
+    sha256_command = "sha256sum"
+    sha256_check_command = "sha256sum -c -"
+    # For chunked installs: run once before the chunks, and install the packages given as "$@"
+    refresh_command = None
+    install_arguments_command = None
+
+    def format_package(self, operation):
+        return operation.name
+
+    def install_command(self, operations, stream_downloads=False, chunk_size=0):
+        """
+        With ``stream_downloads``, archives are piped from the download straight into the
+        extractor (see stream_install_function) instead of being saved to /tmp and read again.
+        With a ``chunk_size``, packages are installed in checkpointed chunks (see chunked_install_command).
+        """
+        if not operations:
+            return "# No packages to install."
+        commands = []
+        from_manager = [operation for operation in operations if isinstance(operation, InstallPackage)]
+        if from_manager and chunk_size and self.install_arguments_command:
+            commands.append(self.chunked_install_command([self.format_package(op) for op in from_manager],
+                                                         chunk_size))
+        elif from_manager:
+            commands.append(self.install_manager_command(from_manager))
+        if stream_downloads and any(isinstance(operation, InstallFromUrl) for operation in operations):
+            commands.append(self.stream_install_function())
+        for operation in operations:
+            if isinstance(operation, InstallFromUrl) and stream_downloads:
+                commands.append(f'stream_install "{operation.name}" "{operation.url}" {operation.archive_format} '
+                                f'"{operation.sha256}"\n'
+                                f"sudo ln -sf /opt/{operation.name}/bin/{operation.name} "
+                                f"/usr/local/bin/{operation.name}")
+            elif isinstance(operation, InstallFromUrl):
+                path = f"/tmp/{operation.name}{ARCHIVE_EXTENSIONS[operation.archive_format]}"
+                commands.append(f"wget {operation.url} -O {path}\n"
+                                + self.verify_command(operation, path, "\n")
+                                + self.unpack_command(operation, path, "/opt/") + "\n"
+                                f"sudo ln -sf /opt/{operation.name}/bin/{operation.name} "
+                                f"/usr/local/bin/{operation.name}")
+        return "\n".join(commands)
+
+    def remove_command(self, operations):
+        if not operations:
+            return "# No packages to remove."
+        commands = []
+        names = [operation.name for operation in operations if isinstance(operation, InstallPackage)]
+        if names:
+            commands.append(self.remove_packages_command(names))
+        # Undo what install_command did for packages with custom download URLs
+        for operation in operations:
+            if isinstance(operation, InstallFromUrl):
+                commands.append(f"sudo rm -f /usr/local/bin/{operation.name}\n"
+                                f"sudo rm -rf /opt/{operation.name}")
+        return "\n".join(commands)
+
+    def unpack_command(self, operation, path, directory):
+        return UNPACK_COMMANDS[operation.archive_format].format(path=path, directory=directory)
+
+    def verify_command(self, operation, path, separator):
+        """Checks a downloaded archive against its locked sha256; empty for unlocked downloads."""
+        if not operation.sha256:
+            return ""
+        return f'echo "{operation.sha256}  {path}" | {self.sha256_check_command}{separator}'
+
+    def stream_install_function(self):
+        """
+        A shell function that downloads an archive into a staging directory under /opt in one pass:
+        curl (or wget) writes to the decompressor, preferring the multi-threaded pigz, pixz and
+        pzstd, and tar reads from it. For a locked download, tee also feeds a FIFO that the hasher
+        reads, and the files only leave staging once the digest matches. Zip archives keep their
+        index at the end, so without bsdtar they are saved to disk and unzipped.
+        """
+        return "\n".join([
+            "# Downloads an archive straight into the extractor: stream_install NAME URL FORMAT [SHA256]",
+            "stream_install() (",
+            "  set -o pipefail",
+            '  url="$2" format="$3" sha256="$4" staging="/opt/.$1.partial"',
+            '  rm -rf "$staging" "$staging.fifo" && mkdir -p "$staging"',
+            # Whatever fails (download, extraction, checksum), nothing is left behind in /opt
+            '  trap \'rm -rf "$staging" "$staging.fifo" "$staging.sha256" "$staging.zip"\' EXIT',
+            '  fetch() { if command -v curl >/dev/null 2>&1; then curl -fsSL "$url"; else wget -qO- "$url"; fi; }',
+            "  unpack() {",
+            '    case "$format" in',
+            "      gz) if command -v pigz >/dev/null 2>&1; then pigz -dc; else gzip -dc; fi"
+            ' | tar -xf - -C "$staging" ;;',
+            "      xz) if command -v pixz >/dev/null 2>&1; then pixz -d; else xz -T0 -dc; fi"
+            ' | tar -xf - -C "$staging" ;;',
+            "      zst) if command -v pzstd >/dev/null 2>&1; then pzstd -dc; else zstd -dc; fi"
+            ' | tar -xf - -C "$staging" ;;',
+            '      zip) if command -v bsdtar >/dev/null 2>&1; then bsdtar -xf - -C "$staging"',
+            '           else cat > "$staging.zip" && unzip -q "$staging.zip" -d "$staging" && rm -f "$staging.zip"; fi ;;',
+            "    esac",
+            "  }",
+            '  if [ -z "$sha256" ]; then',
+            "    fetch | unpack",
+            "  else",
+            '    mkfifo "$staging.fifo"',
+            f'    {self.sha256_command} < "$staging.fifo" > "$staging.sha256" &',
+            "    hasher=$!",
+            '    fetch | tee "$staging.fifo" | unpack',
+            '    wait "$hasher"',
+            '    if [ "$(cut -d " " -f 1 "$staging.sha256")" != "$sha256" ]; then',
+            '      echo "Checksum mismatch for $url" >&2',
+            "      exit 1",
+            "    fi",
+            "  fi",
+            '  for entry in "$staging"/*; do rm -rf "/opt/${entry##*/}" && mv "$entry" /opt/; done',
+            '  rmdir "$staging"',
+            ")",
+        ])
+
+    def install_manager_command(self, operations):
+        """Installs ``operations`` (InstallPackage) with the package manager in one go."""
+        return self.install_packages_command([self.format_package(operation) for operation in operations])
+
+    def chunked_install_command(self, formatted_packages, chunk_size):
+        """
+        Installs the packages in chunks of at most ``chunk_size``, each one command line. A chunk
+        that installed leaves a checkpoint (named after its packages) under
+        $ENV_SETUP_CHECKPOINT_DIR, so running the script again skips it. A chunk that fails is
+        split in halves until the packages that fail on their own are found; the others are still
+        installed and the failures are listed once every chunk was tried.
+        """
+        lines = [
+            "# Packages are installed in checkpointed chunks; a failing chunk is bisected",
+            'CHECKPOINT_DIR="${ENV_SETUP_CHECKPOINT_DIR:-$HOME/.env_setup/checkpoints}"',
+            'mkdir -p "$CHECKPOINT_DIR"',
+            'FAILED_PACKAGES=""',
+            f"install_packages() {{ {self.install_arguments_command}; }}",
+            "install_bisect() {",
+            '  if install_packages "$@"; then return 0; fi',
+            '  if [ "$#" -eq 1 ]; then',
+            '    echo "Failed to install $1" >&2',
+            '    FAILED_PACKAGES="$FAILED_PACKAGES $1"',
+            "    return 0",
+            "  fi",
+            "  local half=$(( $# / 2 ))",
+            '  install_bisect "${@:1:half}"',
+            '  install_bisect "${@:half+1}"',
+            "}",
+            "install_chunk() {",
+            '  local checkpoint="$CHECKPOINT_DIR/$1" failed_before="$FAILED_PACKAGES"',
+            "  shift",
+            '  if [ -f "$checkpoint" ]; then',
+            '    echo "Skipping $# packages installed by an earlier run."',
+            "    return 0",
+            "  fi",
+            '  install_bisect "$@"',
+            '  if [ "$FAILED_PACKAGES" = "$failed_before" ]; then touch "$checkpoint"; fi',
+            "}",
+        ]
+        if self.refresh_command:
+            lines.append(self.refresh_command)
+        prefix = type(self).__name__.lower()
+        for chunk in chunk_arguments(formatted_packages, chunk_size):
+            arguments = " ".join(chunk)
+            checkpoint = f"{prefix}-{hashlib.sha256(arguments.encode()).hexdigest()[:16]}"
+            lines.append(f"install_chunk {checkpoint} {arguments}")
+        lines.extend([
+            'if [ -n "$FAILED_PACKAGES" ]; then',
+            '  echo "Packages that failed to install:$FAILED_PACKAGES" >&2',
+            "  exit 1",
+            "fi",
+        ])
+        return "\n".join(lines)
+
+    def install_packages_command(self, formatted_packages):
+        return "# Unsupported platform for package installation."
+
+    def remove_packages_command(self, names):
+        return "# Unsupported platform for package removal."
+
+    def container_install_command(self, package_list):
+        """
+        The command for a Dockerfile RUN step that installs ``package_list`` (formatted packages
+        joined by the caller) as root and cleans up caches, or None if unsupported.
+        """
+        return None
+
+
+class AptBackend(Backend):
+    refresh_command = "sudo apt-get update"
+    install_arguments_command = 'sudo apt-get install -y "$@"'
+
+    def format_package(self, operation):
+        # APT: package=version
+        return f"{operation.name}={operation.version}" if operation.version else operation.name
+
+    def install_packages_command(self, formatted_packages):
+        return f"sudo apt-get update && sudo apt-get install -y {' '.join(formatted_packages)}"
+
+    def remove_packages_command(self, names):
+        return f"sudo apt-get remove -y {' '.join(names)}"
+
+    def container_install_command(self, package_list):
+        # Updating in the same step keeps a cached install layer from using stale package lists
+        return "apt-get update && apt-get install -y --no-install-recommends " \
+            f"{package_list} && rm -rf /var/lib/apt/lists/*"
+
+
+class YumBackend(Backend):
+    install_arguments_command = 'sudo yum install -y "$@"'
+
+    def format_package(self, operation):
+        # YUM/DNF: package-version
+        return f"{operation.name}-{operation.version}" if operation.version else operation.name
+
+    def install_packages_command(self, formatted_packages):
+        return f"sudo yum install -y {' '.join(formatted_packages)}"
+
+    def remove_packages_command(self, names):
+        return f"sudo yum remove -y {' '.join(names)}"
+
+    def container_install_command(self, package_list):
+        return f"yum install -y {package_list} && yum clean all"
+
+
+class PacmanBackend(Backend):
+    # Pacman doesn't support specifying versions during install
+    refresh_command = "sudo pacman -Syu --noconfirm"
+    install_arguments_command = 'sudo pacman -S --needed --noconfirm "$@"'
+
+    def install_packages_command(self, formatted_packages):
+        return f"sudo pacman -Syu {' '.join(formatted_packages)} --noconfirm"
+
+    def remove_packages_command(self, names):
+        return f"sudo pacman -R {' '.join(names)} --noconfirm"
+
+    def container_install_command(self, package_list):
+        return f"pacman -Sy --noconfirm --needed {package_list} && pacman -Scc --noconfirm"
+
+
+class BrewBackend(Backend):
+    # Homebrew does not support specifying versions directly
+    shebang = "#!/bin/zsh\n"
+    shell_config_file = "~/.zshrc"
+    sed_in_place = "sed -i ''"
+    sha256_command = "shasum -a 256"
+    sha256_check_command = "shasum -a 256 -c -"
+    refresh_command = "\n".join([
+        "# Check for Homebrew",
+        "if ! command -v brew &>/dev/null; then",
+        " echo \"Homebrew not found. Installing Homebrew...\"",
+        ' /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"',
+        " echo 'eval \"$(/opt/homebrew/bin/brew shellenv)\"' >> ~/.zprofile",
+        " eval \"$(/opt/homebrew/bin/brew shellenv)\"",
+        "fi",
+    ])
+    install_arguments_command = 'brew install "$@"'
+
+    def install_packages_command(self, formatted_packages):
+        return f"{self.refresh_command}\nbrew install {' '.join(formatted_packages)}"
+
+    def remove_packages_command(self, names):
+        return f"brew uninstall {' '.join(names)}"
+
+
+# Taps that are built into Homebrew and never need a tap line
+HOMEBREW_BUILTIN_TAPS = ("homebrew/core", "homebrew/cask")
+
+
+def brew_tap(repo_url):
+    """
+    Maps a package's repo_url to the Homebrew tap it comes from, as (tap, clone URL), or None for
+    homebrew/core. repo_url is either "user/repo" or a Git URL whose last two path segments name
+    the tap ("homebrew-" prefix and ".git" dropped); the clone URL is only kept off GitHub.
+    """
+    if not repo_url:
+        return None
+    if "://" in repo_url:
+        parts = urlsplit(repo_url)
+        host, path = parts.hostname or "", parts.path
+    elif repo_url.startswith("git@"):
+        host, _, path = repo_url[len("git@"):].partition(":")
+    else:
+        host, path = "github.com", repo_url
+    segments = [segment for segment in path.split("/") if segment]
+    if len(segments) < 2:
+        raise ValueError(f"Cannot derive a Homebrew tap from repository URL: '{repo_url}'")
+    user, repo = segments[-2], segments[-1]
+    repo = repo[:-len(".git")] if repo.endswith(".git") else repo
+    repo = repo[len("homebrew-"):] if repo.startswith("homebrew-") else repo
+    tap = f"{user}/{repo}".lower()
+    if tap == "homebrew/core":
+        return None
+    return tap, "" if host.lower() == "github.com" else repo_url
+
+
+class BrewBundleBackend(BrewBackend):
+    """
+    Installs Homebrew packages from a Brewfile with one ``brew bundle`` run. Packages whose
+    repo_url is homebrew/cask (or another tap whose name starts with "cask") are casks, other
+    repo_urls become taps. brew bundle lists what is installed once and skips those packages, and
+    auto-update and cleanup are turned off for the run. Homebrew cannot install a given version,
+    so a pinned version is only noted in the Brewfile.
+    """
+    # The generated script uses bash features, and Homebrew needs bash anyway
+    shebang = "#!/bin/bash\n"
+    install_arguments_command = None  # brew bundle already carries on past packages that fail
+
+    def brewfile(self, operations):
+        taps, entries = {}, []
+        for operation in operations:
+            name = operation.name
+            tap = brew_tap(operation.repo_url)
+            if tap is None and name.count("/") == 2:  # Fully qualified: user/repo/name
+                tap = name.rsplit("/", 1)[0].lower(), ""
+            kind = "brew"
+            if tap is not None:
+                if tap[0].split("/")[1].startswith("cask"):
+                    kind = "cask"
+                if tap[0] not in HOMEBREW_BUILTIN_TAPS:
+                    taps.setdefault(tap[0], tap[1])
+                    if name.count("/") != 2:
+                        name = f"{tap[0]}/{name}"
+            entry = f'{kind} "{name}"'
+            if operation.version:
+                entry += f"  # {operation.version} requested, Homebrew installs the current version"
+            entries.append(entry)
+        tap_lines = [f'tap "{tap}", "{url}"' if url else f'tap "{tap}"' for tap, url in taps.items()]
+        return "\n".join(tap_lines + entries) + "\n"
+
+    def install_manager_command(self, operations):
+        return "\n".join([
+            self.refresh_command,
+            "HOMEBREW_NO_AUTO_UPDATE=1 HOMEBREW_NO_INSTALL_CLEANUP=1 HOMEBREW_BUNDLE_NO_LOCK=1 \\",
+            "  brew bundle --no-upgrade --file=- <<'BREWFILE'",
+            self.brewfile(operations) + "BREWFILE",
+        ])
+
+
+BACKENDS = {
+    "ubuntu": AptBackend(),
+    "debian": AptBackend(),
+    "rhel": YumBackend(),
+    "centos": YumBackend(),
+    "fedora": YumBackend(),
+    "arch": PacmanBackend(),
+    "macos": BrewBundleBackend(),
+}
+UNSUPPORTED_BACKEND = Backend()
+
+
+def get_backend(platform):
+    return BACKENDS.get(platform.lower(), UNSUPPORTED_BACKEND)
@@ -0,0 +1,159 @@
+"""
+Profiling mode for diagnosing slow runs. Enable with ENV_SETUP_PROFILE_DIR=<dir>, the --profile-dir
+command line flag or ``enable(<dir>)``. Each run gets its own directory under <dir>; every profiled
+operation (e.g. ``generate:<profile>:<platform>``) writes there:
+
+    <n>-<label>.prof   cProfile call graph, readable with pstats or snakeviz
+    <n>-<label>.txt    wall time, memory, the slowest call paths and the top allocation sites
+
+and appends a summary line to index.jsonl. The whole directory can be zipped and attached to a ticket.
+While disabled, ``profiled()`` returns a shared no-op context manager.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import platform
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 5
+
+
+class _State:
+    run_dir = None
+    sequence = 0
+
+
+_state = _State()
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NoopProfile:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_PROFILE = _NoopProfile()
+
+
+class OperationProfile:
+    """Profiles one labelled operation with cProfile and a tracemalloc snapshot diff."""
+
+    def __init__(self, label):
+        self.label = label
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        _local.active = True
+        tracemalloc.reset_peak()
+        self.memory_before = tracemalloc.get_traced_memory()[0]
+        self.snapshot_before = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+        _local.active = False
+        try:
+            self._write(elapsed, current - self.memory_before, peak - self.memory_before, snapshot_after,
+                        "error" if exc_type is not None else "ok")
+        except OSError as e:
+            logger.error(f"Error writing profile for '{self.label}': {str(e)}")
+        return False
+
+    def _write(self, elapsed, memory_delta, memory_peak, snapshot_after, status):
+        safe_label = re.sub(r'[^\w.-]', '_', self.label)[:120]
+        with _lock:
+            _state.sequence += 1
+            file_stem = f"{_state.sequence:04d}-{safe_label}"
+        stats_path = os.path.join(_state.run_dir, file_stem + ".prof")
+        self.profile.dump_stats(stats_path)
+
+        filters = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+        allocations = snapshot_after.filter_traces(filters).compare_to(
+            self.snapshot_before.filter_traces(filters), "lineno")
+
+        report = io.StringIO()
+        report.write(f"Operation: {self.label}\n")
+        report.write(f"Status:    {status}\n")
+        report.write(f"Wall time: {elapsed * 1000:.1f} ms\n")
+        report.write(f"Memory:    {memory_delta / 1024:+.1f} KiB retained, {memory_peak / 1024:.1f} KiB peak\n\n")
+        report.write(f"Top {TOP_ALLOCATIONS} allocation sites (size change since the operation started):\n")
+        for stat in allocations[:TOP_ALLOCATIONS]:
+            report.write(f"  {stat}\n")
+        report.write(f"\nTop {TOP_FUNCTIONS} functions by cumulative time:\n")
+        pstats.Stats(self.profile, stream=report).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        with open(os.path.join(_state.run_dir, file_stem + ".txt"), "w") as report_file:
+            report_file.write(report.getvalue())
+
+        summary = {"label": self.label, "file": file_stem, "status": status, "wall_ms": round(elapsed * 1000, 3),
+                   "memory_delta_bytes": memory_delta, "memory_peak_bytes": memory_peak,
+                   "thread": threading.current_thread().name}
+        with _lock:
+            with open(os.path.join(_state.run_dir, "index.jsonl"), "a") as index_file:
+                index_file.write(json.dumps(summary) + "\n")
+        logger.info(f"Profile of '{self.label}' written to {stats_path} ({elapsed * 1000:.1f} ms).")
+
+
+def enable(base_dir):
+    """Starts a profiling run in a new directory under ``base_dir`` and returns its path."""
+    run_dir = os.path.join(base_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "run.json"), "w") as run_file:
+        json.dump({"argv": sys.argv, "python": platform.python_version(), "platform": platform.platform(),
+                   "started": datetime.now().isoformat(timespec="seconds")}, run_file, indent=2)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    _state.run_dir = run_dir
+    logger.info(f"Profiling enabled, writing to {run_dir}")
+    return run_dir
+
+
+def disable():
+    _state.run_dir = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _state.run_dir is not None
+
+
+def profiled(label):
+    """
+    Context manager profiling a block as the operation ``label``. Operations nested inside a
+    profiled one (on the same thread) are part of the outer call graph and are not written separately.
+    """
+    if _state.run_dir is None or getattr(_local, "active", False):
+        return _NOOP_PROFILE
+    return OperationProfile(label)
+
+
+def run_profiled(label, func, *args):
+    """Calls ``func(*args)`` under ``profiled(label)``; for work handed to executor threads."""
+    with profiled(label):
+        return func(*args)
+
+
+if os.environ.get("ENV_SETUP_PROFILE_DIR"):
+    enable(os.environ["ENV_SETUP_PROFILE_DIR"])
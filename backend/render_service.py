@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+from backend import instrumentation, profiling
+from backend.archive_builder import ArchiveBuilder
+from backend.package_manager import PackageManager
+from backend.profile_ir import compile_profile
+from backend.script_generator import ScriptGenerator
+
+logger = logging.getLogger(__name__)
+
+PLATFORMS = ["ubuntu", "debian", "rhel", "centos", "fedora", "arch", "macos"]
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 10.0
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 422: "Unprocessable Entity", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class RenderService:
+    """
+    Minimal asyncio HTTP server that renders setup scripts on request:
+
+        GET /profiles/<profile>/<platform>/install.sh
+        GET /profiles/<profile>/<platform>/archive.zip
+
+    /metrics and /spans expose the instrumentation data (see backend.instrumentation).
+    Rendered artifacts are cached by profile, platform and the stored revisions of the profile
+    and its ancestors, so a repeated request costs one small query and no rendering. Responses
+    carry an ETag derived from the content hash and honour If-None-Match. At most
+    ``max_concurrency`` renders run at once; requests that wait longer than ``queue_timeout``
+    for a slot get a 503.
+    """
+
+    def __init__(self, db_manager, max_concurrency=8, queue_timeout=10.0, cache_size=256):
+        self.db_manager = db_manager  # An AsyncDBManager
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.cache_size = cache_size
+        self.server = None
+        self._semaphore = None
+        self._cache = OrderedDict()  # (profile_name, revision stamp, platform, artifact) -> (body, etag)
+        self._compiled = OrderedDict()  # (profile_name, revision stamp) -> ProfileIR, shared by all platforms
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"Render service listening on http://{host}:{self.port}")
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1] if self.server else None
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        method = "GET"
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+                method, target, headers = _parse_request_head(head)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+                await self._send(writer, 400, {}, b"Bad request\n")
+                return
+            status, response_headers, body = await self._dispatch(method, target, headers)
+            await self._send(writer, status, response_headers, b"" if method == "HEAD" else body,
+                             content_length=len(body))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Error handling render request: {str(e)}")
+            try:
+                await self._send(writer, 500, {}, b"Internal server error\n")
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b"Method not allowed\n"
+        parts = [unquote(part) for part in urlsplit(target).path.strip("/").split("/")]
+        if parts == ["healthz"]:
+            return 200, {"Content-Type": "text/plain"}, b"ok\n"
+        if parts == ["metrics"]:
+            return 200, {"Content-Type": "text/plain; version=0.0.4"}, \
+                instrumentation.metrics.render_prometheus().encode()
+        if parts == ["spans"]:
+            return 200, {"Content-Type": "application/x-ndjson"}, instrumentation.spans.export_json().encode()
+        if len(parts) != 4 or parts[0] != "profiles" or parts[2] not in PLATFORMS \
+                or parts[3] not in ("install.sh", "archive.zip"):
+            return 404, {"Content-Type": "text/plain"}, b"Not found\n"
+        profile_name, platform, artifact = parts[1:]
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return 503, {"Retry-After": "1", "Content-Type": "text/plain"}, b"Server busy\n"
+        try:
+            rendered = await self._render(profile_name, platform, artifact)
+        except ValueError as e:
+            return 422, {"Content-Type": "text/plain"}, f"Profile '{profile_name}' is invalid: {str(e)}\n".encode()
+        finally:
+            self._semaphore.release()
+        if rendered is None:
+            return 404, {"Content-Type": "text/plain"}, f"Profile '{profile_name}' not found\n".encode()
+
+        body, etag = rendered
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Content-Type": "application/zip" if artifact == "archive.zip" else "text/x-shellscript",
+        }
+        if_none_match = [tag.strip() for tag in headers.get("if-none-match", "").split(",")]
+        if etag in if_none_match or "*" in if_none_match:
+            return 304, response_headers, b""
+        return 200, response_headers, body
+
+    @instrumentation.instrumented("render_service.render")
+    async def _render(self, profile_name, platform, artifact):
+        stamp = await self.db_manager.get_revision_stamp(profile_name)
+        if stamp is None:
+            return None
+        view_key = (profile_name, stamp)
+        key = (profile_name, stamp, platform, artifact)
+        cached = self._cache.get(key)
+        if cached:
+            self._cache.move_to_end(key)
+            return cached
+
+        # A save between the two reads only stores a newer view under the older stamp, which is not requested again
+        profile_data = await self.db_manager.load_profile(profile_name)
+        if not profile_data:
+            return None
+        # Compiling, rendering and zipping are CPU bound, keep them off the event loop
+        loop = asyncio.get_running_loop()
+        ir = self._compiled.get(view_key)
+        if ir is None:
+            ir = await loop.run_in_executor(None, compile_profile, profile_data['packages'], profile_data['env_vars'],
+                                            profile_data['symlinks'], profile_data['custom_commands'])
+            _remember(self._compiled, view_key, ir, self.cache_size)
+        else:
+            self._compiled.move_to_end(view_key)
+        body = await loop.run_in_executor(None, profiling.run_profiled, f"render:{profile_name}:{platform}:{artifact}",
+                                          render_artifact, profile_data, platform, artifact, ir)
+        rendered = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+        _remember(self._cache, key, rendered, self.cache_size)
+        logger.info(f"Rendered {artifact} for profile '{profile_name}' on {platform}.")
+        return rendered
+
+    async def _send(self, writer, status, headers, body, content_length=None):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        headers = dict(headers, Connection="close")
+        headers["Content-Length"] = str(len(body) if content_length is None else content_length)
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        # The body is fully rendered already; writing it in pieces with drain() only bounds the
+        # transport's buffer for slow clients
+        for offset in range(0, len(body), CHUNK_SIZE):
+            writer.write(body[offset:offset + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+
+def _remember(cache, key, value, size):
+    cache[key] = value
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+def render_artifact(profile_data, platform, artifact, ir=None):
+    """Renders one artifact; ``ir`` is the compiled profile_data, compiled here if not given."""
+    script_generator = ScriptGenerator(PackageManager(platform), profile_data['symlinks'],
+                                       profile_data['env_vars'], profile_data['custom_commands'])
+    script = script_generator.render_script(profile_data['packages'], ir=ir).encode()
+    if artifact == "install.sh":
+        return script
+    script_name = "install.sh" if platform != "macos" else "install.command"
+    return ArchiveBuilder().create_archive_bytes({script_name: script})
+
+
+def run_render_service(host="127.0.0.1", port=8765, max_concurrency=8):
+    from database.async_db_manager import AsyncDBManager
+
+    async def serve():
+        db_manager = AsyncDBManager()
+        await db_manager.initialize()
+        service = RenderService(db_manager, max_concurrency=max_concurrency)
+        await service.start(host, port)
+        try:
+            await service.serve_forever()
+        finally:
+            await db_manager.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        logger.info("Render service stopped.")
+
+
+def _parse_request_head(head):
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ")
+    if not version.startswith("HTTP/"):
+        raise ValueError(f"Invalid request line: {lines[0]}")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, headers
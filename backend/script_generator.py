@@ -1,81 +1,125 @@
 import os
 import logging
+from backend.profile_diff import diff_profiles
+from backend.instrumentation import instrumented
+from backend.profile_ir import compile_commands, compile_env_vars, compile_profile, compile_section
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sections of the install script between the header and the completion message, in order
+SECTIONS = ("env_vars", "symlinks", "packages", "custom_commands")
 
 
 class ScriptGenerator:
-    def __init__(self, package_manager, symlinks, env_vars, custom_commands):
+    def __init__(self, package_manager, symlinks, env_vars, custom_commands, stream_downloads=False,
+                 install_chunk_size=0):
         self.package_manager = package_manager
         self.symlinks = symlinks
         self.env_vars = env_vars
         self.custom_commands = custom_commands
+        # Pipe downloaded archives into the extractor instead of saving them to /tmp first
+        self.stream_downloads = stream_downloads
+        # Install packages in checkpointed chunks of this many (0 installs them with one command)
+        self.install_chunk_size = install_chunk_size
 
-    def generate_script(self, packages, output_path, app_install_path=None, overwrite=False, backup=False):
+    @instrumented("script_generator.generate_script")
+    def generate_script(self, packages, output_path, app_install_path=None, overwrite=False, backup=False, ir=None):
         try:
-            script_lines = []
+            script_lines = self._generate_script_lines(packages, app_install_path, overwrite, backup, ir)
+            self._write_script(script_lines, output_path)
+            logger.info(f"Install script generated at {output_path}")
+        except Exception as e:
+            logger.error(f"Error generating script: {str(e)}")
+            raise e
 
-            # Shebang
-            script_lines.append("#!/bin/bash\n")
+    @instrumented("script_generator.render_script")
+    def render_script(self, packages, app_install_path=None, overwrite=False, backup=False, ir=None):
+        """
+        Returns the install script as a string instead of writing it to disk. Pass ``ir`` (from
+        compile()) to lower an already compiled profile instead of compiling it again.
+        """
+        try:
+            return "".join(self._generate_script_lines(packages, app_install_path, overwrite, backup, ir))
+        except Exception as e:
+            logger.error(f"Error rendering script: {str(e)}")
+            raise e
 
-            # Enable error handling
-            script_lines.append("# Exit immediately if a command exits with a non-zero status\n")
-            script_lines.append("set -e\n")
+    def compile(self, packages):
+        """Validates this generator's profile with ``packages`` and compiles it to a ProfileIR."""
+        return compile_profile(packages, self.env_vars, self.symlinks, self.custom_commands)
 
-            # Trap errors and handle them
-            script_lines.append("trap 'echo \"An error occurred. Exiting...\"; exit 1;' ERR\n")
+    def _generate_script_lines(self, packages, app_install_path, overwrite, backup, ir=None):
+        ir = ir or self.compile(packages)
+        script_lines = self.generate_section_lines("header")
 
-            # User Feedback
-            script_lines.append('echo "Starting environment setup..."\n')
+        if app_install_path:
+            script_lines.extend(self._generate_app_check_logic(app_install_path, overwrite, backup))
 
-            if app_install_path:
-                script_lines.extend(self._generate_app_check_logic(app_install_path, overwrite, backup))
+        for section in SECTIONS:
+            script_lines.extend(ir.lowered(section, self._lowering_key(section, app_install_path),
+                                           lambda operations, section=section: self.generate_section_lines(
+                                               section, app_install_path=app_install_path, operations=operations)))
 
-            shell_config_file = self._get_shell_config_file()
+        script_lines.extend(self.generate_section_lines("footer"))
+        return script_lines
 
+    def generate_section_lines(self, section, packages=None, app_install_path=None, operations=None):
+        """
+        Returns the lines of one section of the install script, or an empty list if the section
+        has no entries. Sections only depend on their own data and the platform, which lets the
+        live preview re-render just the section that changed. ``operations`` are the section's
+        compiled operations; without them the section is compiled from the profile data.
+        """
+        if section == "header":
+            return self._generate_header_lines()
+        if section == "footer":
+            # Completion message
+            return ['echo "Environment setup completed successfully."\n']
+        if operations is None:
+            data = {'env_vars': self.env_vars, 'symlinks': self.symlinks, 'packages': packages,
+                    'custom_commands': self.custom_commands}
+            if section not in data:
+                raise ValueError(f"Unknown script section: {section}")
+            operations = compile_section(section, data[section] or ())
+        if not operations:
+            return []
+        if section == "env_vars":
             # Environment Variables
-            if self.env_vars:
-                script_lines.append('echo "Setting environment variables..."\n')
-                for key, value in self.env_vars.items():
-                    if key == "PATH":
-                        script_lines.append(f'if grep -q "export PATH=" {shell_config_file}; then\n')
-                        script_lines.append(
-                            f'  sed -i \'\' -e \'s|export PATH=.*$|export PATH="{value["value"]}:$PATH"|\' {shell_config_file}\n')
-                        script_lines.append(f'  echo "Updated PATH in {shell_config_file}"\n')
-                        script_lines.append('else\n')
-                        script_lines.append(f'  echo \'export PATH="{value["value"]}:$PATH"\' >> {shell_config_file}\n')
-                        script_lines.append(f'  echo "Added PATH to {shell_config_file}"\n')
-                        script_lines.append('fi\n')
-                    else:
-                        script_lines.append(f'if grep -q "export {key}=" {shell_config_file}; then\n')
-                        script_lines.append(
-                            f'  sed -i \'\' -e \'s|export {key}=.*$|export {key}="{value["value"]}"|\' {shell_config_file}\n')
-                        script_lines.append(f'  echo "Updated {key} in {shell_config_file}"\n')
-                        script_lines.append('else\n')
-                        script_lines.append(f'  echo \'export {key}="{value["value"]}"\' >> {shell_config_file}\n')
-                        script_lines.append(f'  echo "Added {key} to {shell_config_file}"\n')
-                        script_lines.append('fi\n')
-                script_lines.append('echo "Environment variables set."\n')
-
+            return ['echo "Setting environment variables..."\n'] \
+                + self._generate_env_var_lines(operations, self._get_shell_config_file()) \
+                + ['echo "Environment variables set."\n']
+        if section == "symlinks":
             # Symlink Creation
-            if self.symlinks:
-                script_lines.append('echo "Creating symlinks..."\n')
-                for link, target in self.symlinks:
-                    # Ensure directories exist
-                    script_lines.append(f'mkdir -p "$(dirname \\"{link}\\")"\n')
-                    script_lines.append(f'ln -sf "{target}" "{link}"\n')
-                script_lines.append('echo "Symlinks created."\n')
-
+            return ['echo "Creating symlinks..."\n'] + self._generate_symlink_lines(operations) \
+                + ['echo "Symlinks created."\n']
+        if section == "packages":
             # Package Installation
-            if packages:
-                script_lines.append('echo "Installing packages..."\n')
-                install_command = self.package_manager.get_install_command(packages)
-
-                # Wrap the install command to check for application existence
-                for package in packages:
-                    if package == 'intellij-idea':  # Example specific to IntelliJ IDEA
-                        install_command = f'''if [ -d "{app_install_path}" ]; then
+            return self._generate_package_lines(operations, app_install_path)
+        if section == "custom_commands":
+            # Custom Commands
+            return ['echo "Executing custom commands..."\n'] + self._generate_command_lines(operations) \
+                + ['echo "Custom commands executed."\n']
+        raise ValueError(f"Unknown script section: {section}")
+
+    def _lowering_key(self, section, app_install_path):
+        # What a section's lines depend on besides its operations
+        if section == "env_vars":
+            return self._get_shell_config_file(), self.package_manager.backend.sed_in_place
+        if section == "packages":
+            return (type(self.package_manager.backend).__name__, app_install_path, self.stream_downloads,
+                    self.install_chunk_size)
+        return None
+
+    def _generate_package_lines(self, operations, app_install_path):
+        script_lines = []
+        script_lines.append('echo "Installing packages..."\n')
+        install_command = self.package_manager.backend.install_command(operations, self.stream_downloads,
+                                                                       self.install_chunk_size)
+
+        # Wrap the install command to check for application existence
+        for package in operations:
+            if package == 'intellij-idea':  # Example specific to IntelliJ IDEA
+                install_command = f'''if [ -d "{app_install_path}" ]; then
   read -p "It seems there is already an App at '{app_install_path}'. Do you want to overwrite it? (y/n) " choice
   case "$choice" in
     y|Y )
@@ -96,34 +140,150 @@ else
   {install_command}
 fi
 '''
-                        break
+                break
 
-                script_lines.append(install_command + "\n")
-                script_lines.append('echo "Packages installed."\n')
+        script_lines.append(install_command + "\n")
+        script_lines.append('echo "Packages installed."\n')
+        return script_lines
 
-            # Custom Commands
-            if self.custom_commands:
-                script_lines.append('echo "Executing custom commands..."\n')
-                for command in self.custom_commands:
-                    cmd = command['command']
-                    script_lines.append(cmd + "\n")
-                script_lines.append('echo "Custom commands executed."\n')
+    @instrumented("script_generator.generate_upgrade_script")
+    def generate_upgrade_script(self, base_profile, packages, output_path):
+        """
+        Writes a script that only applies what changed between ``base_profile`` (a resolved view
+        that is already provisioned) and this generator's profile with ``packages``.
+        """
+        try:
+            target_profile = {
+                'os': self.package_manager.platform,
+                'packages': packages,
+                'env_vars': self.env_vars,
+                'symlinks': self.symlinks,
+                'custom_commands': self.custom_commands
+            }
+            diff = diff_profiles(base_profile, target_profile)
+            if diff.os_change and diff.os_change[0].lower() != diff.os_change[1].lower():
+                raise ValueError(f"Cannot upgrade from a {diff.os_change[0]} profile to a {diff.os_change[1]} profile.")
 
-            # Completion message
-            script_lines.append('echo "Environment setup completed successfully."\n')
+            script_lines = self._generate_header_lines()
+            script_lines[-1] = 'echo "Starting environment upgrade..."\n'
+            shell_config_file = self._get_shell_config_file()
+            sed_in_place = self.package_manager.backend.sed_in_place
 
-            # Write the script to the output path
-            with open(output_path, 'w') as script_file:
-                script_file.writelines(script_lines)
+            # Environment Variables
+            changed_env_vars = dict(diff.env_vars_added)
+            changed_env_vars.update({name: new for name, (old, new) in diff.env_vars_changed.items()})
+            if changed_env_vars or diff.env_vars_removed:
+                script_lines.append('echo "Updating environment variables..."\n')
+                for key in diff.env_vars_removed:
+                    script_lines.append(f'if grep -q "^export {key}=" {shell_config_file}; then\n')
+                    script_lines.append(f"  {sed_in_place} -e '/^export {key}=/d' {shell_config_file}\n")
+                    script_lines.append(f'  echo "Removed {key} from {shell_config_file}"\n')
+                    script_lines.append('fi\n')
+                script_lines.extend(self._generate_env_var_lines(compile_env_vars(changed_env_vars),
+                                                                 shell_config_file))
+                script_lines.append('echo "Environment variables updated."\n')
+
+            # Symlinks
+            if diff.symlinks_removed or diff.symlinks_added:
+                script_lines.append('echo "Updating symlinks..."\n')
+                added_links = {link for link, target in diff.symlinks_added}
+                for link, target in diff.symlinks_removed:
+                    if link in added_links:
+                        continue  # Re-pointed below by ln -sf
+                    script_lines.append(f'if [ -L "{link}" ]; then rm -f "{link}"; fi\n')
+                script_lines.extend(self._generate_symlink_lines(diff.symlinks_added))
+                script_lines.append('echo "Symlinks updated."\n')
+
+            # Packages
+            if diff.packages_removed:
+                script_lines.append('echo "Removing packages..."\n')
+                script_lines.append(self.package_manager.get_remove_command(diff.packages_removed) + "\n")
+                script_lines.append('echo "Packages removed."\n')
+            packages_to_install = diff.packages_added + [new for old, new in diff.packages_repinned] \
+                + [new for old, new in diff.packages_changed]
+            if packages_to_install:
+                script_lines.append('echo "Installing changed packages..."\n')
+                script_lines.append(self.package_manager.get_install_command(
+                    packages_to_install, self.stream_downloads, self.install_chunk_size) + "\n")
+                script_lines.append('echo "Packages installed."\n')
+
+            # Custom Commands; removed commands cannot be undone and are only reported
+            for command in diff.commands_removed:
+                script_lines.append(f"# Command no longer in profile (not reverted): {command['description']}\n")
+            if diff.commands_added:
+                script_lines.append('echo "Executing new custom commands..."\n')
+                script_lines.extend(self._generate_command_lines(compile_commands(diff.commands_added)))
+                script_lines.append('echo "Custom commands executed."\n')
 
-            logging.info(f"Install script generated at {output_path}")
+            script_lines.append('echo "Environment upgrade completed successfully."\n')
 
-            # Make the script executable
-            os.chmod(output_path, 0o755)
+            self._write_script(script_lines, output_path)
+            logger.info(f"Upgrade script generated at {output_path}")
+            return diff
         except Exception as e:
-            logging.error(f"Error generating script: {str(e)}")
+            logger.error(f"Error generating upgrade script: {str(e)}")
             raise e
 
+    def _generate_header_lines(self):
+        script_lines = []
+
+        # Shebang
+        script_lines.append(self.package_manager.backend.shebang)
+
+        # Enable error handling
+        script_lines.append("# Exit immediately if a command exits with a non-zero status\n")
+        script_lines.append("set -e\n")
+
+        # Trap errors and handle them
+        script_lines.append("trap 'echo \"An error occurred. Exiting...\"; exit 1;' ERR\n")
+
+        # User Feedback
+        script_lines.append('echo "Starting environment setup..."\n')
+        return script_lines
+
+    def _generate_env_var_lines(self, operations, shell_config_file):
+        sed_in_place = self.package_manager.backend.sed_in_place
+        script_lines = []
+        for key, value, append in operations:
+            if key == "PATH":
+                script_lines.append(f'if grep -q "export PATH=" {shell_config_file}; then\n')
+                script_lines.append(
+                    f'  {sed_in_place} -e \'s|export PATH=.*$|export PATH="{value}:$PATH"|\' {shell_config_file}\n')
+                script_lines.append(f'  echo "Updated PATH in {shell_config_file}"\n')
+                script_lines.append('else\n')
+                script_lines.append(f'  echo \'export PATH="{value}:$PATH"\' >> {shell_config_file}\n')
+                script_lines.append(f'  echo "Added PATH to {shell_config_file}"\n')
+                script_lines.append('fi\n')
+            else:
+                script_lines.append(f'if grep -q "export {key}=" {shell_config_file}; then\n')
+                script_lines.append(
+                    f'  {sed_in_place} -e \'s|export {key}=.*$|export {key}="{value}"|\' {shell_config_file}\n')
+                script_lines.append(f'  echo "Updated {key} in {shell_config_file}"\n')
+                script_lines.append('else\n')
+                script_lines.append(f'  echo \'export {key}="{value}"\' >> {shell_config_file}\n')
+                script_lines.append(f'  echo "Added {key} to {shell_config_file}"\n')
+                script_lines.append('fi\n')
+        return script_lines
+
+    def _generate_symlink_lines(self, symlinks):
+        script_lines = []
+        for link, target in symlinks:
+            # Ensure directories exist
+            script_lines.append(f'mkdir -p "$(dirname "{link}")"\n')
+            script_lines.append(f'ln -sf "{target}" "{link}"\n')
+        return script_lines
+
+    def _generate_command_lines(self, operations):
+        return [operation.command + "\n" for operation in operations]
+
+    def _write_script(self, script_lines, output_path):
+        # Write the script to the output path
+        with open(output_path, 'w') as script_file:
+            script_file.writelines(script_lines)
+
+        # Make the script executable
+        os.chmod(output_path, 0o755)
+
     def _generate_app_check_logic(self, app_install_path, overwrite, backup):
         script_lines = []
 
@@ -168,11 +328,6 @@ fi
         return script_lines
 
     def _get_shell_config_file(self):
-        if self.package_manager.platform in ["ubuntu", "debian", "rhel", "centos", "fedora", "arch"]:
-            return "~/.bashrc"
-        elif self.package_manager.platform == "macos":
-            return "~/.zshrc"
-        else:
-            return "~/.bashrc"
+        return self.package_manager.backend.shell_config_file
 
 
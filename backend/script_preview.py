@@ -0,0 +1,98 @@
+import logging
+
+from backend.package_manager import PackageManager
+from backend.profile_ir import compile_section
+from backend.script_generator import SECTIONS, ScriptGenerator
+
+logger = logging.getLogger(__name__)
+
+# Every part of the preview in script order; app install checks are not part of the preview
+PREVIEW_SECTIONS = ("header",) + SECTIONS + ("footer",)
+# Sections whose output depends on the platform (shebang, shell config file, package manager)
+PLATFORM_SECTIONS = ("header", "env_vars", "packages")
+
+
+class _PreviewScriptGenerator(ScriptGenerator):
+    """Reuses the lowered text of environment variables that did not change since the last render."""
+
+    def __init__(self, package_manager, symlinks, env_vars, custom_commands, env_var_texts, stream_downloads=False,
+                 install_chunk_size=0):
+        super().__init__(package_manager, symlinks, env_vars, custom_commands, stream_downloads, install_chunk_size)
+        self.env_var_texts = env_var_texts  # SetEnvVar -> its lowered text, refilled on every lowering
+
+    def _generate_env_var_lines(self, operations, shell_config_file):
+        previous = dict(self.env_var_texts)
+        self.env_var_texts.clear()
+        script_lines = []
+        for operation in operations:
+            text = previous.get(operation)
+            if text is None:
+                text = "".join(super()._generate_env_var_lines((operation,), shell_config_file))
+            self.env_var_texts[operation] = text
+            script_lines.append(text)
+        return script_lines
+
+
+class ScriptPreview:
+    """
+    Renders the install script one section at a time and keeps each section's compiled
+    operations and text until it is invalidated, so editing one table only re-renders that table's
+    section, and switching platforms or install options only lowers the compiled sections again.
+    """
+
+    def __init__(self, platform, stream_downloads=False, install_chunk_size=0):
+        self.platform = platform
+        self.stream_downloads = stream_downloads
+        self.install_chunk_size = install_chunk_size
+        self.operations = {}  # Section -> compiled operations, missing once invalidated
+        self.texts = {}  # Section -> rendered text, missing once invalidated
+        self.text_keys = {}  # Section -> the platform and lowering key its text was rendered with
+        self.env_var_texts = {}  # Per-variable text, so editing one variable only lowers that one
+
+    def set_platform(self, platform):
+        if platform != self.platform:
+            self.platform = platform
+            self.env_var_texts.clear()  # The shell config file and sed form may differ
+
+    def set_install_options(self, stream_downloads, install_chunk_size):
+        """The packages section is rendered again on the next render() if the options changed."""
+        self.stream_downloads = stream_downloads
+        self.install_chunk_size = install_chunk_size
+
+    def invalidate(self, *sections):
+        """Drops the cached operations and text of ``sections``, or of every section if none are given."""
+        for section in sections or PREVIEW_SECTIONS:
+            self.operations.pop(section, None)
+            self.texts.pop(section, None)
+
+    def render(self, packages, env_vars, symlinks, custom_commands):
+        """Returns (section, text, changed) for every section in script order."""
+        generator = _PreviewScriptGenerator(PackageManager(self.platform), symlinks, env_vars, custom_commands,
+                                            self.env_var_texts, self.stream_downloads, self.install_chunk_size)
+        sections = []
+        for section in PREVIEW_SECTIONS:
+            key = (self.platform if section in PLATFORM_SECTIONS else None, generator._lowering_key(section, None))
+            text = self.texts.get(section)
+            changed = text is None or self.text_keys.get(section) != key
+            if changed:
+                text = self._render_section(generator, section, packages)
+                self.texts[section] = text
+                self.text_keys[section] = key
+            sections.append((section, text, changed))
+        return sections
+
+    def _render_section(self, generator, section, packages):
+        if section not in SECTIONS:
+            return "".join(generator.generate_section_lines(section))
+        try:
+            if section not in self.operations:
+                data = {'env_vars': generator.env_vars, 'symlinks': generator.symlinks, 'packages': packages,
+                        'custom_commands': generator.custom_commands}
+                self.operations[section] = compile_section(section, data[section])
+        except ValueError as e:
+            # Shown in place of the section until the entry is fixed
+            return f"# {str(e)}\n"
+        return "".join(generator.generate_section_lines(section, operations=self.operations[section]))
+
+    def text(self):
+        return "".join(self.texts.get(section, "") for section in PREVIEW_SECTIONS)
@@ -0,0 +1,324 @@
+"""
+Benchmark suite for the hot paths of the tool, run against synthetic profiles.
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --threshold 0.25
+
+Every benchmark runs in a throwaway working directory (the database and output/ are
+created there). Results are stored as JSON; with --baseline, any benchmark whose median
+is more than --threshold slower than the baseline is reported and the exit code is 1.
+Memory benchmarks (``unit: bytes``, traced with tracemalloc) are compared the same way:
+more than --threshold above the baseline counts as a regression.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.synthetic import make_profile, make_records
+
+DEFAULT_SIZES = (10, 1000, 50000)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter: time until the window has been shown and processed its first
+# events, and until the background database initialization has finished
+STARTUP_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+from gui.main_window import MainWindow
+app = QApplication(sys.argv[:1])
+window = MainWindow()
+window.show()
+app.processEvents()
+shown = time.perf_counter() - started
+while window._db_manager is None and time.perf_counter() - started < 60:
+    app.processEvents()
+    time.sleep(0.001)
+print(shown, time.perf_counter() - started)
+"""
+
+
+def measure(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {'median': statistics.median(timings), 'min': min(timings), 'repeat': repeat}
+
+
+def bench_generate_script(size, repeat):
+    from backend.package_manager import PackageManager
+    from backend.script_generator import ScriptGenerator
+
+    profile = make_profile(size)
+    script_generator = ScriptGenerator(PackageManager(profile['os']), profile['symlinks'], profile['env_vars'],
+                                       profile['custom_commands'])
+    os.makedirs("output", exist_ok=True)
+    return {f"generate_script[{size}]": measure(
+        lambda: script_generator.generate_script(profile['packages'], os.path.join("output", "install.sh")),
+        repeat)}
+
+
+def bench_render_all_platforms(size, repeat):
+    from backend.package_manager import PackageManager
+    from backend.render_service import PLATFORMS
+    from backend.script_generator import ScriptGenerator
+
+    profile = make_profile(size)
+
+    def render_all():
+        # One compile, then one lowering per platform
+        ir = None
+        for platform in PLATFORMS:
+            script_generator = ScriptGenerator(PackageManager(platform), profile['symlinks'], profile['env_vars'],
+                                               profile['custom_commands'])
+            ir = ir or script_generator.compile(profile['packages'])
+            script_generator.render_script(profile['packages'], ir=ir)
+
+    return {f"render_all_platforms[{size}]": measure(render_all, repeat)}
+
+
+def bench_create_archive(size, repeat):
+    from backend.archive_builder import ArchiveBuilder
+
+    bench_generate_script(size, 1)
+    archive_builder = ArchiveBuilder("output")
+    return {f"create_archive[{size}]": measure(lambda: archive_builder.create_archive("bench_archive.zip"), repeat)}
+
+
+def bench_save_load_profile(size, repeat, db_manager):
+    profile = make_profile(size)
+    results = {f"save_profile[{size}]": measure(
+        lambda: db_manager.save_profile(f"bench-{size}", profile['os'], profile['packages'], profile['env_vars'],
+                                        profile['symlinks'], profile['custom_commands']), repeat)}
+
+    # Cold loads: clear the resolution cache so every run hits the database
+    results[f"load_profile[{size}]"] = measure(lambda: db_manager.load_profile(f"bench-{size}"), repeat,
+                                               setup=lambda: db_manager.resolved_cache.invalidate(f"bench-{size}"))
+    results[f"load_profile_cached[{size}]"] = measure(lambda: db_manager.load_profile(f"bench-{size}"), repeat)
+    return results
+
+
+def measure_memory(func, repeat, setup=None):
+    """
+    Traces the Python allocations of ``func``: ``median`` and ``min`` are the bytes still held
+    by its result (compared like timings), ``peak`` the largest amount allocated while it ran.
+    """
+    retained, peaks = [], []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = func()
+            if setup:
+                setup()  # Drop what func cached besides its result
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del result
+        retained.append(current)
+        peaks.append(peak)
+    return {'median': statistics.median(retained), 'min': min(retained), 'peak': max(peaks), 'repeat': repeat,
+            'unit': "bytes"}
+
+
+def bench_load_profile_memory(size, repeat, db_manager):
+    # Expects the profile saved by bench_save_load_profile; measures the resolved view of a cold load
+    profile_name = f"bench-{size}"
+    return {f"load_profile_memory[{size}]": measure_memory(
+        lambda: db_manager.load_profile(profile_name), repeat,
+        setup=lambda: db_manager.resolved_cache.invalidate(profile_name))}
+
+
+def bench_get_all_profiles(size, repeat, db_manager):
+    existing = len(db_manager.get_all_profiles())
+    records = list(make_records(max(size - existing, 0), prefix=f"all{size}-"))
+    for start in range(0, len(records), 500):
+        db_manager.import_records(records[start:start + 500])
+    return {f"get_all_profiles[{size}]": measure(db_manager.get_all_profiles, repeat)}
+
+
+def bench_async_concurrent_loads(size, repeat, concurrency=100):
+    from database.async_db_manager import AsyncDBManager
+
+    profile = make_profile(size)
+
+    async def run():
+        db_manager = AsyncDBManager(f"sqlite+aiosqlite:///{os.path.abspath('async_bench.db')}")
+        await db_manager.initialize()
+        await db_manager.save_profile(f"async-{size}", profile['os'], profile['packages'], profile['env_vars'],
+                                      profile['symlinks'], profile['custom_commands'])
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = await asyncio.gather(*[db_manager.load_profile(f"async-{size}") for _ in range(concurrency)])
+            timings.append(time.perf_counter() - started)
+            if any(len(result['packages']) != size for result in results):
+                raise AssertionError("Concurrent load returned an incomplete profile")
+        await db_manager.close()
+        return timings
+
+    timings = asyncio.run(run())
+    return {f"async_load_profile_x{concurrency}[{size}]": {
+        'median': statistics.median(timings), 'min': min(timings), 'repeat': repeat}}
+
+
+def bench_gui_tables(size, repeat):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+    from backend.profile_entries import EnvVar
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    profile = make_profile(size)
+    main_window = MainWindow()
+    main_window.packages = profile['packages']
+    main_window.env_vars = profile['env_vars']
+    main_window.symlinks = profile['symlinks']
+    main_window.custom_commands = profile['custom_commands']
+    result = measure(main_window._update_tables, repeat)
+    # Live preview after editing one environment variable (the largest section)
+    main_window.script_preview.show()
+    main_window.script_preview.refresh()
+    edits = iter(range(repeat))
+    preview_result = measure(main_window.script_preview.refresh, repeat, setup=lambda: (
+        main_window.env_vars_model.set_env_var("BENCH_VAR", EnvVar(str(next(edits))))))
+    main_window.close()
+    app.processEvents()
+    return {f"gui_update_tables[{size}]": result, f"gui_preview_env_var_edit[{size}]": preview_result}
+
+
+def bench_startup(repeat):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", PYTHONPATH=REPO_ROOT)
+    shown, ready = [], []
+    # The first launch creates the schema, later ones find the stamped database
+    for _ in range(repeat + 1):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], env=env, capture_output=True, text=True,
+                                check=True).stdout.split()
+        shown.append(float(output[-2]))
+        ready.append(float(output[-1]))
+    return {
+        "startup_window_shown": {'median': statistics.median(shown[1:]), 'min': min(shown[1:]), 'repeat': repeat},
+        "startup_database_ready": {'median': statistics.median(ready[1:]), 'min': min(ready[1:]), 'repeat': repeat}
+    }
+
+
+def run_benchmarks(sizes, repeat, include_gui=True):
+    from database.db_manager import DBManager
+
+    results = {}
+    if include_gui:
+        results.update(bench_startup(repeat))
+    db_manager = DBManager()
+    for size in sizes:
+        logging.info(f"Running benchmarks for size {size}")
+        results.update(bench_generate_script(size, repeat))
+        results.update(bench_render_all_platforms(size, repeat))
+        results.update(bench_create_archive(size, repeat))
+        results.update(bench_save_load_profile(size, repeat, db_manager))
+        results.update(bench_load_profile_memory(size, repeat, db_manager))
+        results.update(bench_get_all_profiles(size, repeat, db_manager))
+        results.update(bench_async_concurrent_loads(size, repeat))
+        if include_gui:
+            results.update(bench_gui_tables(size, repeat))
+    return results
+
+
+def format_value(value, unit=None):
+    """Timings are stored in seconds and printed in ms, memory is stored in bytes and printed in MiB."""
+    if unit == "bytes":
+        return f"{value / 2 ** 20:10.2f} MiB"
+    return f"{value * 1000:10.2f} ms"
+
+
+def compare(results, baseline, threshold):
+    """Returns (name, baseline_median, current_median, ratio, unit) for every regressed benchmark."""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or not previous['median']:
+            continue
+        ratio = current['median'] / previous['median']
+        unit = current.get('unit')
+        print(f"{name:45s} {format_value(previous['median'], unit)} -> {format_value(current['median'], unit)} "
+              f"({(ratio - 1) * 100:+6.1f}%)")
+        if ratio > 1 + threshold:
+            regressions.append((name, previous['median'], current['median'], ratio, unit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark profile generation, storage, archiving and GUI tables.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated profile sizes (default: 10,1000,50000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the median is compared")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results previously written with --output")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before a benchmark counts as a regression (default: 0.2 = 20%%)")
+    parser.add_argument("--no-gui", action="store_true", help="skip the offscreen Qt table benchmark")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)  # The database and output/ are relative to the working directory
+        try:
+            results = run_benchmarks(sizes, args.repeat, include_gui=not args.no_gui)
+        finally:
+            os.chdir(previous_dir)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    if output_path:
+        with open(output_path, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, previous, current, ratio, unit in regressions:
+            print(f"REGRESSION {name}: {format_value(previous, unit).strip()} -> "
+                  f"{format_value(current, unit).strip()} ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
+
+    for name, result in sorted(results.items()):
+        unit = result.get('unit')
+        line = f"{name:45s} median {format_value(result['median'], unit)}   min {format_value(result['min'], unit)}"
+        if 'peak' in result:
+            line += f"   peak {format_value(result['peak'], unit)}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+def make_profile(size, prefix="bench"):
+    """Builds a resolved profile view with ``size`` packages, env vars, symlinks and commands."""
+    packages = []
+    for i in range(size):
+        packages.append({
+            'name': f"{prefix}-package-{i}",
+            'version': f"{i % 7}.{i % 13}.{i % 5}" if i % 3 else "",
+            'repo_url': f"https://repo.example.com/{prefix}/{i}" if i % 97 == 0 else "",
+            'download_url': f"https://downloads.example.com/{prefix}-tool-{i}.tar.gz" if i % 101 == 0 else ""
+        })
+        # AddPackageDialog never allows both URLs on one package
+        if packages[-1]['repo_url'] and packages[-1]['download_url']:
+            packages[-1]['repo_url'] = ""
+    env_vars = {f"{prefix.upper()}_VAR_{i}": {"value": f"/opt/{prefix}/value-{i}", "append": i % 4 == 0}
+                for i in range(size)}
+    symlinks = [(f"/usr/local/bin/{prefix}-link-{i}", f"/opt/{prefix}/target-{i}") for i in range(size)]
+    custom_commands = [{'description': f"{prefix} step {i}", 'command': f"echo '{prefix} step {i}'"}
+                       for i in range(size)]
+    return {
+        'os': "ubuntu",
+        'packages': packages,
+        'env_vars': env_vars,
+        'symlinks': symlinks,
+        'custom_commands': custom_commands
+    }
+
+
+def make_records(count, prefix="bench"):
+    """Builds ``count`` small stored records, for seeding databases with many profiles."""
+    for i in range(count):
+        profile = make_profile(3, prefix=f"{prefix}{i}")
+        yield dict(profile, profile_name=f"{prefix}-profile-{i}", parents=[], removed={})
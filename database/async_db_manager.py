@@ -0,0 +1,103 @@
+import logging
+
+from sqlalchemy import event, select
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend.instrumentation import instrumented
+from database.db_manager import DBManager
+from database.models import ASYNC_DATABASE_URL, Profile, create_schema
+from database.profile_resolver import ResolvedProfileCache
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDBManager:
+    """
+    asyncio counterpart of DBManager for service deployments. Each call checks a connection
+    out of the engine's pool and runs in its own session and transaction, so concurrent calls
+    never share a session and a cancelled call is rolled back instead of left half-written.
+    """
+
+    def __init__(self, database_url=ASYNC_DATABASE_URL, pool_size=5, max_overflow=10):
+        # The aiosqlite dialect defaults to NullPool, which opens a new connection per call
+        self.engine = create_async_engine(database_url, echo=False, poolclass=AsyncAdaptedQueuePool,
+                                          pool_size=pool_size, max_overflow=max_overflow,
+                                          connect_args={"timeout": 30})
+        event.listen(self.engine.sync_engine, "connect", _configure_connection)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Shared by all sessions; entries are validated against stored revisions on every hit
+        self.resolved_cache = ResolvedProfileCache()
+
+    async def initialize(self):
+        async with self.engine.begin() as connection:
+            await connection.run_sync(create_schema)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    @instrumented("async_db.save_profile")
+    async def save_profile(self, profile_name, os_name, packages, env_vars, symlinks, custom_commands, parents=None):
+        def save(db_manager):
+            record = db_manager._build_record(profile_name, os_name, packages, env_vars, symlinks,
+                                              custom_commands, parents)
+            db_manager._write_record(profile_name, record)
+
+        try:
+            await self._run_in_transaction(save)
+            self.resolved_cache.invalidate(profile_name)
+            logger.info(f"Profile '{profile_name}' saved to database.")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving profile '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("async_db.load_profile")
+    async def load_profile(self, profile_name):
+        try:
+            profile_data = await self._run_in_transaction(lambda db_manager: db_manager._resolve(profile_name))
+            if profile_data:
+                logger.info(f"Profile '{profile_name}' loaded from database.")
+                return profile_data
+            else:
+                logger.warning(f"Profile '{profile_name}' not found in database.")
+                return None
+        except Exception as e:
+            logger.error(f"Error loading profile '{profile_name}': {str(e)}")
+            raise e
+
+    async def get_profile_revision(self, profile_name):
+        """Returns the stored revision number of a profile, or None if it does not exist."""
+        async with self.session_factory() as session:
+            result = await session.execute(select(Profile.revision).filter_by(profile_name=profile_name))
+            return result.scalar_one_or_none()
+
+    async def get_revision_stamp(self, profile_name):
+        """See DBManager.get_revision_stamp; a cheap cache key for the profile's resolved view."""
+        return await self._run_in_transaction(lambda db_manager: db_manager.get_revision_stamp(profile_name))
+
+    @instrumented("async_db.get_all_profiles")
+    async def get_all_profiles(self):
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(select(Profile.profile_name).order_by(Profile.id))
+                profile_names = list(result.scalars())
+            logger.info("Retrieved all profile names from database.")
+            return profile_names
+        except Exception as e:
+            logger.error(f"Error retrieving profiles: {str(e)}")
+            raise e
+
+    async def _run_in_transaction(self, operation):
+        # session.begin() rolls back on any exception, including asyncio.CancelledError
+        async with self.session_factory() as session:
+            async with session.begin():
+                return await session.run_sync(
+                    lambda sync_session: operation(DBManager(sync_session, self.resolved_cache)))
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    # WAL lets the pooled readers proceed while a writer holds the database
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
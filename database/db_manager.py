@@ -1,98 +1,504 @@
 from database.models import Profile, SessionLocal, initialize_database, \
-    EnvironmentVariable  # Ensure initialize_database is imported
+    EnvironmentVariable, ProfileRevision, ProfileChange  # Ensure initialize_database is imported
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from database.profile_history import normalize_record, make_delta, apply_delta, is_snapshot_revision
+from database.profile_resolver import ResolvedProfileCache, linearize, merge_layers, compute_overrides, \
+    copy_view
+from backend.profile_diff import diff_profiles
+from backend.profile_entries import EnvVar, intern_name
+from backend.instrumentation import instrumented
+from collections import defaultdict
 import logging
 import json
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 class DBManager:
-    def __init__(self):
-        initialize_database()
-        self.session = SessionLocal()
+    def __init__(self, session=None, resolved_cache=None):
+        # An existing session (e.g. the sync side of an AsyncSession) skips schema setup
+        if session is None:
+            initialize_database()
+            session = SessionLocal()
+        self.session = session
+        self.resolved_cache = resolved_cache if resolved_cache is not None else ResolvedProfileCache()
 
-    def save_profile(self, profile_name, os_name, packages, env_vars, symlinks, custom_commands):
+    def for_worker(self):
+        """Returns a DBManager with its own session (sessions are not thread-safe) sharing this cache."""
+        return DBManager(SessionLocal(), self.resolved_cache)
+
+    def close(self):
+        self.session.close()
+
+    @instrumented("db.save_profile")
+    def save_profile(self, profile_name, os_name, packages, env_vars, symlinks, custom_commands, parents=None):
         try:
-            packages_str = json.dumps(packages)
-            custom_commands_str = json.dumps(custom_commands)
+            logger.debug(f"Env Vars Before Saving: {env_vars}")  # Debugging environment variables
 
-            logging.debug(f"Env Vars Before Saving: {env_vars}")  # Debugging environment variables
+            record = self._build_record(profile_name, os_name, packages, env_vars, symlinks, custom_commands,
+                                        parents)
+            self._write_record(profile_name, record)
 
-            existing_profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
+            # Commit all changes including profile and environment variables
+            self.session.commit()
+            self.resolved_cache.invalidate(profile_name)
+            logger.info(f"Profile '{profile_name}' saved to database.")
+            return True
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error saving profile '{profile_name}': {str(e)}")
+            raise e
 
-            if existing_profile:
-                existing_profile.os = os_name
-                existing_profile.packages = packages_str
-                existing_profile.symlinks = ",".join([f"{link}:{target}" for link, target in symlinks])
-                existing_profile.custom_commands = custom_commands_str
+    @instrumented("db.autosave_profile")
+    def autosave_profile(self, profile_name, os_name, packages, env_vars, symlinks, custom_commands, parents,
+                         dirty_sections, dirty_env_vars):
+        """
+        Saves only what changed since the last save: the columns of the sections in
+        ``dirty_sections`` and the environment variable rows named in ``dirty_env_vars`` (a name
+        missing from ``env_vars`` is deleted). Like save_profile it bumps the revision, so history
+        and resolution caches stay consistent. Profiles with parents store overrides computed
+        from the whole profile and are saved in full. Returns False if the profile does not exist.
+        """
+        try:
+            profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
+            if profile is None:
+                return False
+            if parents or (profile.parents and json.loads(profile.parents)):
+                return self.save_profile(profile_name, os_name, packages, env_vars, symlinks, custom_commands,
+                                         parents=parents)
 
-                # Delete old environment variables
-                self.session.query(EnvironmentVariable).filter_by(profile_id=existing_profile.id).delete()
-            else:
-                existing_profile = Profile(
-                    profile_name=profile_name,
-                    os=os_name,
-                    packages=packages_str,
-                    symlinks=",".join([f"{link}:{target}" for link, target in symlinks]),
-                    custom_commands=custom_commands_str
-                )
-                self.session.add(existing_profile)
-                self.session.flush()  # Ensure the profile ID is generated
-
-            # Add new environment variables
-            for k, v in env_vars.items():
-                if isinstance(v, dict):
-                    new_env_var = EnvironmentVariable(
-                        profile_id=existing_profile.id,  # Ensure the profile_id is set
-                        name=k,
-                        value=v["value"],
-                        append=1 if v["append"] else 0
-                    )
-                    self.session.add(new_env_var)
-                else:
-                    raise ValueError(f"Expected a dictionary for environment variable value, but got {type(v)}")
+            previous_record = normalize_record(self._record_from_profile(profile))
+            record = dict(previous_record)
+            if 'os' in dirty_sections:
+                record['os'] = os_name
+                profile.os = os_name
+            if 'packages' in dirty_sections:
+                record['packages'] = packages
+            if 'symlinks' in dirty_sections:
+                record['symlinks'] = symlinks
+                profile.symlinks = ",".join([f"{link}:{target}" for link, target in symlinks])
+            if 'custom_commands' in dirty_sections:
+                record['custom_commands'] = custom_commands
+            if dirty_env_vars:
+                record['env_vars'] = self._update_env_var_rows(profile, previous_record['env_vars'], env_vars,
+                                                               dirty_env_vars)
+            # Normalizing turns the entries into the JSON dicts that are stored
+            record = normalize_record(record)
+            if 'packages' in dirty_sections:
+                profile.packages = json.dumps(record['packages'])
+            if 'custom_commands' in dirty_sections:
+                profile.custom_commands = json.dumps(record['custom_commands'])
+            if record == previous_record:
+                return True
 
-            # Commit all changes including profile and environment variables
+            profile.revision = (profile.revision or 0) + 1
+            self._append_revision(profile, previous_record if profile.revision > 1 else None, record)
             self.session.commit()
-            logging.info(f"Profile '{profile_name}' saved to database.")
+            self.resolved_cache.invalidate(profile_name)
+            logger.info(f"Profile '{profile_name}' autosaved: sections {sorted(dirty_sections)}, "
+                        f"{len(dirty_env_vars)} environment variables.")
             return True
         except Exception as e:
             self.session.rollback()
-            logging.error(f"Error saving profile '{profile_name}': {str(e)}")
+            logger.error(f"Error autosaving profile '{profile_name}': {str(e)}")
             raise e
 
+    @staticmethod
+    def _update_env_var_rows(profile, stored_env_vars, env_vars, names):
+        """Inserts, updates or deletes the rows of the named variables; returns the new env_vars section."""
+        rows = {env_var.name: env_var for env_var in profile.environment_variables}
+        updated = dict(stored_env_vars)
+        for name in names:
+            entry = env_vars.get(name)
+            row = rows.get(name)
+            if entry is None:
+                updated.pop(name, None)
+                if row is not None:
+                    profile.environment_variables.remove(row)
+            elif row is None:
+                updated[name] = entry
+                profile.environment_variables.append(
+                    EnvironmentVariable(name=name, value=entry["value"], append=1 if entry["append"] else 0))
+            else:
+                updated[name] = entry
+                row.value = entry["value"]
+                row.append = 1 if entry["append"] else 0
+        return updated
+
+    @instrumented("db.load_profile")
     def load_profile(self, profile_name):
+        try:
+            profile_data = self._resolve(profile_name)
+            if profile_data:
+                logger.info(f"Profile '{profile_name}' loaded from database.")
+                return profile_data
+            else:
+                logger.warning(f"Profile '{profile_name}' not found in database.")
+                return None
+        except Exception as e:
+            logger.error(f"Error loading profile '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("db.resolve_parents")
+    def resolve_parents(self, profile_name, parents):
+        """Returns the merged view a profile with the given parents would inherit."""
+        try:
+            return copy_view(self._resolve_parents(profile_name, parents))
+        except Exception as e:
+            logger.error(f"Error resolving parents {parents} for '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("db.get_profile_history")
+    def get_profile_history(self, profile_name):
         try:
             profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
-            if profile:
-                packages = json.loads(profile.packages)
-                env_vars = {env_var.name: {"value": env_var.value, "append": bool(env_var.append)}
-                            for env_var in profile.environment_variables}
-                symlinks = []
-                if profile.symlinks and ':' in profile.symlinks:
-                    symlinks = [tuple(link.split(':')) for link in profile.symlinks.split(',')]
-                custom_commands = json.loads(profile.custom_commands) if profile.custom_commands else []
-
-                logging.info(f"Profile '{profile_name}' loaded from database.")
-                return {
-                    'os': profile.os,
-                    'packages': packages,
-                    'env_vars': env_vars,
-                    'symlinks': symlinks,
-                    'custom_commands': custom_commands
-                }
+            if not profile:
+                logger.warning(f"Profile '{profile_name}' not found in database.")
+                return []
+            revisions = self.session.query(ProfileRevision.revision, ProfileRevision.created_at) \
+                .filter_by(profile_id=profile.id).order_by(ProfileRevision.revision).all()
+            return [{'revision': revision, 'created_at': created_at} for revision, created_at in revisions]
+        except Exception as e:
+            logger.error(f"Error retrieving history of profile '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("db.load_profile_revision")
+    def load_profile_revision(self, profile_name, revision):
+        """Returns a past revision resolved against the current state of its parent profiles."""
+        try:
+            record = self._load_revision_record(profile_name, revision)
+            if record['parents']:
+                view = merge_layers([self._resolve_parents(profile_name, record['parents']), record])
             else:
-                logging.warning(f"Profile '{profile_name}' not found in database.")
+                view = merge_layers([record])
+            view['parents'] = record['parents']
+            logger.info(f"Revision {revision} of profile '{profile_name}' loaded from database.")
+            return view
+        except Exception as e:
+            logger.error(f"Error loading revision {revision} of profile '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("db.diff_revisions")
+    def diff_revisions(self, profile_name, old_revision, new_revision=None):
+        """Returns a ProfileDiff between two revisions; ``new_revision`` defaults to the current profile."""
+        old_view = self.load_profile_revision(profile_name, old_revision)
+        if new_revision is None:
+            new_view = self.load_profile(profile_name)
+        else:
+            new_view = self.load_profile_revision(profile_name, new_revision)
+        return diff_profiles(old_view, new_view)
+
+    @instrumented("db.rollback_profile")
+    def rollback_profile(self, profile_name, revision):
+        """Restores a past revision by saving it again as the newest revision."""
+        try:
+            record = self._load_revision_record(profile_name, revision)
+            if record['parents']:
+                # The parent graph may have changed since this revision was saved
+                self._resolve_parents(profile_name, record['parents'])
+            self._write_record(profile_name, record)
+            self.session.commit()
+            self.resolved_cache.invalidate(profile_name)
+            logger.info(f"Profile '{profile_name}' rolled back to revision {revision}.")
+            return True
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error rolling back profile '{profile_name}' to revision {revision}: {str(e)}")
+            raise e
+
+    @instrumented("db.import_records")
+    def import_records(self, records, skip_unchanged=False):
+        """
+        Stores already validated profile records (see profile_transfer) in a single transaction and
+        returns how many were written. With ``skip_unchanged``, records equal to what is already
+        stored are left alone, so re-importing a file only adds revisions for what changed.
+        """
+        try:
+            # One lookup for the whole batch instead of one query (and autoflush) per record
+            names = {record['profile_name'] for record in records}
+            existing_profiles = {profile.profile_name: profile for profile in
+                                 self.session.query(Profile).options(selectinload(Profile.environment_variables))
+                                 .filter(Profile.profile_name.in_(names)).all()}
+            written = 0
+            with self.session.no_autoflush:
+                for record in records:
+                    written += self._write_record(record['profile_name'], record, existing_profiles, skip_unchanged)
+            self.session.commit()
+            for record in records:
+                self.resolved_cache.invalidate(record['profile_name'])
+            return written
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error importing {len(records)} profiles: {str(e)}")
+            raise e
+
+    def get_parent_graph(self):
+        """Returns the declared parents of every stored profile, by profile name."""
+        return {name: json.loads(parents) if parents else []
+                for name, parents in self.session.query(Profile.profile_name, Profile.parents).all()}
+
+    def get_revision_stamp(self, profile_name):
+        """
+        Returns the sorted (name, id, revision) of a profile and its ancestors, or None if it does
+        not exist. The stamp changes whenever the profile's resolved view may have changed.
+        """
+        stamp = []
+        requested = {profile_name}
+        pending = {profile_name}
+        while pending:
+            rows = self.session.query(Profile.profile_name, Profile.id, Profile.revision, Profile.parents) \
+                .filter(Profile.profile_name.in_(pending)).all()
+            if profile_name in pending and not any(row[0] == profile_name for row in rows):
                 return None
+            stamp.extend((name, profile_id, revision or 0) for name, profile_id, revision, parents in rows)
+            pending = {parent for row in rows for parent in (json.loads(row[3]) if row[3] else [])} - requested
+            requested |= pending
+        return tuple(sorted(stamp))
+
+    def get_change_sequence(self):
+        """Returns the sequence number of the latest recorded change, 0 if there is none."""
+        return self.session.query(func.max(ProfileChange.id)).scalar() or 0
+
+    def get_changes(self, after_sequence):
+        """Returns (sequence, profile_name) for every change recorded after ``after_sequence``, oldest first."""
+        return [tuple(row) for row in self.session.query(ProfileChange.id, ProfileChange.profile_name)
+                .filter(ProfileChange.id > after_sequence).order_by(ProfileChange.id).all()]
+
+    def refresh(self):
+        """
+        Ends the session's read transaction and forgets loaded rows, so the next queries see what
+        other processes committed in the meantime. Long-running readers call this before polling.
+        """
+        self.session.rollback()
+
+    def find_inheritance_errors(self, profile_names):
+        """Returns a message for every given profile with a missing parent or an inheritance cycle."""
+        graph = self.get_parent_graph()
+        errors = []
+        for profile_name in profile_names:
+            try:
+                linearize(profile_name, graph.get(profile_name, []), lambda name: graph[name])
+            except ValueError as e:
+                errors.append(f"Profile '{profile_name}': {str(e)}")
+        return errors
+
+    def get_stored_record(self, profile):
+        """Returns the record stored for a Profile row: its own overrides, parents and removals."""
+        return normalize_record(self._record_from_profile(profile))
+
+    @instrumented("db.save_lockfile")
+    def save_lockfile(self, profile_name, platform, lock):
+        """Stores the lock of one platform with a profile, keeping the locks of other platforms."""
+        try:
+            profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
+            if profile is None:
+                logger.warning(f"Profile '{profile_name}' not found in database.")
+                return False
+            locks = json.loads(profile.lockfile) if profile.lockfile else {}
+            locks[platform] = lock
+            profile.lockfile = json.dumps(locks)
+            # Artifacts are generated from the lock, so watchers rebuild them too
+            self.session.add(ProfileChange(profile_name=profile_name, revision=profile.revision or 0))
+            self.session.commit()
+            logger.info(f"Lockfile for profile '{profile_name}' on {platform} saved.")
+            return True
         except Exception as e:
-            logging.error(f"Error loading profile '{profile_name}': {str(e)}")
+            self.session.rollback()
+            logger.error(f"Error saving lockfile for profile '{profile_name}': {str(e)}")
             raise e
 
+    @instrumented("db.load_lockfile")
+    def load_lockfile(self, profile_name, platform):
+        """Returns the lock stored for a profile on a platform, or None."""
+        try:
+            lockfile = self.session.query(Profile.lockfile).filter_by(profile_name=profile_name).scalar()
+            return json.loads(lockfile).get(platform) if lockfile else None
+        except Exception as e:
+            logger.error(f"Error loading lockfile for profile '{profile_name}': {str(e)}")
+            raise e
+
+    @instrumented("db.get_all_profiles")
     def get_all_profiles(self):
         try:
             profiles = self.session.query(Profile).all()
             profile_names = [profile.profile_name for profile in profiles]
-            logging.info("Retrieved all profile names from database.")
+            logger.info("Retrieved all profile names from database.")
             return profile_names
         except Exception as e:
-            logging.error(f"Error retrieving profiles: {str(e)}")
-            raise e
\ No newline at end of file
+            logger.error(f"Error retrieving profiles: {str(e)}")
+            raise e
+
+    def _build_record(self, profile_name, os_name, packages, env_vars, symlinks, custom_commands, parents):
+        parents = list(parents or [])
+        for k, v in env_vars.items():
+            if not isinstance(v, (dict, EnvVar)):
+                raise ValueError(f"Expected a dictionary for environment variable value, but got {type(v)}")
+
+        data = {
+            'os': os_name,
+            'packages': packages,
+            'env_vars': env_vars,
+            'symlinks': symlinks,
+            'custom_commands': custom_commands
+        }
+        # Child profiles only store what differs from the resolved view of their parents
+        if parents:
+            record = compute_overrides(data, self._resolve_parents(profile_name, parents))
+        else:
+            record = dict(data, removed={})
+        record['os'] = os_name
+        record['parents'] = parents
+        return record
+
+    def _write_record(self, profile_name, record, existing_profiles=None, skip_unchanged=False):
+        """
+        Stores a profile record and appends it to the profile's revision history. Returns False if
+        ``skip_unchanged`` is set and the stored record is the same.
+        """
+        record = normalize_record(record)
+        if existing_profiles is not None:
+            existing_profile = existing_profiles.get(profile_name)
+        else:
+            existing_profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
+
+        if existing_profile:
+            previous_record = normalize_record(self._record_from_profile(existing_profile))
+            if skip_unchanged and previous_record == record:
+                return False
+            previous_revision = existing_profile.revision or 0
+            existing_profile.os = record['os']
+            existing_profile.packages = json.dumps(record['packages'])
+            existing_profile.symlinks = ",".join([f"{link}:{target}" for link, target in record['symlinks']])
+            existing_profile.custom_commands = json.dumps(record['custom_commands'])
+            existing_profile.parents = json.dumps(record['parents'])
+            existing_profile.removed = json.dumps(record['removed'])
+            existing_profile.revision = previous_revision + 1
+
+            # Delete old environment variables
+            existing_profile.environment_variables.clear()
+        else:
+            previous_record = None
+            existing_profile = Profile(
+                profile_name=profile_name,
+                os=record['os'],
+                packages=json.dumps(record['packages']),
+                symlinks=",".join([f"{link}:{target}" for link, target in record['symlinks']]),
+                custom_commands=json.dumps(record['custom_commands']),
+                parents=json.dumps(record['parents']),
+                removed=json.dumps(record['removed']),
+                revision=1
+            )
+            self.session.add(existing_profile)
+            if existing_profiles is not None:
+                existing_profiles[profile_name] = existing_profile
+
+        # Add new environment variables
+        for k, v in record['env_vars'].items():
+            new_env_var = EnvironmentVariable(
+                name=k,
+                value=v["value"],
+                append=1 if v["append"] else 0
+            )
+            existing_profile.environment_variables.append(new_env_var)
+
+        # Profiles saved before history existed (revision 0) have no previous revision to diff against
+        has_previous = previous_record is not None and previous_revision > 0
+        self._append_revision(existing_profile, previous_record if has_previous else None, record)
+        return True
+
+    def _append_revision(self, profile, previous_record, record):
+        revision = profile.revision
+        self.session.add(ProfileChange(profile_name=profile.profile_name, revision=revision))
+        if is_snapshot_revision(revision) or previous_record is None:
+            revision_row = ProfileRevision(profile=profile, revision=revision, snapshot=1, data=json.dumps(record))
+        else:
+            revision_row = ProfileRevision(profile=profile, revision=revision, snapshot=0,
+                                           data=json.dumps(make_delta(previous_record, record)))
+        self.session.add(revision_row)
+
+    def _load_revision_record(self, profile_name, revision):
+        profile = self.session.query(Profile).filter_by(profile_name=profile_name).first()
+        if not profile:
+            raise ValueError(f"Profile '{profile_name}' not found.")
+        snapshot = self.session.query(ProfileRevision) \
+            .filter(ProfileRevision.profile_id == profile.id, ProfileRevision.revision <= revision,
+                    ProfileRevision.snapshot == 1) \
+            .order_by(ProfileRevision.revision.desc()).first()
+        if not snapshot:
+            raise ValueError(f"Revision {revision} of profile '{profile_name}' not found.")
+        deltas = self.session.query(ProfileRevision) \
+            .filter(ProfileRevision.profile_id == profile.id, ProfileRevision.revision > snapshot.revision,
+                    ProfileRevision.revision <= revision) \
+            .order_by(ProfileRevision.revision).all()
+        if snapshot.revision + len(deltas) != revision:
+            raise ValueError(f"Revision {revision} of profile '{profile_name}' not found.")
+        record = json.loads(snapshot.data)
+        for delta in deltas:
+            record = apply_delta(record, json.loads(delta.data))
+        return record
+
+    def _resolve(self, profile_name):
+        chain = self.resolved_cache.chain(profile_name)
+        if chain:
+            view = self.resolved_cache.get(profile_name, self._get_revisions(chain))
+            if view is not None:
+                return copy_view(view)
+
+        records = self._load_records([profile_name])
+        if profile_name not in records:
+            return None
+        order = linearize(profile_name, records[profile_name]['parents'], lambda name: records[name]['parents'])
+        view = merge_layers([records[name] for name in order])
+        view['parents'] = records[profile_name]['parents']
+        self.resolved_cache.put(profile_name, [(name, records[name]['revision']) for name in order], view)
+        return copy_view(view)
+
+    def _resolve_parents(self, profile_name, parents):
+        # Cycle detection runs against the stored graph plus the proposed parents
+        records = self._load_records(parents)
+        order = linearize(profile_name, parents, lambda name: records[name]['parents'])
+        return merge_layers([records[name] for name in order[:-1]])
+
+    def _load_records(self, profile_names):
+        """Loads the stored records of the given profiles and all of their ancestors."""
+        records = {}
+        requested = set(profile_names)
+        pending = set(profile_names)
+        while pending:
+            profiles = self.session.query(Profile).filter(Profile.profile_name.in_(pending)).all()
+            # Plain column rows instead of EnvironmentVariable objects, which cost more than the entries built from them
+            env_var_rows = defaultdict(list)
+            for row in self.session.query(EnvironmentVariable.profile_id, EnvironmentVariable.name,
+                                          EnvironmentVariable.value, EnvironmentVariable.append) \
+                    .filter(EnvironmentVariable.profile_id.in_([profile.id for profile in profiles])) \
+                    .order_by(EnvironmentVariable.id):
+                env_var_rows[row[0]].append(row[1:])
+            for profile in profiles:
+                records[profile.profile_name] = self._record_from_profile(profile, env_var_rows[profile.id])
+            pending = {parent for record in records.values() for parent in record['parents']} - requested
+            requested |= pending
+        return records
+
+    def _get_revisions(self, profile_names):
+        rows = self.session.query(Profile.profile_name, Profile.revision) \
+            .filter(Profile.profile_name.in_(profile_names)).all()
+        return {name: revision or 0 for name, revision in rows}
+
+    @staticmethod
+    def _record_from_profile(profile, env_var_rows=None):
+        """``env_var_rows`` are (name, value, append) rows, read from the profile's relationship if not given."""
+        if env_var_rows is None:
+            env_var_rows = [(env_var.name, env_var.value, env_var.append) for env_var in profile.environment_variables]
+        symlinks = []
+        if profile.symlinks and ':' in profile.symlinks:
+            symlinks = [tuple(link.split(':')) for link in profile.symlinks.split(',')]
+        return {
+            'os': profile.os,
+            'parents': json.loads(profile.parents) if profile.parents else [],
+            'packages': json.loads(profile.packages) if profile.packages else [],
+            'env_vars': {intern_name(name): EnvVar(value, append) for name, value, append in env_var_rows},
+            'symlinks': symlinks,
+            'custom_commands': json.loads(profile.custom_commands) if profile.custom_commands else [],
+            'removed': json.loads(profile.removed) if profile.removed else {},
+            'revision': profile.revision or 0
+        }
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint, \
+    inspect, text
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from datetime import datetime
 
 DATABASE_URL = "sqlite:///env_setup.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///env_setup.db"  # Used by database.async_db_manager
 engine = create_engine(DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
@@ -14,7 +17,12 @@ class Profile(Base):
     packages = Column(Text)
     symlinks = Column(Text)
     custom_commands = Column(Text)
+    parents = Column(Text)  # JSON list of parent profile names, in merge order
+    removed = Column(Text)  # JSON dict of section -> keys hidden from the parents
+    revision = Column(Integer, nullable=False, default=0)  # Bumped on every save
+    lockfile = Column(Text)  # JSON dict of platform -> lock (see backend.lockfile), not part of revisions
     environment_variables = relationship("EnvironmentVariable", back_populates="profile", cascade="all, delete, delete-orphan")
+    revisions = relationship("ProfileRevision", back_populates="profile", cascade="all, delete, delete-orphan")
 
 class EnvironmentVariable(Base):
     __tablename__ = 'environment_variables'
@@ -25,5 +33,52 @@ class EnvironmentVariable(Base):
     append = Column(Integer, nullable=False, default=0)  # 0 or 1 for False/True
     profile = relationship("Profile", back_populates="environment_variables")
 
+class ProfileRevision(Base):
+    __tablename__ = 'profile_revisions'
+    __table_args__ = (UniqueConstraint('profile_id', 'revision'),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profile_id = Column(Integer, ForeignKey('profiles.id'), nullable=False)
+    revision = Column(Integer, nullable=False)
+    snapshot = Column(Integer, nullable=False, default=0)  # 1 if data is a full record, 0 if a delta
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    profile = relationship("Profile", back_populates="revisions")
+
+class ProfileChange(Base):
+    """One row per stored change of a profile or its lockfile; the id is a sequence number for watchers."""
+    __tablename__ = 'profile_changes'
+    # AUTOINCREMENT keeps SQLite from reusing the ids of deleted rows, so sequence numbers only grow
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profile_name = Column(String(255), nullable=False)
+    revision = Column(Integer, nullable=False)  # The profile's revision after the change
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Stored in SQLite's PRAGMA user_version; bump it whenever the tables or PROFILE_COLUMN_MIGRATIONS change
+SCHEMA_VERSION = 3
+
+# Columns added after the first release; create_all() does not alter existing tables
+PROFILE_COLUMN_MIGRATIONS = {
+    'parents': "parents TEXT",
+    'removed': "removed TEXT",
+    'revision': "revision INTEGER NOT NULL DEFAULT 0",
+    'lockfile': "lockfile TEXT",
+}
+
 def initialize_database():
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    with engine.begin() as connection:
+        create_schema(connection)
+
+def create_schema(connection):
+    # A database stamped with the current version needs no reflection or DDL at all
+    if connection.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION:
+        return
+    Base.metadata.create_all(connection)
+    _add_missing_columns(connection)
+    connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def _add_missing_columns(connection):
+    existing_columns = {column['name'] for column in inspect(connection).get_columns(Profile.__tablename__)}
+    for column_name, column_ddl in PROFILE_COLUMN_MIGRATIONS.items():
+        if column_name not in existing_columns:
+            connection.execute(text(f"ALTER TABLE {Profile.__tablename__} ADD COLUMN {column_ddl}"))
@@ -0,0 +1,81 @@
+import json
+from difflib import SequenceMatcher
+
+# Every SNAPSHOT_INTERVAL-th revision stores the full record, so loading any revision
+# replays at most SNAPSHOT_INTERVAL - 1 deltas.
+SNAPSHOT_INTERVAL = 16
+
+LIST_SECTIONS = ("packages", "symlinks", "custom_commands")
+SCALAR_FIELDS = ("os", "parents", "removed")
+
+
+def is_snapshot_revision(revision):
+    return revision % SNAPSHOT_INTERVAL == 1
+
+
+def normalize_record(record):
+    """Returns a JSON-compatible copy of a stored profile record."""
+    return {
+        'os': record['os'],
+        'parents': list(record.get('parents') or []),
+        'packages': [dict(pkg) for pkg in record.get('packages') or []],
+        'env_vars': {k: {"value": v["value"], "append": bool(v["append"])}
+                     for k, v in (record.get('env_vars') or {}).items()},
+        'symlinks': [list(link) for link in record.get('symlinks') or []],
+        'custom_commands': [dict(cmd) for cmd in record.get('custom_commands') or []],
+        'removed': {section: list(keys) for section, keys in (record.get('removed') or {}).items()}
+    }
+
+
+def make_delta(old_record, new_record):
+    """Encodes the changes between two normalized records as a compact JSON-compatible dict."""
+    delta = {}
+    for field in SCALAR_FIELDS:
+        if old_record[field] != new_record[field]:
+            delta[field] = new_record[field]
+
+    for section in LIST_SECTIONS:
+        old_entries = old_record[section]
+        new_entries = new_record[section]
+        if old_entries == new_entries:
+            continue
+        matcher = SequenceMatcher(None, _hashable(old_entries), _hashable(new_entries), autojunk=False)
+        # Each edit replaces old[i1:i2] with the listed new entries
+        delta[section] = [[i1, i2, new_entries[j1:j2]]
+                          for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+    old_env = old_record['env_vars']
+    new_env = new_record['env_vars']
+    env_set = {k: v for k, v in new_env.items() if old_env.get(k) != v}
+    env_unset = [k for k in old_env if k not in new_env]
+    if env_set or env_unset:
+        delta['env_vars'] = {'set': env_set, 'unset': env_unset}
+    return delta
+
+
+def apply_delta(record, delta):
+    """Applies a delta produced by ``make_delta`` to a normalized record, returning a new record."""
+    result = dict(record)
+    for field in SCALAR_FIELDS:
+        if field in delta:
+            result[field] = delta[field]
+
+    for section in LIST_SECTIONS:
+        if section in delta:
+            entries = list(record[section])
+            # Apply from the end so earlier indexes stay valid
+            for i1, i2, replacement in reversed(delta[section]):
+                entries[i1:i2] = replacement
+            result[section] = entries
+
+    if 'env_vars' in delta:
+        env_vars = dict(record['env_vars'])
+        for key in delta['env_vars']['unset']:
+            env_vars.pop(key, None)
+        env_vars.update(delta['env_vars']['set'])
+        result['env_vars'] = env_vars
+    return result
+
+
+def _hashable(entries):
+    return [json.dumps(entry, sort_keys=True) for entry in entries]
@@ -0,0 +1,180 @@
+import json
+import threading
+from collections import OrderedDict
+from backend.profile_entries import commands_from_dicts, env_vars_from_dicts, intern_name, packages_from_dicts
+
+# Profile sections that can be inherited from parent profiles
+SECTIONS = ("packages", "env_vars", "symlinks", "custom_commands")
+
+
+class ProfileCycleError(ValueError):
+    pass
+
+
+def entry_key(section, entry):
+    """Returns the key a child profile uses to override or remove an inherited entry."""
+    if section == "packages":
+        return entry['name']
+    if section == "symlinks":
+        return entry[0]
+    if section == "custom_commands":
+        return json.dumps([entry['description'], entry['command']])
+    raise ValueError(f"Unknown profile section '{section}'")
+
+
+def _keyed_entries(section, entries):
+    if not entries:
+        return []
+    if section == "env_vars":
+        return list(env_vars_from_dicts(entries).items())
+    if section == "symlinks":
+        return [(entry_key(section, entry), tuple(entry)) for entry in entries]
+    if section == "packages":
+        return [(package.name, package) for package in packages_from_dicts(entries)]
+    return [(entry_key(section, command), command) for command in commands_from_dicts(entries)]
+
+
+def _section_from_entries(section, entries):
+    if section == "env_vars":
+        return dict(entries)
+    return list(entries.values())
+
+
+def linearize(profile_name, parents, get_parents):
+    """
+    Orders a profile and its ancestors for merging: parents are visited depth-first in
+    declaration order, every ancestor appears once, and the profile itself comes last.
+    """
+    order = []
+    visiting = []
+    done = set()
+
+    def visit(name, name_parents):
+        if name in visiting:
+            cycle = " -> ".join(visiting[visiting.index(name):] + [name])
+            raise ProfileCycleError(f"Profile inheritance cycle detected: {cycle}")
+        if name in done:
+            return
+        visiting.append(name)
+        for parent in name_parents:
+            try:
+                parent_parents = get_parents(parent)
+            except KeyError:
+                raise ValueError(f"Parent profile '{parent}' of '{name}' does not exist.")
+            visit(parent, parent_parents)
+        visiting.pop()
+        done.add(name)
+        order.append(name)
+
+    visit(profile_name, list(parents or []))
+    return order
+
+
+def merge_layers(layers):
+    """Folds profile records (ancestors first, the profile itself last) into a resolved view."""
+    if len(layers) == 1:
+        # No inheritance: keep the stored lists exactly as saved, duplicates included
+        record = layers[0]
+        return {
+            'os': intern_name(record['os']),
+            'packages': packages_from_dicts(record.get('packages')),
+            'env_vars': env_vars_from_dicts(record.get('env_vars')),
+            'symlinks': [tuple(link) for link in record.get('symlinks') or []],
+            'custom_commands': commands_from_dicts(record.get('custom_commands'))
+        }
+
+    merged = {section: OrderedDict() for section in SECTIONS}
+    os_name = None
+    for record in layers:
+        os_name = record.get('os') or os_name
+        removed = record.get('removed') or {}
+        for section in SECTIONS:
+            entries = merged[section]
+            # Overrides replace inherited entries in place; new entries go at the end
+            for key, entry in _keyed_entries(section, record.get(section)):
+                entries[key] = entry
+            for key in removed.get(section, []):
+                entries.pop(key, None)
+
+    view = {'os': intern_name(os_name)}
+    for section in SECTIONS:
+        view[section] = _section_from_entries(section, merged[section])
+    return view
+
+
+def apply_overrides(base_view, data):
+    """Overlays full profile ``data`` on top of ``base_view`` without removing inherited entries."""
+    return merge_layers([dict(base_view, removed={}), dict(data, removed={})])
+
+
+def compute_overrides(data, base_view):
+    """Returns the sections a child must store so that its parents' view resolves to ``data``."""
+    record = {'removed': {}}
+    for section in SECTIONS:
+        inherited = dict(_keyed_entries(section, base_view.get(section)))
+        own = OrderedDict(_keyed_entries(section, data.get(section)))
+        changed = OrderedDict((key, entry) for key, entry in own.items() if inherited.get(key) != entry)
+        record[section] = _section_from_entries(section, changed)
+        removed = [key for key in inherited if key not in own]
+        if removed:
+            record['removed'][section] = removed
+    return record
+
+
+def copy_view(view):
+    """
+    Copies a resolved view so callers can add, replace and remove entries without touching the
+    cache. The entries are immutable, so the copy shares them.
+    """
+    return {
+        'os': view['os'],
+        'parents': list(view.get('parents', [])),
+        'packages': list(view['packages']),
+        'env_vars': dict(view['env_vars']),
+        'symlinks': list(view['symlinks']),
+        'custom_commands': list(view['custom_commands'])
+    }
+
+
+class ResolvedProfileCache:
+    """
+    Memoizes resolved profile views. Each entry is stamped with the revision of every profile
+    in its ancestor chain, so a save anywhere up the chain makes the entry stale. Safe to share
+    between DBManagers on different threads.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def chain(self, profile_name):
+        with self._lock:
+            entry = self._entries.get(profile_name)
+            return [name for name, _ in entry[0]] if entry else []
+
+    def get(self, profile_name, revisions):
+        with self._lock:
+            entry = self._entries.get(profile_name)
+            if entry is None:
+                return None
+            stamp, view = entry
+            if any(revisions.get(name) != revision for name, revision in stamp):
+                del self._entries[profile_name]
+                return None
+            self._entries.move_to_end(profile_name)
+            return view
+
+    def put(self, profile_name, stamp, view):
+        with self._lock:
+            self._entries[profile_name] = (tuple(stamp), view)
+            self._entries.move_to_end(profile_name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, profile_name):
+        with self._lock:
+            stale = [name for name, (stamp, _) in self._entries.items()
+                     if any(ancestor == profile_name for ancestor, _ in stamp)]
+            for name in stale:
+                del self._entries[name]
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy.orm import selectinload
+
+from database.models import Profile
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 500
+PARSE_CHUNK_SIZE = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []  # (line_number, message)
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+
+def export_profiles(db_manager, output_file, progress=None):
+    """
+    Streams every stored profile record to ``output_file`` as one JSON object per line.
+    Rows are fetched in batches, so memory use does not grow with the number of profiles.
+    """
+    started = time.perf_counter()
+    exported = 0
+    query = db_manager.session.query(Profile) \
+        .options(selectinload(Profile.environment_variables)) \
+        .order_by(Profile.id) \
+        .yield_per(EXPORT_BATCH_SIZE)
+    try:
+        for profile in query:
+            record = db_manager.get_stored_record(profile)
+            output_file.write(json.dumps(dict(profile_name=profile.profile_name, **record)) + "\n")
+            exported += 1
+            if progress and exported % EXPORT_BATCH_SIZE == 0:
+                progress(exported, 0, time.perf_counter() - started)
+        if progress:
+            progress(exported, 0, time.perf_counter() - started)
+        logger.info(f"Exported {exported} profiles.")
+        return exported
+    except Exception as e:
+        logger.error(f"Error exporting profiles: {str(e)}")
+        raise e
+
+
+def import_profiles(db_manager, input_file, workers=None, batch_size=500, progress=None, skip_unchanged=False):
+    """
+    Streams JSON lines from ``input_file`` into the database. Lines are parsed and validated
+    in chunks by a pool of worker processes while a single writer stores valid records in
+    batched transactions. Invalid records are reported in the returned ImportReport. With
+    ``skip_unchanged``, records that match the stored profile are not written again.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    pending_records = []
+    child_profiles = set()
+
+    def write_batch():
+        report.imported += db_manager.import_records(pending_records, skip_unchanged)
+        pending_records.clear()
+        report.elapsed = time.perf_counter() - started
+        if progress:
+            progress(report.imported, len(report.errors), report.elapsed)
+
+    try:
+        for records, errors in _parse_chunks(input_file, workers):
+            report.errors.extend(errors)
+            for record in records:
+                if record['parents']:
+                    child_profiles.add(record['profile_name'])
+                pending_records.append(record)
+                if len(pending_records) >= batch_size:
+                    write_batch()
+        if pending_records:
+            write_batch()
+
+        # Parents may appear after their children in the file, so inheritance is checked last
+        report.errors.extend((None, message) for message in db_manager.find_inheritance_errors(child_profiles))
+        report.elapsed = time.perf_counter() - started
+        logger.info(f"Imported {report.imported} profiles with {len(report.errors)} errors.")
+        return report
+    except Exception as e:
+        logger.error(f"Error importing profiles: {str(e)}")
+        raise e
+
+
+def print_progress(count, errors, elapsed):
+    rate = count / elapsed if elapsed else 0.0
+    sys.stderr.write(f"\r{count} profiles, {errors} invalid, {rate:.0f} profiles/s")
+    sys.stderr.flush()
+
+
+def _parse_chunks(input_file, workers):
+    """Yields (records, errors) per chunk of lines, in input order."""
+    chunks = _read_chunks(input_file)
+    if workers == 0:
+        for first_line, lines in chunks:
+            yield _parse_chunk(first_line, lines)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of chunks in flight so the input is never read ahead unboundedly
+        in_flight = deque()
+        max_in_flight = (workers or os.cpu_count() or 1) * 2
+        for first_line, lines in chunks:
+            in_flight.append(executor.submit(_parse_chunk, first_line, lines))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def _read_chunks(input_file):
+    line_number = 1
+    while True:
+        lines = list(islice(input_file, PARSE_CHUNK_SIZE))
+        if not lines:
+            return
+        yield line_number, lines
+        line_number += len(lines)
+
+
+def _parse_chunk(first_line, lines):
+    records = []
+    errors = []
+    for line_number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            records.append(validate_record(json.loads(line)))
+        except (ValueError, TypeError, KeyError) as e:
+            errors.append((line_number, str(e)))
+    return records, errors
+
+
+def validate_record(data):
+    """Checks an exported profile record and returns it with optional fields filled in."""
+    if not isinstance(data, dict):
+        raise ValueError("Record must be a JSON object.")
+    profile_name = data.get('profile_name')
+    if not isinstance(profile_name, str) or not profile_name.strip():
+        raise ValueError("Record has no profile_name.")
+    if not isinstance(data.get('os'), str) or not data['os']:
+        raise ValueError(f"Profile '{profile_name}' has no os.")
+
+    packages = []
+    for pkg in data.get('packages') or []:
+        if not isinstance(pkg, dict) or not isinstance(pkg.get('name'), str) or not pkg['name']:
+            raise ValueError(f"Profile '{profile_name}' has a package without a name.")
+        packages.append({
+            'name': pkg['name'],
+            'version': pkg.get('version') or '',
+            'repo_url': pkg.get('repo_url') or '',
+            'download_url': pkg.get('download_url') or ''
+        })
+
+    env_vars = {}
+    for key, value in (data.get('env_vars') or {}).items():
+        if not isinstance(value, dict) or not isinstance(value.get('value'), str):
+            raise ValueError(f"Profile '{profile_name}' has an invalid value for environment variable '{key}'.")
+        env_vars[key] = {"value": value['value'], "append": bool(value.get('append'))}
+
+    symlinks = []
+    for link in data.get('symlinks') or []:
+        if not isinstance(link, (list, tuple)) or len(link) != 2:
+            raise ValueError(f"Profile '{profile_name}' has a symlink that is not a [link, target] pair.")
+        symlinks.append([str(link[0]), str(link[1])])
+
+    custom_commands = []
+    for command in data.get('custom_commands') or []:
+        if not isinstance(command, dict) or not isinstance(command.get('command'), str):
+            raise ValueError(f"Profile '{profile_name}' has a custom command without a command.")
+        custom_commands.append({'description': command.get('description') or '', 'command': command['command']})
+
+    parents = data.get('parents') or []
+    if not isinstance(parents, list) or not all(isinstance(parent, str) for parent in parents):
+        raise ValueError(f"Profile '{profile_name}' has invalid parents.")
+    removed = data.get('removed') or {}
+    if not isinstance(removed, dict):
+        raise ValueError(f"Profile '{profile_name}' has an invalid removed section.")
+
+    return {
+        'profile_name': profile_name,
+        'os': data['os'],
+        'parents': parents,
+        'packages': packages,
+        'env_vars': env_vars,
+        'symlinks': symlinks,
+        'custom_commands': custom_commands,
+        'removed': removed
+    }
@@ -2,6 +2,7 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
 )
+from backend.profile_entries import Package
 
 class AddPackageDialog(QDialog):
     def __init__(self, parent=None):
@@ -75,9 +76,4 @@ class AddPackageDialog(QDialog):
         super().accept()
 
     def get_package_data(self):
-        return {
-            'name': self.package_name,
-            'version': self.package_version,
-            'repo_url': self.repo_url,
-            'download_url': self.download_url
-        }
+        return Package(self.package_name, self.package_version, self.repo_url, self.download_url)
@@ -0,0 +1,135 @@
+from PyQt5.QtCore import QObject, QTimer
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('packages', 'symlinks', 'custom_commands')
+AUTOSAVE_DELAY_MS = 2000
+
+
+class ProfileAutosaver(QObject):
+    """
+    Tracks which sections (and which environment variables) of the window's profile changed
+    since the last save. When enabled, the changes are written with DBManager.autosave_profile
+    on a worker thread once edits have paused for ``delay_ms``. Switching profiles or closing the
+    window flushes pending changes first, so a crash loses at most one debounce window.
+    """
+
+    def __init__(self, window, delay_ms=AUTOSAVE_DELAY_MS):
+        super().__init__(window)
+        self.window = window
+        self.enabled = False
+        self.persisted = False  # Whether the current profile exists in the database
+        self.dirty_sections = set()
+        self.dirty_env_vars = set()
+        self._in_flight = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.flush_async)
+
+        for section, model in (('packages', window.packages_model), ('symlinks', window.symlinks_model),
+                               ('custom_commands', window.commands_model)):
+            for signal in (model.rowsInserted, model.rowsRemoved, model.dataChanged):
+                signal.connect(lambda *args, section=section: self.mark_dirty(section))
+        window.env_vars_model.env_var_changed.connect(self.mark_env_var_dirty)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        logger.info(f"Autosave {'enabled' if enabled else 'disabled'}.")
+        if enabled and self.has_changes():
+            self.timer.start()
+        elif not enabled:
+            self.timer.stop()
+
+    def has_changes(self):
+        return bool(self.dirty_sections or self.dirty_env_vars)
+
+    def mark_dirty(self, section):
+        self.dirty_sections.add(section)
+        self._schedule()
+
+    def mark_env_var_dirty(self, name):
+        self.dirty_env_vars.add(name)
+        self._schedule()
+
+    def mark_all_dirty(self):
+        self.dirty_sections.update(('os',) + SECTIONS)
+        self.dirty_env_vars.update(self.window.env_vars)
+        self._schedule()
+
+    def reset(self, persisted):
+        """Forgets pending changes, e.g. after a load or a full save of the current profile."""
+        self.timer.stop()
+        self.dirty_sections.clear()
+        self.dirty_env_vars.clear()
+        self.persisted = persisted
+
+    def _schedule(self):
+        # Every edit restarts the timer, so a burst of edits is written once
+        if self.enabled and self.persisted:
+            self.timer.start()
+
+    def _take_changes(self):
+        window = self.window
+        changes = (window.current_profile_name, window.platform, list(window.packages), dict(window.env_vars),
+                   list(window.symlinks), list(window.custom_commands), list(window.parent_profiles),
+                   set(self.dirty_sections), set(self.dirty_env_vars))
+        self.dirty_sections.clear()
+        self.dirty_env_vars.clear()
+        return changes
+
+    def flush_async(self):
+        if not (self.enabled and self.persisted and self.has_changes()):
+            return
+        if self.window.tasks.is_running("autosave") or self.window.tasks.is_running("save"):
+            self.timer.start()  # Try again after the running save
+            return
+        self._in_flight = self._take_changes()
+        # The worker's session is created here, on the UI thread
+        self.window.tasks.start("autosave", self._autosave_task, self.window.db_manager.for_worker(),
+                                *self._in_flight, on_finished=self._autosaved, on_failed=self._autosave_failed)
+
+    def flush_now(self):
+        """Writes pending changes on the calling (UI) thread, after any autosave or save already running."""
+        self.timer.stop()
+        # Pending changes were made after the running save took its snapshot, so they are written after it
+        for key in ("autosave", "save"):
+            running = self.window.tasks.running.get(key)
+            if running is not None:
+                running.wait()
+        if not (self.enabled and self.persisted and self.has_changes()):
+            return
+        changes = self._take_changes()
+        try:
+            self._write(self.window.db_manager.for_worker(), *changes)
+        except Exception as e:
+            logger.error(f"Error autosaving profile '{changes[0]}': {str(e)}")
+
+    def _autosave_task(self, worker, db_manager, *changes):
+        return self._write(db_manager, *changes)
+
+    def _write(self, db_manager, profile_name, os_name, packages, env_vars, symlinks, custom_commands, parents,
+               dirty_sections, dirty_env_vars):
+        try:
+            return db_manager.autosave_profile(profile_name, os_name, packages, env_vars, symlinks,
+                                               custom_commands, parents, dirty_sections, dirty_env_vars)
+        finally:
+            db_manager.close()
+
+    def _autosaved(self, saved):
+        profile_name = self._in_flight[0]
+        self._in_flight = None
+        if saved:
+            self.window.statusBar().showMessage(f"Profile '{profile_name}' autosaved.", 3000)
+        elif profile_name == self.window.current_profile_name:
+            self.persisted = False  # Deleted meanwhile; the next manual save creates it again
+
+    def _autosave_failed(self, message):
+        # Keep the changes so the next attempt writes them again
+        profile_name, dirty_sections, dirty_env_vars = self._in_flight[0], self._in_flight[7], self._in_flight[8]
+        self._in_flight = None
+        if profile_name == self.window.current_profile_name:
+            self.dirty_sections.update(dirty_sections)
+            self.dirty_env_vars.update(dirty_env_vars)
+        self.window.statusBar().showMessage(f"Autosave failed: {message}", 5000)
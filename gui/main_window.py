@@ -1,25 +1,36 @@
 from PyQt5.QtWidgets import (
     QMainWindow, QAction, QVBoxLayout, QWidget, QInputDialog, QMessageBox, QComboBox,
-    QTableWidget, QTableWidgetItem, QPushButton, QHBoxLayout, QDialog, QMenu, QAbstractItemView
+    QTableView, QHeaderView, QPushButton, QHBoxLayout, QDialog, QMenu, QAbstractItemView, QProgressBar,
+    QLineEdit, QFileDialog
 )
-from PyQt5.QtCore import Qt
-from gui.settings_dialog import AddPackageDialog, AddEnvVarDialog, AddSymlinkDialog, LoadProfileDialog, AddCommandDialog
+from PyQt5.QtCore import Qt, QTimer
+from gui.settings_dialog import AddPackageDialog, AddEnvVarDialog, AddSymlinkDialog, LoadProfileDialog, AddCommandDialog, \
+    ProfileHistoryDialog, ImportPackagesDialog
+from gui.table_models import PackageTableModel, EnvVarTableModel, SymlinkTableModel, CommandTableModel, \
+    FilterProxyModel
+from gui.workers import TaskRunner
+from gui.autosave import ProfileAutosaver
+from gui.script_preview import ScriptPreviewDock
 from backend.package_manager import PackageManager
-from backend.script_generator import ScriptGenerator
-from backend.archive_builder import ArchiveBuilder
-from database.db_manager import DBManager
+from backend.package_list_parser import parse_package_list
+from backend.profile_entries import EnvVar
+from backend.profiling import profiled
+from database.profile_resolver import apply_overrides
+import io
 import os
 import logging
 import re
 
-# Import for sanitizing file names
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.db_manager = DBManager()  # Initialize the database manager
+        # The database (and SQLAlchemy) is loaded on a worker thread once the window is up
+        self._db_manager = None
+        # Set once the window starts closing, so no new background work is started
+        self._closing = False
         # Default target platform
         self.platform = "ubuntu"
         # Data storage for packages, env vars, symlinks and custom commands
@@ -27,8 +38,15 @@ class MainWindow(QMainWindow):
         self.env_vars = {}
         self.symlinks = []
         self.custom_commands = []  # Add storage for custom commands
-        # Current profile name
+        # Current profile name and the profiles it inherits from
         self.current_profile_name = "default"
+        self.parent_profiles = []
+        # Generate from the profile's lockfile for the platform, when it has one
+        self.use_lockfile = True
+        # Pipe downloaded archives straight into the extractor (Settings > Stream Downloads)
+        self.stream_downloads = False
+        # Packages per checkpointed install command; 0 installs them all with one command
+        self.install_chunk_size = 0
         # Set up the window
         self.setWindowTitle("Environment Setup Tool")
         self.setGeometry(100, 100, 800, 600)
@@ -47,8 +65,93 @@ class MainWindow(QMainWindow):
         # Add buttons and tables for displaying/modifying profile data
         self._create_profile_tables(layout)
         central_widget.setLayout(layout)
+        # Long-running operations run on worker threads and report progress in the status bar
+        self._create_status_bar()
+        # Writes edited sections back to the database once edits pause (off until enabled in Settings)
+        self.autosaver = ProfileAutosaver(self)
+        # Live install script preview, docked on the right and hidden until opened from Settings
+        self.script_preview = ScriptPreviewDock(self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.script_preview)
+        self.script_preview.hide()
+        self.settings_menu.addAction(self.script_preview.toggleViewAction())
         # Initialize the package manager based on the selected platform
         self.package_manager = PackageManager(self.platform)
+        QTimer.singleShot(0, self._start_database_init)
+
+    def _start_database_init(self):
+        # The window can be closed before the event loop gets to this; tasks.wait() has returned by then
+        if self._db_manager is None and not self._closing:
+            self.tasks.start("database", self._database_init_task, on_finished=self._database_ready,
+                             on_failed=self._database_failed)
+
+    def _database_init_task(self, worker):
+        from database.db_manager import DBManager
+        return DBManager()
+
+    def _database_ready(self, db_manager):
+        if self._db_manager is None:
+            self._db_manager = db_manager
+        logger.info("Database ready.")
+
+    def _database_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while opening the database: {message}")
+
+    @property
+    def db_manager(self):
+        # Normally ready before the first profile action; otherwise wait for (or redo) the initialization
+        if self._db_manager is None:
+            worker = self.tasks.running.get("database")
+            if worker is not None:
+                worker.wait()
+                self._db_manager = worker.result
+            if self._db_manager is None:
+                from database.db_manager import DBManager
+                self._db_manager = DBManager()
+        return self._db_manager
+
+    def _create_status_bar(self):
+        self.tasks = TaskRunner(self)
+        self.tasks.busy_changed.connect(self._set_busy)
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(lambda: self.tasks.cancel())
+        self.cancel_button.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+
+    def _set_busy(self, busy):
+        self.progress_bar.setVisible(busy)
+        self.cancel_button.setVisible(busy)
+        if busy:
+            self.progress_bar.setValue(0)
+
+    def _task_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        if message:
+            self.statusBar().showMessage(message)
+
+    def _start_task(self, key, task, *args, database=False, **slots):
+        # A second trigger while the same operation is still running joins the running one
+        if self.tasks.is_running(key):
+            self.statusBar().showMessage(f"A {key} operation is already running.", 3000)
+            return
+        if database:
+            # Tasks get their own session, created here: self.db_manager is not safe to use from pool threads
+            args = (self.db_manager.for_worker(),) + args
+        self.tasks.start(key, task, *args, on_progress=self._task_progress, **slots)
+
+    def _task_cancelled(self):
+        self.statusBar().showMessage("Operation cancelled.", 3000)
+
+    def closeEvent(self, event):
+        self._closing = True
+        self.autosaver.flush_now()
+        self.tasks.cancel()
+        self.tasks.wait()
+        super().closeEvent(event)
 
     def _create_menu(self):
         menu_bar = self.menuBar()
@@ -57,17 +160,32 @@ class MainWindow(QMainWindow):
         generate_action = QAction("Generate Setup", self)
         generate_action.triggered.connect(self._generate_setup)
         file_menu.addAction(generate_action)
+        generate_upgrade_action = QAction("Generate Upgrade Setup", self)
+        generate_upgrade_action.triggered.connect(self._generate_upgrade_setup)
+        file_menu.addAction(generate_upgrade_action)
+        generate_dockerfile_action = QAction("Generate Dockerfile", self)
+        generate_dockerfile_action.triggered.connect(self._generate_dockerfile)
+        file_menu.addAction(generate_dockerfile_action)
+        lock_action = QAction("Lock Package Versions", self)
+        lock_action.triggered.connect(self.lock_package_versions)
+        file_menu.addAction(lock_action)
         save_profile_action = QAction("Save Profile", self)
         save_profile_action.triggered.connect(self.save_profile)
         file_menu.addAction(save_profile_action)
         load_profile_action = QAction("Load Profile", self)
         load_profile_action.triggered.connect(self.load_profile)
         file_menu.addAction(load_profile_action)
+        set_parents_action = QAction("Set Parent Profiles", self)
+        set_parents_action.triggered.connect(self.set_parent_profiles)
+        file_menu.addAction(set_parents_action)
+        history_action = QAction("Profile History", self)
+        history_action.triggered.connect(self.show_profile_history)
+        file_menu.addAction(history_action)
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
         # Settings Menu
-        settings_menu = menu_bar.addMenu("Settings")
+        settings_menu = self.settings_menu = menu_bar.addMenu("Settings")
         add_package_action = QAction("Add Package", self)
         add_package_action.triggered.connect(self._add_package)
         settings_menu.addAction(add_package_action)
@@ -80,46 +198,50 @@ class MainWindow(QMainWindow):
         add_command_action = QAction("Add Command", self)
         add_command_action.triggered.connect(self._add_command)
         settings_menu.addAction(add_command_action)
+        settings_menu.addSeparator()
+        autosave_action = QAction("Autosave", self, checkable=True)
+        autosave_action.toggled.connect(lambda checked: self.autosaver.set_enabled(checked))
+        settings_menu.addAction(autosave_action)
+        lockfile_action = QAction("Install Locked Versions", self, checkable=True, checked=True)
+        lockfile_action.toggled.connect(lambda checked: setattr(self, 'use_lockfile', checked))
+        settings_menu.addAction(lockfile_action)
+        stream_downloads_action = QAction("Stream Downloads", self, checkable=True)
+        stream_downloads_action.toggled.connect(self._set_stream_downloads)
+        settings_menu.addAction(stream_downloads_action)
+        chunk_size_action = QAction("Install Chunk Size...", self)
+        chunk_size_action.triggered.connect(self._set_install_chunk_size)
+        settings_menu.addAction(chunk_size_action)
         # Help Menu
         help_menu = menu_bar.addMenu("Help")
         about_action = QAction("About", self)
         help_menu.addAction(about_action)
 
     def _create_profile_tables(self, layout):
+        # Filter box, applied to all four tables
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Filter packages, environment variables, symlinks and commands")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self._filter_tables)
+        layout.addWidget(self.filter_edit)
+
         # Packages Table
-        self.packages_table = QTableWidget(0, 4)  # Four columns: Package, Version, Repo URL, Download URL
-        self.packages_table.setHorizontalHeaderLabels(["Package", "Version", "Repo URL", "Download URL"])
-        self.packages_table.setEditTriggers(QAbstractItemView.DoubleClicked)
-        self.packages_table.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.packages_table.customContextMenuRequested.connect(self._package_table_context_menu)
-        self.packages_table.itemChanged.connect(self._package_item_changed)
+        self.packages_model = PackageTableModel(self.packages, self)
+        self.packages_table = self._create_table_view(self.packages_model, self._package_table_context_menu)
         layout.addWidget(self.packages_table)
 
         # Environment Variables Table
-        self.env_vars_table = QTableWidget(0, 2)
-        self.env_vars_table.setHorizontalHeaderLabels(["Variable", "Value"])
-        self.env_vars_table.setEditTriggers(QAbstractItemView.DoubleClicked)
-        self.env_vars_table.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.env_vars_table.customContextMenuRequested.connect(self._env_var_table_context_menu)
-        self.env_vars_table.itemChanged.connect(self._env_var_item_changed)
+        self.env_vars_model = EnvVarTableModel(self.env_vars, self)
+        self.env_vars_table = self._create_table_view(self.env_vars_model, self._env_var_table_context_menu)
         layout.addWidget(self.env_vars_table)
 
         # Symlinks Table
-        self.symlinks_table = QTableWidget(0, 2)
-        self.symlinks_table.setHorizontalHeaderLabels(["Link", "Target"])
-        self.symlinks_table.setEditTriggers(QAbstractItemView.DoubleClicked)
-        self.symlinks_table.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.symlinks_table.customContextMenuRequested.connect(self._symlink_table_context_menu)
-        self.symlinks_table.itemChanged.connect(self._symlink_item_changed)
+        self.symlinks_model = SymlinkTableModel(self.symlinks, self)
+        self.symlinks_table = self._create_table_view(self.symlinks_model, self._symlink_table_context_menu)
         layout.addWidget(self.symlinks_table)
 
         # Custom Commands Table
-        self.commands_table = QTableWidget(0, 2)
-        self.commands_table.setHorizontalHeaderLabels(["Description", "Command"])
-        self.commands_table.setEditTriggers(QAbstractItemView.DoubleClicked)
-        self.commands_table.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.commands_table.customContextMenuRequested.connect(self._command_table_context_menu)
-        self.commands_table.itemChanged.connect(self._command_item_changed)
+        self.commands_model = CommandTableModel(self.custom_commands, self)
+        self.commands_table = self._create_table_view(self.commands_model, self._command_table_context_menu)
         layout.addWidget(self.commands_table)
 
         # Buttons to Add Entries
@@ -127,6 +249,9 @@ class MainWindow(QMainWindow):
         self.add_package_btn = QPushButton("Add Package")
         self.add_package_btn.clicked.connect(self._add_package)
         btn_layout.addWidget(self.add_package_btn)
+        self.import_packages_btn = QPushButton("Import Packages")
+        self.import_packages_btn.clicked.connect(self._import_packages)
+        btn_layout.addWidget(self.import_packages_btn)
         self.add_env_var_btn = QPushButton("Add Env Var")
         self.add_env_var_btn.clicked.connect(self._add_env_var)
         btn_layout.addWidget(self.add_env_var_btn)
@@ -138,182 +263,104 @@ class MainWindow(QMainWindow):
         btn_layout.addWidget(self.add_command_btn)
         layout.addLayout(btn_layout)
 
-    # Context Menu for Packages Table
-    def _package_table_context_menu(self, position):
+    def _create_table_view(self, model, context_menu_handler):
+        table = QTableView(self)
+        # The view shows the filtered rows; the proxy maps them back to rows of the profile data
+        proxy = FilterProxyModel(table)
+        proxy.setSourceModel(model)
+        table.setModel(proxy)
+        table.setEditTriggers(QAbstractItemView.DoubleClicked)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setContextMenuPolicy(Qt.CustomContextMenu)
+        table.customContextMenuRequested.connect(context_menu_handler)
+        # Fixed row heights keep scrolling through large profiles from measuring every row
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.horizontalHeader().setStretchLastSection(True)
+        return table
+
+    def _remove_current_row(self, table, model, position):
         menu = QMenu()
         remove_action = menu.addAction("Remove")
-        action = menu.exec_(self.packages_table.viewport().mapToGlobal(position))
+        action = menu.exec_(table.viewport().mapToGlobal(position))
         if action == remove_action:
-            row = self.packages_table.currentRow()
+            row = table.model().mapToSource(table.currentIndex()).row()
             if row >= 0:
-                self.packages_table.removeRow(row)
-                del self.packages[row]  # Remove from data structure
-
-    def _package_item_changed(self, item):
-        row = item.row()
-        col = item.column()
-        if row < len(self.packages):
-            name = self.packages_table.item(row, 0).text()
-            version = self.packages_table.item(row, 1).text()
-            repo_url = self.packages_table.item(row, 2).text() if self.packages_table.item(row, 2) else ''
-            download_url = self.packages_table.item(row, 3).text() if self.packages_table.item(row, 3) else ''
-            self.packages[row] = {
-                'name': name,
-                'version': version,
-                'repo_url': repo_url,
-                'download_url': download_url
-            }
-            logging.info(
-                f"Updated package at row {row}: {name}, version: {version}, repo_url: {repo_url}, download_url: {download_url}")
+                model.remove_row(row)  # Removes the row from the profile data as well
+
+    def _filter_tables(self, text):
+        for table in (self.packages_table, self.env_vars_table, self.symlinks_table, self.commands_table):
+            table.model().set_filter(text)
+
+    # Context Menu for Packages Table
+    def _package_table_context_menu(self, position):
+        self._remove_current_row(self.packages_table, self.packages_model, position)
 
     # Context Menu for Environment Variables Table
     def _env_var_table_context_menu(self, position):
-        menu = QMenu()
-        remove_action = menu.addAction("Remove")
-        action = menu.exec_(self.env_vars_table.viewport().mapToGlobal(position))
-        if action == remove_action:
-            row = self.env_vars_table.currentRow()
-            if row >= 0:
-                key = self.env_vars_table.item(row, 0).text()
-                self.env_vars_table.removeRow(row)
-                if key in self.env_vars:
-                    del self.env_vars[key]  # Remove from data structure
-
-    def _env_var_item_changed(self, item):
-        row = item.row()
-        if self.env_vars_table.item(row, 0) and self.env_vars_table.item(row, 1):
-            key = self.env_vars_table.item(row, 0).text()
-            value = self.env_vars_table.item(row, 1).text()
-            append_text = 'no'
-            if self.env_vars_table.item(row, 2):
-                append_text = self.env_vars_table.item(row, 2).text()
-            append = append_text.lower()
-            self.env_vars[key] = {"value": value, "append": append}
-            logging.info(f"Updated environment variable: {key}={value}, append: {append}")
+        self._remove_current_row(self.env_vars_table, self.env_vars_model, position)
 
     # Context Menu for Symlinks Table
     def _symlink_table_context_menu(self, position):
-        menu = QMenu()
-        remove_action = menu.addAction("Remove")
-        action = menu.exec_(self.symlinks_table.viewport().mapToGlobal(position))
-        if action == remove_action:
-            row = self.symlinks_table.currentRow()
-            if row >= 0:
-                self.symlinks_table.removeRow(row)
-                del self.symlinks[row]  # Remove from data structure
-
-    def _symlink_item_changed(self, item):
-        row = item.row()
-        col = item.column()
-        if row < len(self.symlinks):
-            link = self.symlinks_table.item(row, 0).text()
-            target = self.symlinks_table.item(row, 1).text()
-            self.symlinks[row] = (link, target)
-            logging.info(f"Updated symlink at row {row}: {link} -> {target}")
+        self._remove_current_row(self.symlinks_table, self.symlinks_model, position)
 
     # Context Menu for Custom Commands Table
     def _command_table_context_menu(self, position):
-        menu = QMenu()
-        remove_action = menu.addAction("Remove")
-        action = menu.exec_(self.commands_table.viewport().mapToGlobal(position))
-        if action == remove_action:
-            row = self.commands_table.currentRow()
-            if row >= 0:
-                self.commands_table.removeRow(row)
-                del self.custom_commands[row]  # Remove from data structure
-
-    def _command_item_changed(self, item):
-        row = item.row()
-        col = item.column()
-        if row < len(self.custom_commands):
-            description = self.commands_table.item(row, 0).text()
-            command = self.commands_table.item(row, 1).text()
-            self.custom_commands[row] = {
-                'description': description,
-                'command': command
-            }
-            logging.info(f"Updated command at row {row}: {description}, command: {command}")
+        self._remove_current_row(self.commands_table, self.commands_model, position)
 
     def _update_tables(self):
-        """Updates the tables to display the current profile values."""
-        # Disconnect signals to prevent recursive updates
-        self.packages_table.blockSignals(True)
-        self.env_vars_table.blockSignals(True)
-        self.symlinks_table.blockSignals(True)
-        self.commands_table.blockSignals(True)
-
-        # Update Packages Table
-        self.packages_table.setRowCount(0)
-        for package in self.packages:
-            row_position = self.packages_table.rowCount()
-            self.packages_table.insertRow(row_position)
-            package_name = package['name']
-            package_version = package['version']
-            repo_url = package['repo_url']
-            download_url = package['download_url']
-            self.packages_table.setItem(row_position, 0, QTableWidgetItem(package_name))
-            self.packages_table.setItem(row_position, 1, QTableWidgetItem(package_version))
-            self.packages_table.setItem(row_position, 2, QTableWidgetItem(repo_url))
-            self.packages_table.setItem(row_position, 3, QTableWidgetItem(download_url))
-
-        # Update Environment Variables Table
-        self.env_vars_table.setRowCount(0)
-        for var, value in self.env_vars.items():
-            row_position = self.env_vars_table.rowCount()
-            self.env_vars_table.insertRow(row_position)
-            self.env_vars_table.setItem(row_position, 0, QTableWidgetItem(var))
-            self.env_vars_table.setItem(row_position, 1, QTableWidgetItem(value['value']))
-            append_item = QTableWidgetItem("Yes" if value['append'] else "No")
-            self.env_vars_table.setItem(row_position, 2, append_item)
-
-        # Update Symlinks Table
-        self.symlinks_table.setRowCount(0)
-        for link, target in self.symlinks:
-            row_position = self.symlinks_table.rowCount()
-            self.symlinks_table.insertRow(row_position)
-            self.symlinks_table.setItem(row_position, 0, QTableWidgetItem(link))
-            self.symlinks_table.setItem(row_position, 1, QTableWidgetItem(target))
-
-        # Update Custom Commands Table
-        self.commands_table.setRowCount(0)
-        for command in self.custom_commands:
-            row_position = self.commands_table.rowCount()
-            self.commands_table.insertRow(row_position)
-            description = command['description']
-            cmd = command['command']
-            self.commands_table.setItem(row_position, 0, QTableWidgetItem(description))
-            self.commands_table.setItem(row_position, 1, QTableWidgetItem(cmd))
-
-        # Reconnect signals
-        self.packages_table.blockSignals(False)
-        self.env_vars_table.blockSignals(False)
-        self.symlinks_table.blockSignals(False)
-        self.commands_table.blockSignals(False)
+        """Points the table models at the current profile values, e.g. after loading a profile."""
+        self.packages_model.set_rows(self.packages)
+        self.env_vars_model.set_env_vars(self.env_vars)
+        self.symlinks_model.set_rows(self.symlinks)
+        self.commands_model.set_rows(self.custom_commands)
 
     def _add_package(self):
         dialog = AddPackageDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             package_data = dialog.get_package_data()
-            self.packages.append(package_data)
-            logging.info(f"Added package: {package_data}")
-            self._update_tables()
+            self.packages_model.append_row(package_data)
+            logger.info(f"Added package: {package_data}")
+
+    def _import_packages(self):
+        dialog = ImportPackagesDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        file_path, text, list_format, pin_versions = dialog.get_import_options()
+        try:
+            if file_path:
+                with open(file_path) as list_file:
+                    report = parse_package_list(list_file, list_format, pin_versions, self.packages)
+            else:
+                report = parse_package_list(io.StringIO(text), list_format, pin_versions, self.packages)
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while reading the package list: {str(e)}")
+            logger.error(f"Error reading package list '{file_path}': {str(e)}")
+            return
+        # One insert notification for the whole batch
+        self.packages_model.append_rows(report.packages)
+        logger.info(f"Imported {len(report.packages)} packages from a {list_format} list.")
+        message = f"Imported {len(report.packages)} packages."
+        if report.existing or report.duplicates:
+            message += f"\n{report.existing} already in the profile, {report.duplicates} duplicates skipped."
+        if report.skipped:
+            lines = "\n".join(f"  line {line_number}: {line}" for line_number, line in report.skipped[:10])
+            message += f"\n{len(report.skipped)} lines were not recognized:\n{lines}"
+        QMessageBox.information(self, "Packages Imported", message)
 
     def _add_env_var(self):
         dialog = AddEnvVarDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             key, value, append_to_shell = dialog.get_env_var()
-            self.env_vars[key] = {"value": value, "append": append_to_shell}
-            logging.info(f"Added environment variable: {key}={value}, append: {append_to_shell}")
-            self._update_tables()
+            self.env_vars_model.set_env_var(key, EnvVar(value, append_to_shell))
+            logger.info(f"Added environment variable: {key}={value}, append: {append_to_shell}")
 
     def _add_symlink(self):
         link, ok1 = QInputDialog.getText(self, "Add Symlink", "Enter link name:")
         if ok1 and link.strip():
             target, ok2 = QInputDialog.getText(self, "Add Symlink", f"Enter target for '{link}':")
             if ok2 and target.strip():
-                self.symlinks.append((link.strip(), target.strip()))
-                logging.info(f"Added symlink: {link.strip()} -> {target.strip()}")
-                self._update_tables()
+                self.symlinks_model.append_row((link.strip(), target.strip()))
+                logger.info(f"Added symlink: {link.strip()} -> {target.strip()}")
             else:
                 QMessageBox.warning(self, "Invalid Input", "Symlink target cannot be empty.")
         else:
@@ -323,40 +370,91 @@ class MainWindow(QMainWindow):
         dialog = AddCommandDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             command_data = dialog.get_command_data()
-            self.custom_commands.append(command_data)
-            logging.info(f"Added command: {command_data}")
-            self._update_tables()
+            self.commands_model.append_row(command_data)
+            logger.info(f"Added command: {command_data}")
 
     def load_profile(self):
-        profiles = self.db_manager.get_all_profiles()
+        self._with_profile_names(self._choose_profile_to_load)
+
+    def _with_profile_names(self, callback):
+        # The profile names are read on a worker too; the dialogs open once they are there
+        self._start_task("profiles", self._profile_names_task, database=True, on_finished=callback,
+                         on_failed=self._profile_names_failed, on_cancelled=self._task_cancelled)
+
+    def _profile_names_task(self, worker, db_manager):
+        try:
+            return db_manager.get_all_profiles()
+        finally:
+            db_manager.close()
+
+    def _profile_names_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while listing the profiles: {message}")
+
+    def _choose_profile_to_load(self, profiles):
         dialog = LoadProfileDialog(self, profiles)
         if dialog.exec_() == QDialog.Accepted:
             profile_name = dialog.get_selected_profile()
+            self._start_task("load", self._load_profile_task, profile_name, database=True,
+                             on_finished=self._profile_loaded, on_failed=self._load_failed,
+                             on_cancelled=self._task_cancelled)
+
+    def _load_profile_task(self, worker, db_manager, profile_name):
+        worker.report_progress(10, f"Loading profile '{profile_name}'...")
+        try:
+            with profiled(f"load:{profile_name}"):
+                profile_data = db_manager.load_profile(profile_name)
+        finally:
+            db_manager.close()
+        worker.check_cancelled()
+        worker.report_progress(100, f"Loaded profile '{profile_name}'.")
+        return profile_name, profile_data
+
+    def _profile_loaded(self, result):
+        profile_name, profile_data = result
+        if profile_data:
+            # Pending edits belong to the profile that is being replaced
+            self.autosaver.flush_now()
+            self._apply_profile_data(profile_name, profile_data)
+            QMessageBox.information(self, "Profile Loaded", f"Profile '{profile_name}' loaded successfully!")
+            logger.info(f"Profile '{profile_name}' loaded and UI updated.")
+        else:
+            QMessageBox.warning(self, "Load Failed", f"Profile '{profile_name}' not found.")
+
+    def _load_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while loading the profile: {message}")
+
+    def _apply_profile_data(self, profile_name, profile_data):
+        self.current_profile_name = profile_name  # Update current profile name
+        self.platform = profile_data['os']
+        # Update OS selector to reflect loaded profile
+        os_index = next(
+            (index for index, value in enumerate(self.os_options) if value.lower() == self.platform), 0)
+        self.os_dropdown.setCurrentIndex(os_index)
+        self.packages = profile_data['packages']
+        self.env_vars = profile_data['env_vars']
+        self.symlinks = profile_data['symlinks']
+        self.custom_commands = profile_data.get('custom_commands', [])
+        self.parent_profiles = profile_data.get('parents', [])
+        # Update UI elements to reflect the loaded data
+        self._update_tables()
+        self.autosaver.reset(persisted=True)
+
+    def show_profile_history(self):
+        dialog = ProfileHistoryDialog(self, self.db_manager, self.current_profile_name)
+        dialog.exec_()
+        if dialog.rolled_back:
             try:
-                profile_data = self.db_manager.load_profile(profile_name)
+                profile_data = self.db_manager.load_profile(self.current_profile_name)
                 if profile_data:
-                    self.current_profile_name = profile_name  # Update current profile name
-                    self.platform = profile_data['os']
-                    # Update OS selector to reflect loaded profile
-                    os_index = next(
-                        (index for index, value in enumerate(self.os_options) if value.lower() == self.platform), 0)
-                    self.os_dropdown.setCurrentIndex(os_index)
-                    self.packages = profile_data['packages']
-                    self.env_vars = profile_data['env_vars']
-                    self.symlinks = profile_data['symlinks']
-                    self.custom_commands = profile_data.get('custom_commands', [])
-                    # Update UI elements to reflect the loaded data
-                    self._update_tables()
-                    QMessageBox.information(self, "Profile Loaded", f"Profile '{profile_name}' loaded successfully!")
-                    logging.info(f"Profile '{profile_name}' loaded and UI updated.")
-                else:
-                    QMessageBox.warning(self, "Load Failed", f"Profile '{profile_name}' not found.")
+                    self._apply_profile_data(self.current_profile_name, profile_data)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"An error occurred while loading the profile: {str(e)}")
-                logging.error(f"Error loading profile '{profile_name}': {str(e)}")
+                logger.error(f"Error reloading profile '{self.current_profile_name}': {str(e)}")
 
     def save_profile(self):
-        profiles = self.db_manager.get_all_profiles()
+        self._with_profile_names(self._choose_profile_to_save)
+
+    def _choose_profile_to_save(self, profiles):
         profiles.insert(0, "Save as New Profile")  # Option to save as a new profile
 
         def get_profile_names_and_selected_index():
@@ -375,77 +473,339 @@ class MainWindow(QMainWindow):
                 profile_name, ok = QInputDialog.getText(self, "Save Profile", "Enter new profile name:")
                 if not ok:
                     return  # User canceled the input
-            try:
-                # Gather the necessary data to save the profile
-                os_name = self.platform
-                packages = self.packages
-                env_vars = self.env_vars
-                symlinks = self.symlinks
-                custom_commands = self.custom_commands
-
-                logging.debug(
-                    f"Env Vars Before Saving Profile '{profile_name}': {env_vars}")  # Debugging environment variables
-
-                # Call db_manager to save the profile
-                success = self.db_manager.save_profile(profile_name, os_name, packages, env_vars, symlinks,
-                                                       custom_commands)
-                if success:
-                    self.current_profile_name = profile_name  # Update current profile name
-                    QMessageBox.information(self, "Profile Saved", f"Profile '{profile_name}' saved successfully!")
-                    logging.info(f"Profile '{profile_name}' saved.")
-                else:
-                    QMessageBox.warning(self, "Save Failed", "Failed to save the profile.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"An error occurred while saving the profile: {str(e)}")
-                logging.error(f"Error saving profile '{profile_name}': {str(e)}")
+            # Save a snapshot, the tables stay editable while the worker runs; edits made from here
+            # on are left to the autosaver
+            self.autosaver.reset(persisted=self.autosaver.persisted)
+            self._start_task("save", self._save_profile_task, profile_name, self.platform, list(self.packages),
+                             dict(self.env_vars), list(self.symlinks), list(self.custom_commands),
+                             list(self.parent_profiles), database=True, on_finished=self._profile_saved,
+                             on_failed=self._save_failed, on_cancelled=self._task_cancelled)
+
+    def _save_profile_task(self, worker, db_manager, profile_name, os_name, packages, env_vars, symlinks,
+                           custom_commands, parents):
+        logger.debug(f"Env Vars Before Saving Profile '{profile_name}': {env_vars}")  # Debugging environment variables
+        try:
+            worker.report_progress(10, f"Saving profile '{profile_name}'...")
+            worker.check_cancelled()
+            with profiled(f"save:{profile_name}"):
+                success = db_manager.save_profile(profile_name, os_name, packages, env_vars, symlinks,
+                                                  custom_commands, parents=parents)
+        finally:
+            db_manager.close()
+        worker.report_progress(100, f"Saved profile '{profile_name}'.")
+        return profile_name, success
+
+    def _profile_saved(self, result):
+        profile_name, success = result
+        # The save went through another session; drop anything this one still holds
+        self.db_manager.session.expire_all()
+        if success:
+            self.current_profile_name = profile_name  # Update current profile name
+            self.autosaver.persisted = True
+            QMessageBox.information(self, "Profile Saved", f"Profile '{profile_name}' saved successfully!")
+            logger.info(f"Profile '{profile_name}' saved.")
+        else:
+            self.autosaver.mark_all_dirty()
+            QMessageBox.warning(self, "Save Failed", "Failed to save the profile.")
+
+    def _save_failed(self, message):
+        self.autosaver.mark_all_dirty()
+        QMessageBox.critical(self, "Error", f"An error occurred while saving the profile: {message}")
+
+    def set_parent_profiles(self):
+        current = ", ".join(self.parent_profiles)
+        text, ok = QInputDialog.getText(self, "Set Parent Profiles",
+                                        "Parent profiles (comma-separated, in merge order):", text=current)
+        if not ok:
+            return
+        parents = [name.strip() for name in text.split(",") if name.strip()]
+        if not parents:
+            self.parent_profiles = parents
+            self.autosaver.mark_dirty('parents')
+            logger.info("Parent profiles cleared.")
+            return
+        # Resolving also validates the parents (missing profiles, cycles)
+        self._start_task("parents", self._resolve_parents_task, self.current_profile_name, parents,
+                         database=True, on_finished=self._parents_resolved, on_failed=self._parents_failed,
+                         on_cancelled=self._task_cancelled)
+
+    def _resolve_parents_task(self, worker, db_manager, profile_name, parents):
+        try:
+            worker.report_progress(10, f"Resolving parent profiles {', '.join(parents)}...")
+            inherited = db_manager.resolve_parents(profile_name, parents)
+        finally:
+            db_manager.close()
+        worker.check_cancelled()
+        worker.report_progress(100, "Parent profiles resolved.")
+        return parents, inherited
+
+    def _parents_resolved(self, result):
+        parents, inherited = result
+        # Show the inherited entries with the current edits layered on top
+        merged = apply_overrides(inherited, {
+            'os': self.platform,
+            'packages': self.packages,
+            'env_vars': self.env_vars,
+            'symlinks': self.symlinks,
+            'custom_commands': self.custom_commands
+        })
+        self.packages = merged['packages']
+        self.env_vars = merged['env_vars']
+        self.symlinks = merged['symlinks']
+        self.custom_commands = merged['custom_commands']
+        self._update_tables()
+        self.parent_profiles = parents
+        self.autosaver.mark_all_dirty()
+        logger.info(f"Parent profiles set to: {parents}")
+
+    def _parents_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while setting parent profiles: {message}")
 
     def _update_platform(self):
         selected_os = self.os_dropdown.currentText()
         self.platform = selected_os.lower()
-        logging.info(f"Platform set to: {self.platform}")
+        logger.info(f"Platform set to: {self.platform}")
         # Re-initialize the package manager when the platform changes
         self.package_manager = PackageManager(self.platform)
+        self.autosaver.mark_dirty('os')
+
+    def _set_stream_downloads(self, checked):
+        self.stream_downloads = checked
+        self.script_preview.install_options_changed()
+
+    def _set_install_chunk_size(self):
+        chunk_size, ok = QInputDialog.getInt(self, "Install Chunk Size",
+                                             "Packages per install command (0 installs all at once):",
+                                             self.install_chunk_size, 0, 100000)
+        if ok:
+            self.install_chunk_size = chunk_size
+            self.script_preview.install_options_changed()
 
     def _generate_setup(self):
         if not self.packages and not self.env_vars and not self.symlinks and not self.custom_commands:
             QMessageBox.warning(self, "No Configuration",
                                 "No packages, environment variables, symlinks, or commands added.")
             return
-        try:
+        # Generation works on a snapshot, so edits and settings changed meanwhile go into the next run
+        self._start_task("generate", self._generate_setup_task, self.current_profile_name, self.platform,
+                         list(self.packages), dict(self.env_vars), list(self.symlinks), list(self.custom_commands),
+                         self._generation_settings(self.current_profile_name, self.platform),
+                         on_finished=self._setup_generated, on_failed=self._generate_failed,
+                         on_cancelled=self._task_cancelled)
+
+    def _generate_setup_task(self, worker, profile_name, platform, packages, env_vars, symlinks, custom_commands,
+                             settings):
+        from backend.script_generator import ScriptGenerator
+        from backend.archive_builder import ArchiveBuilder
+
+        with profiled(f"generate:{profile_name}:{platform}"):
+            packages = self._locked_packages(profile_name, platform, packages, settings['lock'])
             # Initialize the package manager and script generator based on selected platform
-            package_manager = PackageManager(self.platform)
-            script_generator = ScriptGenerator(package_manager, self.symlinks, self.env_vars, self.custom_commands)
+            package_manager = PackageManager(platform)
+            script_generator = ScriptGenerator(package_manager, symlinks, env_vars, custom_commands,
+                                               settings['stream_downloads'], settings['install_chunk_size'])
 
-            # Create output directory if it doesn't exist
             output_dir = "output"
-            os.makedirs(output_dir, exist_ok=True)
-
-            # Clean up the output directory
-            for file in os.listdir(output_dir):
-                file_path = os.path.join(output_dir, file)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                    logging.info(f"Removed old file '{file_path}' from output directory.")
-                except Exception as e:
-                    logging.error(f"Error removing file '{file_path}': {str(e)}")
+            worker.report_progress(5, "Preparing output directory...")
+            self._prepare_output_dir(output_dir)
+            worker.check_cancelled()
 
             # Generate the install script
-            script_name = "install.sh" if self.platform != "macos" else "install.command"
+            worker.report_progress(20, f"Generating setup script for {len(packages)} packages...")
+            script_name = "install.sh" if platform != "macos" else "install.command"
             script_path = os.path.join(output_dir, script_name)
-            script_generator.generate_script(self.packages, script_path)
+            script_generator.generate_script(packages, script_path)
+            worker.check_cancelled()
 
             # Create the archive with the generated files
+            worker.report_progress(70, "Creating archive...")
             archive_builder = ArchiveBuilder(output_dir)
             # Sanitize profile name and OS for file name
-            safe_profile_name = re.sub(r'[^\w\-]', '_', self.current_profile_name)
-            safe_os_name = re.sub(r'[^\w\-]', '_', self.platform)
+            safe_profile_name = re.sub(r'[^\w\-]', '_', profile_name)
+            safe_os_name = re.sub(r'[^\w\-]', '_', platform)
             archive_name = f"{safe_profile_name}_{safe_os_name}_environment_setup.zip"
             # Archive will be created in the current directory
             archive_builder.create_archive(archive_name)
+        worker.report_progress(100, f"Setup archived at {archive_name}.")
+        return archive_name
+
+    def _setup_generated(self, archive_name):
+        QMessageBox.information(self, "Setup Generated", f"Setup generated and archived at {archive_name}")
+        logger.info(f"Setup script and archive generated at {archive_name}")
+
+    def _generate_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred during setup generation: {message}")
 
-            QMessageBox.information(self, "Setup Generated", f"Setup generated and archived at {archive_name}")
-            logging.info(f"Setup script and archive generated at {archive_name}")
+    def _generate_dockerfile(self):
+        if not self.packages and not self.env_vars and not self.symlinks and not self.custom_commands:
+            QMessageBox.warning(self, "No Configuration",
+                                "No packages, environment variables, symlinks, or commands added.")
+            return
+        self._start_task("generate", self._generate_dockerfile_task, self.current_profile_name, self.platform,
+                         list(self.packages), dict(self.env_vars), list(self.symlinks), list(self.custom_commands),
+                         self._generation_settings(self.current_profile_name, self.platform),
+                         on_finished=self._dockerfile_generated, on_failed=self._generate_failed,
+                         on_cancelled=self._task_cancelled)
+
+    def _generate_dockerfile_task(self, worker, profile_name, platform, packages, env_vars, symlinks,
+                                  custom_commands, settings):
+        from backend.dockerfile_generator import DockerfileGenerator
+        from backend.archive_builder import ArchiveBuilder
+
+        with profiled(f"dockerfile:{profile_name}:{platform}"):
+            packages = self._locked_packages(profile_name, platform, packages, settings['lock'])
+            worker.report_progress(20, f"Generating Dockerfile for {len(packages)} packages...")
+            dockerfile_generator = DockerfileGenerator(PackageManager(platform), symlinks, env_vars, custom_commands)
+            context_files = dockerfile_generator.context_files(packages)
+            worker.check_cancelled()
+
+            # The archive is the build context: unpack it and run docker build in the directory
+            worker.report_progress(70, "Creating build context archive...")
+            safe_profile_name = re.sub(r'[^\w\-]', '_', profile_name)
+            safe_os_name = re.sub(r'[^\w\-]', '_', platform)
+            archive_name = f"{safe_profile_name}_{safe_os_name}_docker_context.zip"
+            with open(archive_name, 'wb') as archive_file:
+                archive_file.write(ArchiveBuilder().create_archive_bytes(context_files))
+        worker.report_progress(100, f"Docker build context archived at {archive_name}.")
+        return archive_name
+
+    def _dockerfile_generated(self, archive_name):
+        QMessageBox.information(self, "Dockerfile Generated", f"Dockerfile and build context archived at {archive_name}")
+        logger.info(f"Dockerfile and build context archived at {archive_name}")
+
+    def _generation_settings(self, profile_name, platform):
+        """Snapshots the generation settings and the profile's lockfile on the UI thread for a generate task."""
+        return {
+            'lock': self.db_manager.load_lockfile(profile_name, platform) if self.use_lockfile else None,
+            'stream_downloads': self.stream_downloads,
+            'install_chunk_size': self.install_chunk_size,
+        }
+
+    def _locked_packages(self, profile_name, platform, packages, lock):
+        # Runs on the worker thread; an out-of-date lock fails the generation instead of being ignored
+        if lock is None:
+            return packages
+        from backend.lockfile import apply_lock
+        logger.info(f"Generating '{profile_name}' for {platform} from its lockfile of {lock['created_at']}.")
+        return apply_lock(packages, lock)
+
+    def lock_package_versions(self):
+        if not self.packages:
+            QMessageBox.warning(self, "No Packages", "There are no packages to lock.")
+            return
+        index_path, _ = QFileDialog.getOpenFileName(self, "Open Package Metadata Index", "",
+                                                    "JSON files (*.json);;All files (*)")
+        if not index_path:
+            return
+        self._start_task("lock", self._lock_task, self.current_profile_name, self.platform, index_path,
+                         list(self.packages), database=True, on_finished=self._versions_locked,
+                         on_failed=self._lock_failed, on_cancelled=self._task_cancelled)
+
+    def _lock_task(self, worker, db_manager, profile_name, platform, index_path, packages):
+        from backend.lockfile import MetadataIndex, lock_packages
+
+        try:
+            worker.report_progress(10, "Reading package metadata index...")
+            index = MetadataIndex.load(index_path)
+            worker.check_cancelled()
+            worker.report_progress(30, f"Resolving versions of {len(packages)} packages for {platform}...")
+            lock = lock_packages(packages, platform, index)
+            worker.check_cancelled()
+            if not db_manager.save_lockfile(profile_name, platform, lock):
+                raise ValueError(f"Profile '{profile_name}' is not saved yet; save it before locking.")
+        finally:
+            db_manager.close()
+        worker.report_progress(100, f"Locked '{profile_name}' for {platform}.")
+        return profile_name, platform, lock
+
+    def _versions_locked(self, result):
+        profile_name, platform, lock = result
+        QMessageBox.information(self, "Versions Locked",
+                                f"Locked {len(lock['packages'])} packages and {len(lock['artifacts'])} downloads "
+                                f"of '{profile_name}' for {platform}.")
+
+    def _lock_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while locking package versions: {message}")
+
+    def _generate_upgrade_setup(self):
+        try:
+            history = self.db_manager.get_profile_history(self.current_profile_name)
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred during setup generation: {str(e)}")
-            logging.error(f"Error during setup generation: {str(e)}")
+            QMessageBox.critical(self, "Error", f"An error occurred while reading the profile history: {str(e)}")
+            logger.error(f"Error reading history of '{self.current_profile_name}': {str(e)}")
+            return
+        if not history:
+            QMessageBox.warning(self, "No History",
+                                f"Profile '{self.current_profile_name}' has no saved revisions to upgrade from.")
+            return
+        revisions = [str(entry['revision']) for entry in reversed(history)]
+        revision, ok = QInputDialog.getItem(self, "Generate Upgrade Setup",
+                                            "Upgrade machines provisioned with revision:", revisions, 0, False)
+        if not ok:
+            return
+        # Shares the "generate" slot: both write to the output directory
+        self._start_task("generate", self._generate_upgrade_task, self.current_profile_name, self.platform,
+                         int(revision), list(self.packages), dict(self.env_vars), list(self.symlinks),
+                         list(self.custom_commands), self._generation_settings(self.current_profile_name,
+                                                                               self.platform),
+                         database=True, on_finished=self._upgrade_generated, on_failed=self._upgrade_failed,
+                         on_cancelled=self._task_cancelled)
+
+    def _generate_upgrade_task(self, worker, db_manager, profile_name, platform, revision, packages, env_vars,
+                               symlinks, custom_commands, settings):
+        from backend.script_generator import ScriptGenerator
+        from backend.archive_builder import ArchiveBuilder
+
+        worker.report_progress(5, f"Loading revision {revision} of '{profile_name}'...")
+        try:
+            base_profile = db_manager.load_profile_revision(profile_name, revision)
+        finally:
+            db_manager.close()
+        worker.check_cancelled()
+        # Changed packages are reinstalled at the versions and archive hashes a full script would use
+        packages = self._locked_packages(profile_name, platform, packages, settings['lock'])
+        package_manager = PackageManager(platform)
+        script_generator = ScriptGenerator(package_manager, symlinks, env_vars, custom_commands,
+                                           settings['stream_downloads'], settings['install_chunk_size'])
+
+        output_dir = "output"
+        self._prepare_output_dir(output_dir)
+
+        worker.report_progress(30, "Generating upgrade script...")
+        script_path = os.path.join(output_dir, "upgrade.sh")
+        with profiled(f"upgrade:{profile_name}:{platform}:r{revision}"):
+            diff = script_generator.generate_upgrade_script(base_profile, packages, script_path)
+        worker.check_cancelled()
+
+        worker.report_progress(70, "Creating archive...")
+        archive_builder = ArchiveBuilder(output_dir)
+        safe_profile_name = re.sub(r'[^\w\-]', '_', profile_name)
+        safe_os_name = re.sub(r'[^\w\-]', '_', platform)
+        archive_name = f"{safe_profile_name}_{safe_os_name}_upgrade_from_r{revision}.zip"
+        archive_builder.create_archive(archive_name)
+        worker.report_progress(100, f"Upgrade archived at {archive_name}.")
+        return archive_name, diff
+
+    def _upgrade_generated(self, result):
+        archive_name, diff = result
+        changes = "\n".join(diff.summary()) if not diff.is_empty() else "No changes."
+        QMessageBox.information(self, "Upgrade Generated",
+                                f"Upgrade script archived at {archive_name}\n\n{changes}")
+        logger.info(f"Upgrade script and archive generated at {archive_name}")
+
+    def _upgrade_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred during upgrade generation: {message}")
+
+    def _prepare_output_dir(self, output_dir):
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Clean up the output directory
+        for file in os.listdir(output_dir):
+            file_path = os.path.join(output_dir, file)
+            try:
+                if os.path.isfile(file_path):
+                    os.unlink(file_path)
+                logger.info(f"Removed old file '{file_path}' from output directory.")
+            except Exception as e:
+                logger.error(f"Error removing file '{file_path}': {str(e)}")
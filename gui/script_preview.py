@@ -0,0 +1,125 @@
+from PyQt5.QtWidgets import QDockWidget, QListView, QAbstractItemView, QMenu, QApplication
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtCore import Qt, QTimer, QModelIndex, QAbstractListModel
+from backend.script_preview import ScriptPreview
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScriptLinesModel(QAbstractListModel):
+    """
+    The preview script as a list of lines, one contiguous range per section. Replacing a section
+    only touches its range, and the view only lays out the lines that are on screen.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lines = []
+        self.counts = []  # Number of lines of each section, in script order
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def set_sections(self, texts):
+        self.beginResetModel()
+        sections = [text.splitlines() for text in texts]
+        self.lines = [line for lines in sections for line in lines]
+        self.counts = [len(lines) for lines in sections]
+        self.endResetModel()
+
+    def replace_section(self, index, text):
+        new_lines = text.splitlines()
+        first = sum(self.counts[:index])
+        old_count, new_count = self.counts[index], len(new_lines)
+        shared = min(old_count, new_count)
+        self.lines[first:first + shared] = new_lines[:shared]
+        if shared:
+            self.dataChanged.emit(self.index(first), self.index(first + shared - 1), [Qt.DisplayRole])
+        if new_count > old_count:
+            self.beginInsertRows(QModelIndex(), first + shared, first + new_count - 1)
+            self.lines[first + shared:first + shared] = new_lines[shared:]
+            self.endInsertRows()
+        elif new_count < old_count:
+            self.beginRemoveRows(QModelIndex(), first + shared, first + old_count - 1)
+            del self.lines[first + shared:first + old_count]
+            self.endRemoveRows()
+        self.counts[index] = new_count
+
+
+class ScriptPreviewDock(QDockWidget):
+    """
+    Shows the install script for the profile being edited. Edits invalidate only their table's
+    section; the next refresh re-renders that section and replaces just its lines.
+    """
+
+    def __init__(self, window):
+        super().__init__("Script Preview", window)
+        self.window = window
+        self.preview = ScriptPreview(window.platform, window.stream_downloads, window.install_chunk_size)
+        self.model = ScriptLinesModel(self)
+        self.loaded = False
+        self.view = QListView(self)
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.view.customContextMenuRequested.connect(self._context_menu)
+        self.setWidget(self.view)
+        # Edits made in one pass of the event loop (e.g. an import) are rendered once
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.refresh)
+
+        for section, model in (('packages', window.packages_model), ('env_vars', window.env_vars_model),
+                               ('symlinks', window.symlinks_model), ('custom_commands', window.commands_model)):
+            for signal in (model.modelReset, model.rowsInserted, model.rowsRemoved, model.dataChanged):
+                signal.connect(lambda *args, section=section: self.invalidate(section))
+        # Connected after MainWindow._update_platform, so window.platform is already updated
+        window.os_dropdown.currentIndexChanged.connect(self._platform_changed)
+        self.visibilityChanged.connect(lambda visible: visible and self.timer.start())
+
+    def invalidate(self, section):
+        self.preview.invalidate(section)
+        if self.isVisible():
+            self.timer.start()
+
+    def _platform_changed(self):
+        self.preview.set_platform(self.window.platform)
+        if self.isVisible():
+            self.timer.start()
+
+    def install_options_changed(self):
+        self.preview.set_install_options(self.window.stream_downloads, self.window.install_chunk_size)
+        if self.isVisible():
+            self.timer.start()
+
+    def refresh(self):
+        window = self.window
+        sections = self.preview.render(window.packages, window.env_vars, window.symlinks, window.custom_commands)
+        if not self.loaded:
+            self.model.set_sections([text for section, text, changed in sections])
+            self.loaded = True
+            return
+        for index, (section, text, changed) in enumerate(sections):
+            if changed:
+                self.model.replace_section(index, text)
+
+    def _context_menu(self, position):
+        menu = QMenu(self)
+        copy_selection_action = menu.addAction("Copy Selected Lines")
+        copy_script_action = menu.addAction("Copy Script")
+        action = menu.exec_(self.view.viewport().mapToGlobal(position))
+        if action == copy_selection_action:
+            rows = sorted(index.row() for index in self.view.selectionModel().selectedIndexes())
+            QApplication.clipboard().setText("\n".join(self.model.lines[row] for row in rows) + "\n")
+        elif action == copy_script_action:
+            QApplication.clipboard().setText(self.preview.text())
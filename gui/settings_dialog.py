@@ -1,10 +1,12 @@
 from PyQt5.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QTextEdit, QCheckBox, QMessageBox
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QTextEdit, QCheckBox, QMessageBox,
+    QFileDialog
 )
+from backend.package_list_parser import FORMATS
+from backend.profile_entries import Command, Package
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 class AddPackageDialog(QDialog):
     def __init__(self, parent=None):
@@ -75,12 +77,7 @@ class AddPackageDialog(QDialog):
         super().accept()
 
     def get_package_data(self):
-        return {
-            'name': self.package_name,
-            'version': self.package_version,
-            'repo_url': self.repo_url,
-            'download_url': self.download_url
-        }
+        return Package(self.package_name, self.package_version, self.repo_url, self.download_url)
 
 
 class AddEnvVarDialog(QDialog):
@@ -233,10 +230,7 @@ class AddCommandDialog(QDialog):
         super().accept()
 
     def get_command_data(self):
-        return {
-            'description': self.command_description,
-            'command': self.command_text
-        }
+        return Command(self.command_description, self.command_text)
 
 
 class LoadProfileDialog(QDialog):
@@ -269,4 +263,148 @@ class LoadProfileDialog(QDialog):
         self.setLayout(layout)
 
     def get_selected_profile(self):
-        return self.profile_dropdown.currentText()
\ No newline at end of file
+        return self.profile_dropdown.currentText()
+
+
+class ImportPackagesDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Import Package List")
+        self.file_path = ""
+
+        layout = QVBoxLayout()
+
+        # List format
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Format:"))
+        self.format_dropdown = QComboBox()
+        self.format_dropdown.addItems(FORMATS)
+        format_layout.addWidget(self.format_dropdown)
+        layout.addLayout(format_layout)
+
+        # Pasted output, or a file
+        layout.addWidget(QLabel("Paste the output of dpkg --get-selections, dpkg-query -W, rpm -qa, pacman -Q,\n"
+                                "brew list --versions or a Brewfile, or load it from a file:"))
+        self.list_input = QTextEdit()
+        self.list_input.setAcceptRichText(False)
+        layout.addWidget(self.list_input)
+        file_layout = QHBoxLayout()
+        self.file_label = QLabel("")
+        file_button = QPushButton("Load File...")
+        file_button.clicked.connect(self._choose_file)
+        file_layout.addWidget(self.file_label)
+        file_layout.addWidget(file_button)
+        layout.addLayout(file_layout)
+
+        # Versions
+        self.pin_checkbox = QCheckBox("Pin the listed versions")
+        self.pin_checkbox.setChecked(True)
+        layout.addWidget(self.pin_checkbox)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        import_button = QPushButton("Import")
+        import_button.clicked.connect(self.accept)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(import_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def _choose_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Package List", "",
+                                                   "All Files (*);;Brewfile (Brewfile*);;Text Files (*.txt)")
+        if file_path:
+            # The file is parsed as a stream on import instead of being loaded into the text box
+            self.file_path = file_path
+            self.file_label.setText(file_path)
+            self.list_input.setEnabled(False)
+
+    def accept(self):
+        if not self.file_path and not self.list_input.toPlainText().strip():
+            QMessageBox.warning(self, "Input Error", "Paste a package list or load one from a file.")
+            return
+        super().accept()
+
+    def get_import_options(self):
+        return self.file_path, self.list_input.toPlainText(), self.format_dropdown.currentText(), \
+            self.pin_checkbox.isChecked()
+
+
+class ProfileHistoryDialog(QDialog):
+    def __init__(self, parent=None, db_manager=None, profile_name=""):
+        super().__init__(parent)
+        self.setWindowTitle(f"Profile History - {profile_name}")
+        self.db_manager = db_manager
+        self.profile_name = profile_name
+        self.rolled_back = False
+        history = db_manager.get_profile_history(profile_name) if db_manager else []
+        revisions = [f"{entry['revision']} ({entry['created_at']:%Y-%m-%d %H:%M:%S})" for entry in history]
+
+        layout = QVBoxLayout()
+
+        # Revision selection
+        revision_layout = QHBoxLayout()
+        revision_layout.addWidget(QLabel("From Revision:"))
+        self.from_dropdown = QComboBox()
+        self.from_dropdown.addItems(revisions)
+        revision_layout.addWidget(self.from_dropdown)
+        revision_layout.addWidget(QLabel("To Revision:"))
+        self.to_dropdown = QComboBox()
+        self.to_dropdown.addItems(["Current"] + revisions)
+        revision_layout.addWidget(self.to_dropdown)
+        layout.addLayout(revision_layout)
+
+        # Diff output
+        self.diff_output = QTextEdit()
+        self.diff_output.setReadOnly(True)
+        layout.addWidget(self.diff_output)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        diff_button = QPushButton("Show Changes")
+        diff_button.clicked.connect(self._show_diff)
+        rollback_button = QPushButton("Roll Back to From Revision")
+        rollback_button.clicked.connect(self._rollback)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(diff_button)
+        button_layout.addWidget(rollback_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def _selected_revision(self, dropdown):
+        text = dropdown.currentText()
+        if not text or text == "Current":
+            return None
+        return int(text.split()[0])
+
+    def _show_diff(self):
+        old_revision = self._selected_revision(self.from_dropdown)
+        if old_revision is None:
+            return
+        try:
+            diff = self.db_manager.diff_revisions(self.profile_name, old_revision,
+                                                  self._selected_revision(self.to_dropdown))
+            self.diff_output.setPlainText("\n".join(diff.summary()) if not diff.is_empty() else "No changes.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while comparing revisions: {str(e)}")
+            logger.error(f"Error comparing revisions of '{self.profile_name}': {str(e)}")
+
+    def _rollback(self):
+        revision = self._selected_revision(self.from_dropdown)
+        if revision is None:
+            return
+        try:
+            self.db_manager.rollback_profile(self.profile_name, revision)
+            self.rolled_back = True
+            QMessageBox.information(self, "Profile Rolled Back",
+                                    f"Profile '{self.profile_name}' rolled back to revision {revision}.")
+            self.accept()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while rolling back the profile: {str(e)}")
+            logger.error(f"Error rolling back '{self.profile_name}': {str(e)}")
@@ -0,0 +1,375 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex, pyqtSignal
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileTableModel(QAbstractTableModel):
+    """
+    Table model over one section of the profile data. The model works on the list owned by
+    MainWindow (no copies), so adds, edits and removals made through it are visible to
+    the rest of the window and only emit signals for the rows they touch.
+    """
+    section = "row"
+    headers = []
+
+    def __init__(self, rows=None, parent=None):
+        super().__init__(parent)
+        self.rows = rows if rows is not None else []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        return self.cell(self.rows[index.row()], index.column())
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row = index.row()
+        if self.cell(self.rows[row], index.column()) == value:
+            return False
+        self.rows[row] = self.with_cell(self.rows[row], index.column(), value)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        logger.info(f"Updated {self.section} at row {row}: {self.rows[row]}")
+        return True
+
+    def set_rows(self, rows):
+        """Points the model at a new list, e.g. after a profile was loaded."""
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def append_row(self, row_data):
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.append(row_data)
+        self.endInsertRows()
+
+    def append_rows(self, rows):
+        """Appends many rows with a single insert notification."""
+        if not rows:
+            return
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        if not 0 <= row < len(self.rows):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def search_keys(self, first, last):
+        """Lowercased text of every column of rows ``first``..``last``, as matched by FilterProxyModel."""
+        columns = range(len(self.headers))
+        return ["\t".join(str(self.cell(row_data, column)) for column in columns).lower()
+                for row_data in self.rows[first:last + 1]]
+
+    def cell(self, row_data, column):
+        raise NotImplementedError
+
+    def with_cell(self, row_data, column, value):
+        """Returns a copy of ``row_data`` with ``column`` set to ``value``."""
+        raise NotImplementedError
+
+
+class PackageTableModel(ProfileTableModel):
+    section = "package"
+    headers = ["Package", "Version", "Repo URL", "Download URL"]
+    fields = ['name', 'version', 'repo_url', 'download_url']
+
+    def cell(self, row_data, column):
+        return row_data.get(self.fields[column], '')
+
+    def with_cell(self, row_data, column, value):
+        return row_data.replace(**{self.fields[column]: value})
+
+    def search_keys(self, first, last):
+        fields = self.fields
+        return ["\t".join([str(row_data.get(field, '')) for field in fields]).lower()
+                for row_data in self.rows[first:last + 1]]
+
+
+class SymlinkTableModel(ProfileTableModel):
+    section = "symlink"
+    headers = ["Link", "Target"]
+
+    def cell(self, row_data, column):
+        return row_data[column]
+
+    def with_cell(self, row_data, column, value):
+        link, target = row_data
+        return (value, target) if column == 0 else (link, value)
+
+    def search_keys(self, first, last):
+        return [f"{link}\t{target}".lower() for link, target in self.rows[first:last + 1]]
+
+
+class CommandTableModel(ProfileTableModel):
+    section = "command"
+    headers = ["Description", "Command"]
+    fields = ['description', 'command']
+
+    def cell(self, row_data, column):
+        return row_data.get(self.fields[column], '')
+
+    def with_cell(self, row_data, column, value):
+        return row_data.replace(**{self.fields[column]: value})
+
+    def search_keys(self, first, last):
+        fields = self.fields
+        return ["\t".join([str(row_data.get(field, '')) for field in fields]).lower()
+                for row_data in self.rows[first:last + 1]]
+
+
+class EnvVarTableModel(ProfileTableModel):
+    """
+    Environment variables are a name -> EnvVar dict; the model keeps the names in
+    row order next to it and writes every change through to the dict.
+    """
+    section = "environment variable"
+    headers = ["Variable", "Value"]
+    # Name of a variable that was added, edited or removed (both names for a rename)
+    env_var_changed = pyqtSignal(str)
+
+    def __init__(self, env_vars=None, parent=None):
+        self.env_vars = env_vars if env_vars is not None else {}
+        super().__init__(list(self.env_vars), parent)
+
+    def cell(self, row_data, column):
+        return row_data if column == 0 else self.env_vars[row_data]['value']
+
+    def search_keys(self, first, last):
+        env_vars = self.env_vars
+        return [f"{name}\t{env_vars[name]['value']}".lower() for name in self.rows[first:last + 1]]
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row = index.row()
+        key = self.rows[row]
+        if index.column() == 1:
+            if self.env_vars[key]['value'] == value:
+                return False
+            self.env_vars[key] = self.env_vars[key].replace(value=value)
+        else:
+            value = value.strip()
+            if not value or value == key or value in self.env_vars:
+                return False
+            # Rename in place so the variable keeps its position in the generated script
+            items = [(value if name == key else name, entry) for name, entry in self.env_vars.items()]
+            self.env_vars.clear()
+            self.env_vars.update(items)
+            self.rows[row] = value
+            self.env_var_changed.emit(key)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+        self.env_var_changed.emit(self.rows[row])
+        logger.info(f"Updated environment variable at row {row}: {self.rows[row]}={self.env_vars[self.rows[row]]}")
+        return True
+
+    def set_env_vars(self, env_vars):
+        self.env_vars = env_vars
+        self.set_rows(list(env_vars))
+
+    def set_env_var(self, key, entry):
+        """Adds a variable, or replaces the value of an existing one in its current row."""
+        if key in self.env_vars:
+            self.env_vars[key] = entry
+            row = self.rows.index(key)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+        else:
+            position = len(self.rows)
+            self.beginInsertRows(QModelIndex(), position, position)
+            self.env_vars[key] = entry
+            self.rows.append(key)
+            self.endInsertRows()
+        self.env_var_changed.emit(key)
+
+    def remove_row(self, row):
+        if not 0 <= row < len(self.rows):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        key = self.rows.pop(row)
+        del self.env_vars[key]
+        self.endRemoveRows()
+        self.env_var_changed.emit(key)
+
+
+class FilterProxyModel(QAbstractProxyModel):
+    """
+    Shows the rows of a ProfileTableModel whose text contains the filter string. The lowercased
+    text of each source row is kept in an index that follows source inserts, removals and edits,
+    so a keystroke only scans that list, or just the current matches when the filter grows.
+    Proxy indexes map back to source rows, so edits and removals land on the right entry.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.needle = ""
+        self._keys = None  # Source row -> search key; built on first use
+        self._rows = None  # Matching source rows in order, or None while unfiltered
+        self._pending_removal = None
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        previous = self.sourceModel()
+        if previous is not None:
+            for signal, slot in self._connections(previous):
+                signal.disconnect(slot)
+        super().setSourceModel(model)
+        for signal, slot in self._connections(model):
+            signal.connect(slot)
+        self._keys = None
+        self._apply_filter(self.needle, narrow=False)
+        self.endResetModel()
+
+    def _connections(self, model):
+        return ((model.modelAboutToBeReset, self._source_about_to_be_reset),
+                (model.modelReset, self._source_reset),
+                (model.rowsAboutToBeInserted, self._source_rows_about_to_be_inserted),
+                (model.rowsInserted, self._source_rows_inserted),
+                (model.rowsAboutToBeRemoved, self._source_rows_about_to_be_removed),
+                (model.rowsRemoved, self._source_rows_removed),
+                (model.dataChanged, self._source_data_changed))
+
+    def set_filter(self, text):
+        needle = text.strip().lower()
+        if needle == self.needle:
+            return
+        # A longer filter can only match a subset of the current matches
+        narrow = bool(self.needle) and needle.startswith(self.needle)
+        self.beginResetModel()
+        self._apply_filter(needle, narrow)
+        self.endResetModel()
+
+    def _apply_filter(self, needle, narrow):
+        self.needle = needle
+        if not needle or self.sourceModel() is None:
+            self._rows = None
+            return
+        if self._keys is None:
+            source = self.sourceModel()
+            self._keys = source.search_keys(0, source.rowCount() - 1)
+        candidates = self._rows if narrow and self._rows is not None else range(len(self._keys))
+        keys = self._keys
+        self._rows = [row for row in candidates if needle in keys[row]]
+
+    # QAbstractProxyModel interface
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        row = proxy_index.row() if self._rows is None else self._rows[proxy_index.row()]
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._rows is not None:
+            position = bisect.bisect_left(self._rows, row)
+            if position == len(self._rows) or self._rows[position] != row:
+                return QModelIndex()
+            row = position
+        return self.index(row, source_index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < self.rowCount() or not 0 <= column < self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().rowCount() if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    # Source model signals
+
+    def _source_about_to_be_reset(self):
+        self.beginResetModel()
+
+    def _source_reset(self):
+        self._keys = None
+        self._apply_filter(self.needle, narrow=False)
+        self.endResetModel()
+
+    def _source_rows_about_to_be_inserted(self, parent, first, last):
+        if self._rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _source_rows_inserted(self, parent, first, last):
+        count = last - first + 1
+        if self._keys is not None:
+            self._keys[first:first] = self.sourceModel().search_keys(first, last)
+        if self._rows is None:
+            self.endInsertRows()
+            return
+        position = bisect.bisect_left(self._rows, first)
+        shifted = [row + count for row in self._rows[position:]]
+        added = [row for row in range(first, last + 1) if self.needle in self._keys[row]]
+        if added:
+            self.beginInsertRows(QModelIndex(), position, position + len(added) - 1)
+        self._rows[position:] = added + shifted
+        if added:
+            self.endInsertRows()
+
+    def _source_rows_about_to_be_removed(self, parent, first, last):
+        if self._rows is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+        start = bisect.bisect_left(self._rows, first)
+        end = bisect.bisect_right(self._rows, last)
+        self._pending_removal = (start, end)
+        if end > start:
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+
+    def _source_rows_removed(self, parent, first, last):
+        count = last - first + 1
+        if self._keys is not None:
+            del self._keys[first:last + 1]
+        if self._rows is None:
+            self.endRemoveRows()
+            return
+        start, end = self._pending_removal
+        self._rows[start:] = [row - count for row in self._rows[end:]]
+        if end > start:
+            self.endRemoveRows()
+
+    def _source_data_changed(self, top_left, bottom_right, roles=()):
+        if self._keys is not None:
+            self._keys[top_left.row():bottom_right.row() + 1] = self.sourceModel().search_keys(
+                top_left.row(), bottom_right.row())
+        # Rows that stop matching stay visible until the filter changes, so an edit never makes them jump away
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            proxy_index = self.mapFromSource(self.sourceModel().index(row, 0))
+            if proxy_index.isValid():
+                self.dataChanged.emit(proxy_index, self.index(proxy_index.row(), self.columnCount() - 1))
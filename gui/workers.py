@@ -0,0 +1,121 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class WorkerSignals(QObject):
+    # Created on the UI thread, so slots connected here run there (queued connections). The
+    # TaskRunner owns them until ``done`` is delivered: the pool drops the Worker once run()
+    # returns, while the queued signals may still be waiting in the event loop.
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    done = pyqtSignal(str)
+
+
+class Worker(QRunnable):
+    """
+    Runs ``task(worker, *args)`` on a pool thread. The task reports progress with
+    ``worker.report_progress()`` and calls ``worker.check_cancelled()`` between steps.
+    """
+
+    def __init__(self, key, task, *args):
+        super().__init__()
+        self.key = key
+        self.task = task
+        self.args = args
+        self.signals = WorkerSignals()
+        self.result = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+
+    def run(self):
+        try:
+            result = self.task(self, *self.args)
+        except OperationCancelled:
+            logger.info(f"Task '{self.key}' cancelled.")
+            self.signals.cancelled.emit()
+        except Exception as e:
+            logger.error(f"Error in background task '{self.key}': {str(e)}")
+            self.signals.failed.emit(str(e))
+        else:
+            self.result = result
+            self.signals.finished.emit(result)
+        finally:
+            self._done_event.set()
+            self.signals.done.emit(self.key)
+
+    def report_progress(self, percent, message=""):
+        self.signals.progress.emit(percent, message)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until the task has finished; its return value is then in ``result``."""
+        return self._done_event.wait(timeout)
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise OperationCancelled()
+
+
+class TaskRunner(QObject):
+    """
+    Starts workers on a QThreadPool with at most one running task per key. Triggering a key
+    that is already running is coalesced into the running task instead of starting another.
+    """
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None, max_threads=2):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.running = {}
+
+    def start(self, key, task, *args, on_finished=None, on_failed=None, on_cancelled=None, on_progress=None):
+        """Returns the new worker, or None if a task with this key is still running."""
+        if key in self.running:
+            logger.info(f"Task '{key}' is already running, ignoring the new request.")
+            return None
+        worker = Worker(key, task, *args)
+        worker.signals.setParent(self)
+        # Slots should be methods of UI-thread objects so they run on the UI thread
+        for signal, slot in ((worker.signals.finished, on_finished), (worker.signals.failed, on_failed),
+                             (worker.signals.cancelled, on_cancelled), (worker.signals.progress, on_progress)):
+            if slot:
+                signal.connect(slot)
+        worker.signals.done.connect(self._task_done)
+        self.running[key] = worker
+        if len(self.running) == 1:
+            self.busy_changed.emit(True)
+        self.pool.start(worker)
+        return worker
+
+    def is_running(self, key):
+        return key in self.running
+
+    def cancel(self, key=None):
+        for running_key, worker in self.running.items():
+            if key is None or running_key == key:
+                worker.cancel()
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _task_done(self, key):
+        worker = self.running.pop(key, None)
+        if worker is not None:
+            worker.signals.deleteLater()
+        if not self.running:
+            self.busy_changed.emit(False)
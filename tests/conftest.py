@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The tests import the application packages (backend, database, gui) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def database_dir(tmp_path, monkeypatch):
+    """Points DBManager (and AsyncDBManager, through database_url) at a fresh database in ``tmp_path``."""
+    from sqlalchemy import create_engine
+
+    from database import models
+
+    default_engine = models.engine
+    engine = create_engine(f"sqlite:///{tmp_path / 'env_setup.db'}", echo=False)
+    monkeypatch.setattr(models, "engine", engine)
+    models.SessionLocal.configure(bind=engine)
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    models.SessionLocal.configure(bind=default_engine)
+    engine.dispose()
@@ -0,0 +1,45 @@
+import json
+import os
+
+from backend.artifact_watcher import ArtifactWatcher
+from database.db_manager import DBManager
+from database.models import Profile
+
+
+def save(db_manager, profile_name, parents=None):
+    db_manager.save_profile(profile_name, "ubuntu", [{'name': "git", 'version': ""}], {}, [], [], parents=parents)
+
+
+def test_rebuild_continues_past_profiles_that_fail_to_load(database_dir):
+    db_manager = DBManager()
+    save(db_manager, "base")
+    save(db_manager, "child", parents=["base"])
+    save(db_manager, "other")
+    # The parent disappears behind the child's back, so resolving the child fails
+    db_manager.session.query(Profile).filter_by(profile_name="base").delete()
+    db_manager.session.commit()
+    db_manager.resolved_cache.invalidate("base")
+
+    watcher = ArtifactWatcher(db_manager, str(database_dir / "out"), workers=0)
+    report = watcher.rebuild(["child", "other"], db_manager.get_change_sequence())
+
+    assert report.built == [("other", "ubuntu")]
+    assert [(profile_name, platform) for profile_name, platform, message in report.errors] == [("child", None)]
+    assert os.path.exists(database_dir / "out" / "other" / "ubuntu" / "archive.zip")
+    assert watcher.built_sequence == db_manager.get_change_sequence()
+
+
+def test_unreadable_watch_file_does_not_stop_the_others(database_dir):
+    db_manager = DBManager()
+    broken_path = database_dir / "broken.jsonl"
+    broken_path.write_bytes(b"\xff\xfe not utf-8\n")
+    export_path = database_dir / "export.jsonl"
+    export_path.write_text(json.dumps({'profile_name': "imported", 'os': "ubuntu", 'packages': [{'name': "vim"}],
+                                       'env_vars': {}, 'symlinks': [], 'custom_commands': []}) + "\n")
+
+    watcher = ArtifactWatcher(db_manager, str(database_dir / "out"), [str(broken_path), str(export_path)], workers=0)
+    report = watcher.run(once=True)
+
+    assert db_manager.get_all_profiles() == ["imported"]
+    assert report.built == [("imported", "ubuntu")]
+    assert str(broken_path) in watcher.file_stats
@@ -0,0 +1,94 @@
+import asyncio
+
+from sqlalchemy import event
+
+from database.async_db_manager import AsyncDBManager
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def open_manager(tmp_path):
+    db_manager = AsyncDBManager(f"sqlite+aiosqlite:///{tmp_path / 'env_setup.db'}")
+    await db_manager.initialize()
+    return db_manager
+
+
+async def seed(db_manager, count):
+    git = {'name': "git", 'version': "1:2.43"}
+    editor = {'value': "vim", 'append': False}
+    await db_manager.save_profile("base", "ubuntu", [git], {'EDITOR': editor}, [], [])
+    # Children are saved as their whole view; only what differs from "base" is stored
+    for index in range(count):
+        await db_manager.save_profile(f"profile-{index}", "ubuntu", [git, {'name': f"pkg-{index}", 'version': ""}],
+                                      {'EDITOR': editor, 'INDEX': {'value': str(index), 'append': False}}, [], [],
+                                      parents=["base"])
+
+
+def test_concurrent_loads_return_their_own_profiles(tmp_path):
+    async def scenario():
+        db_manager = await open_manager(tmp_path)
+        try:
+            await seed(db_manager, 20)
+            names = [f"profile-{index % 20}" for index in range(60)]
+            results = await asyncio.gather(*[db_manager.load_profile(name) for name in names],
+                                           *[db_manager.get_all_profiles() for _ in range(10)])
+            return names, results
+        finally:
+            await db_manager.close()
+
+    names, results = run(scenario())
+
+    for name, profile in zip(names, results[:60]):
+        index = name.split("-")[1]
+        assert [package['name'] for package in profile['packages']] == ["git", f"pkg-{index}"]
+        assert profile['env_vars']['INDEX']['value'] == index
+        assert profile['env_vars']['EDITOR']['value'] == "vim"
+        assert profile['parents'] == ["base"]
+    expected_names = ["base"] + [f"profile-{index}" for index in range(20)]
+    assert results[60:] == [expected_names] * 10
+
+
+def test_cancelled_save_commits_nothing_and_leaves_the_pool_usable(tmp_path):
+    async def scenario():
+        db_manager = await open_manager(tmp_path)
+        try:
+            await seed(db_manager, 2)
+            packages = [{'name': f"pkg-{index}", 'version': ""} for index in range(500)]
+            statements = []
+
+            def cancel_after_first_write(connection, cursor, statement, parameters, context, executemany):
+                # Runs on the event loop thread, so the save is cancelled at its next await
+                if statement.lstrip().upper().startswith(("INSERT", "UPDATE")) and not statements:
+                    statements.append(statement)
+                    save.cancel()
+
+            event.listen(db_manager.engine.sync_engine, "before_cursor_execute", cancel_after_first_write)
+            save = asyncio.ensure_future(db_manager.save_profile("cancelled", "ubuntu", packages,
+                                                                 {'A': {'value': "1", 'append': False}}, [], []))
+            try:
+                await save
+            except asyncio.CancelledError:
+                pass
+            event.remove(db_manager.engine.sync_engine, "before_cursor_execute", cancel_after_first_write)
+
+            after_cancel = (save.cancelled(), statements, await db_manager.get_all_profiles(),
+                            await db_manager.load_profile("cancelled"), await db_manager.get_profile_revision("cancelled"))
+            # Every pooled connection still works, for writes as well as reads
+            await asyncio.gather(*[db_manager.save_profile(f"after-{index}", "ubuntu", [], {}, [], [])
+                                   for index in range(3)])
+            loads = await asyncio.gather(*[db_manager.load_profile("profile-1") for _ in range(20)])
+            return after_cancel, await db_manager.get_all_profiles(), loads
+        finally:
+            await db_manager.close()
+
+    (cancelled, statements, names, profile, revision), names_after, loads = run(scenario())
+
+    assert cancelled
+    assert statements
+    assert names == ["base", "profile-0", "profile-1"]
+    assert profile is None
+    assert revision is None
+    assert sorted(names_after) == sorted(names + ["after-0", "after-1", "after-2"])
+    assert all([package['name'] for package in loaded['packages']] == ["git", "pkg-1"] for loaded in loads)
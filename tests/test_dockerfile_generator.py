@@ -0,0 +1,31 @@
+import zlib
+
+from backend.dockerfile_generator import DockerfileGenerator, MIN_GROUP_SPREAD
+from backend.package_manager import PackageManager
+from backend.profile_entries import Command, EnvVar
+
+
+def generator():
+    return DockerfileGenerator(PackageManager("ubuntu"), [("/usr/local/bin/py", "/usr/bin/python3")],
+                               {'EDITOR': EnvVar("vim")}, [Command("hello", "echo hello")])
+
+
+def test_adding_a_package_changes_only_its_group_layer():
+    packages = [{'name': f"pkg-{index:03d}", 'version': ""} for index in range(100)]
+    added = {'name': "pkg-050a", 'version': ""}
+    # Not a group boundary, so it joins an existing group instead of splitting one
+    assert zlib.crc32(added['name'].encode()) % MIN_GROUP_SPREAD != 0
+
+    before = generator().layers(packages)
+    after = generator().layers(packages + [added])
+
+    assert before[:2] == after[:2] == ["FROM ubuntu:22.04", "ENV DEBIAN_FRONTEND=noninteractive"]
+    assert len(before) == len(after)
+    changed = [index for index, (old, new) in enumerate(zip(before, after)) if old != new]
+    assert len(changed) == 1
+    affected = changed[0]
+    assert "pkg-050a" in after[affected] and "pkg-050a" not in before[affected]
+    # Every install layer before the affected group is reused from the cache
+    assert all(layer.startswith("RUN apt-get") for layer in before[2:affected])
+    assert before[:affected] == after[:affected]
+    assert before[affected + 1:] == after[affected + 1:]
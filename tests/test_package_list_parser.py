@@ -0,0 +1,25 @@
+from backend.package_list_parser import detect_format, parse_package_list
+
+
+def test_dpkg_query_list_starting_with_a_removed_package():
+    # dpkg-query -W prints no version for removed packages that still have config files
+    lines = ['acpid\t\n', 'adduser\t3.118\n', 'apt\t2.6.1\n']
+
+    report = parse_package_list(lines)
+
+    assert [(package['name'], package['version']) for package in report.packages] == [
+        ("adduser", "3.118"), ("apt", "2.6.1")]
+    assert report.skipped == [(1, "acpid\t")]
+
+
+def test_detect_format_keeps_a_trailing_tab():
+    assert detect_format("acpid\t") == "dpkg-query"
+    assert detect_format("acpid\tinstall") == "dpkg-selections"
+    assert detect_format("acpid") == "names"
+
+
+def test_dpkg_query_skips_empty_versions_in_the_middle():
+    report = parse_package_list(['adduser\t3.118\r\n', 'acpid\t\r\n', 'apt\t2.6.1\r\n'], "dpkg-query")
+
+    assert [package['name'] for package in report.packages] == ["adduser", "apt"]
+    assert report.skipped == [(2, "acpid\t")]
@@ -0,0 +1,12 @@
+from backend.profile_entries import Command, EnvVar, Package
+
+
+def test_entries_equal_only_entries_of_the_same_type():
+    package = Package("git", "1:2.43")
+
+    assert package == Package("git", "1:2.43")
+    assert hash(package) == hash(Package("git", "1:2.43"))
+    assert package != package.to_dict()
+    assert package.to_dict() == {'name': "git", 'version': "1:2.43", 'repo_url': "", 'download_url': ""}
+    assert Command("a", "b") != ("a", "b")
+    assert len({EnvVar("1"), EnvVar("1"), EnvVar("1", append=True)}) == 2
@@ -0,0 +1,56 @@
+import asyncio
+
+from backend.render_service import RenderService
+from database.async_db_manager import AsyncDBManager
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+def test_cache_follows_the_revisions_of_the_profile_and_its_parents(tmp_path):
+    async def scenario():
+        db_manager = AsyncDBManager(f"sqlite+aiosqlite:///{tmp_path / 'env_setup.db'}")
+        await db_manager.initialize()
+        loads = []
+        load_profile = db_manager.load_profile
+
+        async def counting_load_profile(profile_name):
+            loads.append(profile_name)
+            return await load_profile(profile_name)
+
+        db_manager.load_profile = counting_load_profile
+        service = RenderService(db_manager)
+        await service.start(port=0)
+        try:
+            await db_manager.save_profile("base", "ubuntu", [{'name': "git", 'version': ""}], {}, [], [])
+            await db_manager.save_profile("child", "ubuntu", [{'name': "git", 'version': ""}], {}, [], [],
+                                          parents=["base"])
+            path = "/profiles/child/ubuntu/install.sh"
+            first = await fetch(service.port, path)
+            second = await fetch(service.port, path)
+            loads_before_change = len(loads)
+            # Changing only the parent changes the child's view
+            await db_manager.save_profile("base", "ubuntu", [{'name': "git", 'version': ""},
+                                                             {'name': "vim", 'version': ""}], {}, [], [])
+            third = await fetch(service.port, path)
+            missing = await fetch(service.port, "/profiles/missing/ubuntu/install.sh")
+            return first, second, loads_before_change, third, missing, len(loads)
+        finally:
+            await service.close()
+            await db_manager.close()
+
+    first, second, loads_before_change, third, missing, loads = asyncio.run(scenario())
+
+    assert first[0] == second[0] == third[0] == 200
+    assert first[1] == second[1]
+    assert loads_before_change == 1
+    assert b"vim" in third[1] and b"vim" not in first[1]
+    assert missing[0] == 404
+    assert loads == 2
@@ -0,0 +1,38 @@
+from backend.profile_entries import EnvVar
+from backend.script_generator import ScriptGenerator
+from backend.package_manager import PackageManager
+from backend.script_preview import ScriptPreview
+
+PACKAGES = [{'name': f"pkg-{index}", 'version': ""} for index in range(5)] + [
+    {'name': "tool", 'version': "", 'download_url': "https://example.com/tool-1.0.tar.gz"}]
+ENV_VARS = {'EDITOR': EnvVar("vim")}
+
+
+def render(preview):
+    return preview.render(PACKAGES, ENV_VARS, [], [])
+
+
+def full_script(stream_downloads, install_chunk_size):
+    generator = ScriptGenerator(PackageManager("ubuntu"), [], ENV_VARS, [], stream_downloads, install_chunk_size)
+    return generator.render_script(PACKAGES)
+
+
+def test_install_options_rerender_only_the_packages_section():
+    preview = ScriptPreview("ubuntu")
+    render(preview)
+    assert preview.text() == full_script(False, 0)
+
+    preview.set_install_options(True, 2)
+    changed = [section for section, text, section_changed in render(preview) if section_changed]
+
+    assert changed == ["packages"]
+    assert preview.text() == full_script(True, 2)
+    assert "stream_install" in preview.text()
+
+
+def test_unchanged_install_options_keep_the_cache():
+    preview = ScriptPreview("ubuntu", True, 2)
+    render(preview)
+    preview.set_install_options(True, 2)
+
+    assert not any(section_changed for section, text, section_changed in render(preview))
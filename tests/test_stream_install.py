@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from backend.package_manager import PackageManager
+from backend.script_generator import ScriptGenerator
+from tools.script_sandbox import ScriptSandbox
+
+
+@pytest.mark.parametrize("served, sha256, message", [
+    (False, "", "no sandbox download"),
+    (False, "0" * 64, "no sandbox download"),
+    (True, "0" * 64, "Checksum mismatch"),
+])
+def test_failed_stream_install_leaves_nothing_in_opt(served, sha256, message):
+    url = "https://example.com/tool-1.0.tar.gz"
+    packages = [{'name': "tool", 'version': "", 'repo_url': "", 'download_url': url, 'sha256': sha256}]
+    with ScriptSandbox() as sandbox:
+        if served:
+            sandbox.add_download(url, "tool", "tar.gz")
+        generator = ScriptGenerator(PackageManager("ubuntu"), [], {}, [], stream_downloads=True)
+        returncode, output, phases, elapsed = sandbox.run_script(generator.render_script(packages))
+
+        assert returncode != 0
+        assert message in output
+        assert os.listdir(os.path.join(sandbox.root, "opt")) == []
@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from backend.package_manager import PackageManager
+from backend.profile_entries import EnvVar
+from backend.script_generator import ScriptGenerator
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None or shutil.which("sed") is None,
+                                reason="needs bash and sed")
+
+
+def profile(env_vars, packages=()):
+    return {'os': "ubuntu", 'packages': list(packages), 'env_vars': env_vars, 'symlinks': [],
+            'custom_commands': []}
+
+
+def run_script(path, home):
+    env = dict(os.environ, HOME=str(home))
+    return subprocess.run(["bash", str(path)], env=env, capture_output=True, text=True)
+
+
+def test_upgrade_script_rewrites_env_vars_on_linux(tmp_path):
+    home = tmp_path / "home"
+    home.mkdir()
+    (home / ".bashrc").write_text('export EDITOR="vi"\nexport OLD_VAR="1"\nalias ll="ls -l"\n')
+    base = profile({'EDITOR': EnvVar("vi"), 'OLD_VAR': EnvVar("1")})
+    env_vars = {'EDITOR': EnvVar("vim"), 'NEW_VAR': EnvVar("2")}
+    generator = ScriptGenerator(PackageManager("ubuntu"), [], env_vars, [])
+    script_path = tmp_path / "upgrade.sh"
+    diff = generator.generate_upgrade_script(base, [], str(script_path))
+    assert list(diff.env_vars_removed) == ["OLD_VAR"]
+
+    result = run_script(script_path, home)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "upgrade completed successfully" in result.stdout
+    assert (home / ".bashrc").read_text().splitlines() == [
+        'export EDITOR="vim"',
+        'alias ll="ls -l"',
+        'export NEW_VAR="2"',
+    ]
+
+
+def test_upgrade_script_skips_variables_missing_from_shell_config(tmp_path):
+    home = tmp_path / "home"
+    home.mkdir()
+    (home / ".bashrc").write_text("")
+    base = profile({'OLD_VAR': EnvVar("1")})
+    generator = ScriptGenerator(PackageManager("ubuntu"), [], {}, [])
+    script_path = tmp_path / "upgrade.sh"
+    generator.generate_upgrade_script(base, [], str(script_path))
+
+    result = run_script(script_path, home)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (home / ".bashrc").read_text() == ""
+
+
+def test_macos_scripts_keep_the_bsd_sed_form(tmp_path):
+    base = {'os': "macos", 'packages': [], 'env_vars': {'OLD_VAR': EnvVar("1")}, 'symlinks': [],
+            'custom_commands': []}
+    generator = ScriptGenerator(PackageManager("macos"), [], {'EDITOR': EnvVar("vim")}, [])
+    script_path = tmp_path / "upgrade.command"
+    generator.generate_upgrade_script(base, [], str(script_path))
+
+    script = script_path.read_text()
+    assert "sed -i '' -e '/^export OLD_VAR=/d' ~/.zshrc" in script
+    assert "sed -i '' -e 's|export EDITOR=.*$|export EDITOR=\"vim\"|' ~/.zshrc" in script
+
+
+@pytest.mark.parametrize("stream_downloads", [False, True])
+def test_upgrade_script_relinks_reinstalled_url_packages(stream_downloads):
+    from tools.script_sandbox import ScriptSandbox
+
+    base = profile({}, [{'name': "tool", 'version': "", 'repo_url': "",
+                         'download_url': "https://example.com/tool-1.0.tar.gz"}])
+    packages = [{'name': "tool", 'version': "", 'repo_url': "", 'download_url': "https://example.com/tool-2.0.tar.gz"}]
+    with ScriptSandbox() as sandbox:
+        provisioned = sandbox.run_profile(base, stream_downloads=stream_downloads)
+        assert provisioned.problems == []
+        sandbox.add_download(packages[0]['download_url'], "tool", "tar.gz")
+        generator = ScriptGenerator(PackageManager("ubuntu"), [], {}, [], stream_downloads)
+        script_path = os.path.join(sandbox.directory, "upgrade.sh")
+        diff = generator.generate_upgrade_script(base, packages, script_path)
+        assert [new['download_url'] for old, new in diff.packages_changed] == [packages[0]['download_url']]
+
+        with open(script_path) as script_file:
+            returncode, output, phases, elapsed = sandbox.run_script(script_file.read())
+
+        assert returncode == 0, output
+        link = os.path.join(sandbox.root, "usr", "local", "bin", "tool")
+        assert os.readlink(link) == os.path.join(sandbox.root, "opt", "tool", "bin", "tool")
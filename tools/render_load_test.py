@@ -0,0 +1,136 @@
+"""
+Load-test harness for the render service (backend/render_service.py).
+
+Against a running server:
+    python -m tools.render_load_test --url http://127.0.0.1:8765 --profile default --platform ubuntu
+
+Self-contained, with a synthetic profile in a throwaway database:
+    python -m tools.render_load_test --self-hosted --packages 5000 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import quote, urlsplit
+
+
+async def fetch(host, port, path, etag=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        request = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close"]
+        if etag:
+            request.append(f"If-None-Match: {etag}")
+        writer.write(("\r\n".join(request) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return int(lines[0].split(" ")[1]), headers, body
+
+
+async def run_load(host, port, path, total_requests, concurrency, conditional):
+    # Prime the server (and learn the ETag) with one request
+    status, headers, body = await fetch(host, port, path)
+    if status != 200:
+        raise SystemExit(f"Priming request for {path} failed with HTTP {status}: {body[:200]!r}")
+    etag = headers.get("etag") if conditional else None
+
+    latencies = []
+    statuses = Counter()
+    received = 0
+    queue = asyncio.Queue()
+    for _ in range(total_requests):
+        queue.put_nowait(None)
+
+    async def client():
+        nonlocal received
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                status, _, body = await fetch(host, port, path, etag)
+            except (ConnectionError, OSError):
+                status, body = "error", b""
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+            received += len(body)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, statuses, received
+
+
+def report(path, elapsed, latencies, statuses, received):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"Target:      {path}")
+    print(f"Requests:    {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"Latency:     p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, "
+          f"p99 {quantiles[98] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"Throughput:  {received / elapsed / 1024 / 1024:.2f} MiB/s")
+    print(f"Statuses:    {dict(statuses)}")
+
+
+async def self_hosted(args):
+    from backend.render_service import RenderService
+    from database.async_db_manager import AsyncDBManager
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_manager = AsyncDBManager(f"sqlite+aiosqlite:///{os.path.join(temp_dir, 'load_test.db')}")
+        await db_manager.initialize()
+        packages = [{'name': f"package-{i}", 'version': f"1.{i}" if i % 3 else "", 'repo_url': "",
+                     'download_url': f"https://example.com/tool-{i}.tar.gz" if i % 50 == 0 else ""}
+                    for i in range(args.packages)]
+        env_vars = {f"VAR_{i}": {"value": f"/opt/value-{i}", "append": False} for i in range(args.packages // 10)}
+        symlinks = [(f"/usr/local/bin/link-{i}", f"/opt/target-{i}") for i in range(args.packages // 10)]
+        commands = [{'description': f"step {i}", 'command': f"echo step {i}"} for i in range(args.packages // 10)]
+        await db_manager.save_profile(args.profile, args.platform, packages, env_vars, symlinks, commands)
+
+        service = RenderService(db_manager, max_concurrency=args.max_concurrency)
+        await service.start("127.0.0.1", 0)
+        try:
+            path = f"/profiles/{quote(args.profile)}/{args.platform}/{args.artifact}"
+            report(path, *await run_load("127.0.0.1", service.port, path, args.requests, args.concurrency,
+                                         args.conditional))
+        finally:
+            await service.close()
+            await db_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the setup script render service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="base URL of a running service")
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--platform", default="ubuntu")
+    parser.add_argument("--artifact", default="install.sh", choices=["install.sh", "archive.zip"])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--conditional", action="store_true",
+                        help="send If-None-Match with the primed ETag (measures 304 responses)")
+    parser.add_argument("--self-hosted", action="store_true",
+                        help="start the service in-process against a throwaway database")
+    parser.add_argument("--packages", type=int, default=1000, help="synthetic profile size for --self-hosted")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="service render limit for --self-hosted")
+    args = parser.parse_args()
+
+    if args.self_hosted:
+        asyncio.run(self_hosted(args))
+        return
+    url = urlsplit(args.url)
+    path = f"/profiles/{quote(args.profile)}/{args.platform}/{args.artifact}"
+    report(path, *asyncio.run(run_load(url.hostname, url.port or 80, path, args.requests, args.concurrency,
+                                       args.conditional)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Runs generated install scripts in a sandbox: a throwaway HOME, a fake root for system paths and
+stub apt-get/yum/dnf/pacman/brew/wget/curl/sudo commands that record their calls (and can add
+latency or fail on given packages), so scripts can be checked and timed without touching the system.
+
+    python -m tools.script_sandbox --packages 200 --platform ubuntu --latency 0.05
+    python -m tools.script_sandbox --profile default --runs 8 --parallel 4 --chunk-size 50 --fail pkg-a
+
+Absolute paths under /opt, /usr, /tmp, /etc, /var and the top directories of the profile's
+symlinks are rewritten into the fake root before the script runs. Custom commands run as written
+(with the same rewriting), so leave them out with --skip-commands for profiles that are not yours.
+After a run, the shell config file, the symlinks, the package manager calls and the unpacked
+downloads are checked against the profile, and the time of each script phase is reported.
+"""
+import argparse
+import hashlib
+import io
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+STUB_TOOLS = ("apt-get", "yum", "dnf", "pacman", "brew", "wget", "curl", "sudo")
+PACKAGE_MANAGERS = ("apt-get", "yum", "dnf", "pacman", "brew")
+SYSTEM_PREFIXES = {"opt", "usr", "tmp", "etc", "var"}
+# Never redirected: the script and the stubs need the real ones
+PROTECTED_PREFIXES = {"bin", "sbin", "lib", "lib64", "dev", "proc", "sys"}
+# Phase -> the messages the generated script prints when the phase starts and ends
+PHASE_MARKERS = {
+    'env_vars': ("Setting environment variables...", "Environment variables set."),
+    'symlinks': ("Creating symlinks...", "Symlinks created."),
+    'packages': ("Installing packages...", "Packages installed."),
+    'custom_commands': ("Executing custom commands...", "Custom commands executed."),
+}
+
+STUB_SCRIPT = r"""#!/bin/bash
+# Sandbox stub for package managers, downloaders and sudo: see tools/script_sandbox.py
+tool="${0##*/}"
+printf '%s\t%s\n' "$tool" "$*" >> "$SANDBOX_DIR/calls.log"
+count=0
+for argument; do
+  case "$argument" in -*) ;; *) count=$((count + 1)) ;; esac
+done
+if [ -n "$SANDBOX_LATENCY$SANDBOX_PACKAGE_LATENCY" ]; then
+  sleep "$(awk -v count="$count" \
+    'BEGIN { print ENVIRON["SANDBOX_LATENCY"] + count * ENVIRON["SANDBOX_PACKAGE_LATENCY"] }')"
+fi
+download() {
+  local file
+  file=$(awk -F '\t' -v url="$1" '$1 == url { print $2 }' "$SANDBOX_DIR/downloads.tsv")
+  if [ -z "$file" ]; then
+    echo "$tool: no sandbox download for $1" >&2
+    return 1
+  fi
+  if [ -z "$2" ] || [ "$2" = "-" ]; then cat "$file"; else cp "$file" "$2"; fi
+}
+case "$tool" in
+  sudo)
+    exec "$@" ;;
+  wget)
+    url="" output=""
+    while [ "$#" -gt 0 ]; do
+      case "$1" in
+        -O) output="$2"; shift ;;
+        -qO-|-O-) output="-" ;;
+        -*) ;;
+        *) url="$1" ;;
+      esac
+      shift
+    done
+    download "$url" "$output" || exit 8 ;;
+  curl)
+    download "${!#}" - || exit 22 ;;
+  brew)
+    if [ "$1" = "bundle" ]; then
+      cat >> "$SANDBOX_DIR/Brewfile"
+    fi ;;
+  *)
+    for argument; do
+      for failing in $SANDBOX_FAIL_PACKAGES; do
+        case "$argument" in
+          "$failing"|"$failing="*) echo "$tool: unable to install $argument" >&2; exit 100 ;;
+        esac
+      done
+    done ;;
+esac
+"""
+
+
+class SandboxResult:
+    def __init__(self, returncode, output, phases, elapsed, calls, problems):
+        self.returncode = returncode
+        self.output = output
+        self.phases = phases  # Phase -> seconds, for the phases the script ran
+        self.elapsed = elapsed
+        self.calls = calls  # (tool, argument string) in call order
+        self.problems = problems
+
+
+class ScriptSandbox:
+    """
+    One throwaway directory with a fake root, HOME and stub commands. run_profile() generates a
+    profile's install script, runs it and checks the result; run_script() runs any script.
+    """
+
+    def __init__(self, latency=0.0, package_latency=0.0, fail_packages=(), keep=False):
+        self.latency = latency
+        self.package_latency = package_latency
+        self.fail_packages = list(fail_packages)
+        self.keep = keep
+        self.directory = tempfile.mkdtemp(prefix="script_sandbox_")
+        self.root = os.path.join(self.directory, "root")
+        self.home = os.path.join(self.directory, "home")
+        self.bin = os.path.join(self.directory, "bin")
+        self.prefixes = set(SYSTEM_PREFIXES)
+        for path in (self.home, self.bin, os.path.join(self.root, "opt"), os.path.join(self.root, "tmp"),
+                     os.path.join(self.root, "usr", "local", "bin")):
+            os.makedirs(path, exist_ok=True)
+        stub_path = os.path.join(self.bin, "sandbox-stub")
+        with open(stub_path, "w") as stub_file:
+            stub_file.write(STUB_SCRIPT)
+        os.chmod(stub_path, 0o755)
+        for tool in STUB_TOOLS:
+            os.symlink(stub_path, os.path.join(self.bin, tool))
+        self.downloads = {}  # URL -> archive file served by the wget/curl stubs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self.keep:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def rooted(self, text):
+        """Rewrites absolute paths under the redirected prefixes into the fake root."""
+        prefixes = "|".join(re.escape(prefix) for prefix in sorted(self.prefixes - PROTECTED_PREFIXES))
+        return re.sub(rf"(?<![\w.:/~$-])/({prefixes})(?=/|\b)", lambda match: self.root + match.group(0), text)
+
+    def add_download(self, url, name, archive_format):
+        """Serves an archive holding ``name/bin/name`` for ``url``; returns its sha256."""
+        content = _fake_archive(name, archive_format)
+        path = os.path.join(self.directory, "downloads", f"{len(self.downloads)}.{archive_format}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as archive_file:
+            archive_file.write(content)
+        self.downloads[url] = path
+        return hashlib.sha256(content).hexdigest()
+
+    def run_script(self, script):
+        """Runs ``script`` (the generated text) and returns (returncode, output, phases, elapsed)."""
+        script_path = os.path.join(self.directory, "install.sh")
+        with open(script_path, "w") as script_file:
+            script_file.write(self.rooted(script))
+        with open(os.path.join(self.directory, "downloads.tsv"), "w") as downloads_file:
+            downloads_file.writelines(f"{url}\t{path}\n" for url, path in self.downloads.items())
+        env = dict(os.environ, HOME=self.home, PATH=f"{self.bin}{os.pathsep}{os.environ.get('PATH', '')}",
+                   SANDBOX_DIR=self.directory, SANDBOX_FAIL_PACKAGES=" ".join(self.fail_packages),
+                   SANDBOX_LATENCY=str(self.latency or ""), SANDBOX_PACKAGE_LATENCY=str(self.package_latency or ""))
+        env.pop("ENV_SETUP_CHECKPOINT_DIR", None)
+
+        starts = {marker: phase for phase, (marker, _) in PHASE_MARKERS.items()}
+        ends = {marker: phase for phase, (_, marker) in PHASE_MARKERS.items()}
+        phases, started_at, output = {}, {}, []
+        started = time.perf_counter()
+        process = subprocess.Popen(["bash", script_path], cwd=self.directory, env=env, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            now = time.perf_counter()
+            output.append(line)
+            line = line.rstrip("\n")
+            if line in starts:
+                started_at[starts[line]] = now
+            elif line in ends and ends[line] in started_at:
+                phases[ends[line]] = now - started_at.pop(ends[line])
+        returncode = process.wait()
+        return returncode, "".join(output), phases, time.perf_counter() - started
+
+    def calls(self):
+        try:
+            with open(os.path.join(self.directory, "calls.log")) as calls_file:
+                return [tuple(line.rstrip("\n").split("\t", 1)) for line in calls_file]
+        except FileNotFoundError:
+            return []
+
+    def run_profile(self, profile, platform="ubuntu", run_commands=True, verify_downloads=False, **options):
+        """
+        Generates and runs the install script of ``profile`` (a resolved profile view) for
+        ``platform``; ``options`` go to ScriptGenerator (stream_downloads, install_chunk_size).
+        With ``verify_downloads``, URL packages are pinned to the sha256 of their sandbox archive.
+        """
+        from backend.package_manager import PackageManager
+        from backend.profile_ir import InstallFromUrl, compile_packages
+        from backend.script_generator import ScriptGenerator
+
+        packages = [dict(package) for package in profile['packages']]
+        for package, operation in zip(packages, compile_packages(packages)):
+            if isinstance(operation, InstallFromUrl):
+                sha256 = self.add_download(operation.url, operation.name, operation.archive_format)
+                if verify_downloads:
+                    package['sha256'] = sha256
+        for link, target in profile['symlinks']:
+            self.prefixes.update(path.split("/")[1] for path in (link, target) if path.startswith("/"))
+
+        custom_commands = profile['custom_commands'] if run_commands else []
+        script_generator = ScriptGenerator(PackageManager(platform), profile['symlinks'], profile['env_vars'],
+                                           custom_commands, **options)
+        ir = script_generator.compile(packages)
+        returncode, output, phases, elapsed = self.run_script(script_generator.render_script(packages, ir=ir))
+        calls = self.calls()
+        problems = [] if returncode == 0 else [f"script exited with status {returncode}"]
+        problems.extend(self.check(ir, script_generator.package_manager.backend, calls))
+        return SandboxResult(returncode, output, phases, elapsed, calls, problems)
+
+    def check(self, ir, backend, calls):
+        """Returns what the sandbox is missing compared to the compiled profile ``ir``."""
+        from backend.profile_ir import InstallFromUrl
+
+        problems = []
+        config_path = os.path.join(self.home, backend.shell_config_file.replace("~/", "", 1))
+        try:
+            with open(config_path) as config_file:
+                config_lines = set(config_file.read().splitlines())
+        except FileNotFoundError:
+            config_lines = set()
+        for name, value, append in ir['env_vars']:
+            value = self.rooted(value)
+            expected = f'export PATH="{value}:$PATH"' if name == "PATH" else f'export {name}="{value}"'
+            if expected not in config_lines:
+                problems.append(f"{backend.shell_config_file} lacks {expected}")
+
+        for link, target in ir['symlinks']:
+            path = self.rooted(link)
+            if not os.path.islink(path):
+                problems.append(f"symlink {link} was not created")
+            elif os.readlink(path) != self.rooted(target):
+                problems.append(f"symlink {link} points to {os.readlink(path)}, not {target}")
+
+        arguments = set()
+        for tool, argument_string in calls:
+            if tool in PACKAGE_MANAGERS:
+                arguments.update(argument_string.split())
+        brewfile_path = os.path.join(self.directory, "Brewfile")
+        brewfile = open(brewfile_path).read() if os.path.exists(brewfile_path) else ""
+        for operation in ir['packages']:
+            if isinstance(operation, InstallFromUrl):
+                installed = os.path.join(self.root, "opt", operation.name, "bin", operation.name)
+                if not os.path.exists(installed):
+                    problems.append(f"{operation.name} was not unpacked from {operation.url}")
+                if not os.path.islink(os.path.join(self.root, "usr", "local", "bin", operation.name)):
+                    problems.append(f"{operation.name} was not linked into /usr/local/bin")
+            elif brewfile:
+                if not re.search(rf'^\w+ "([^"]*/)?{re.escape(operation.name)}"', brewfile, re.MULTILINE):
+                    problems.append(f"{operation.name} is not in the Brewfile passed to brew bundle")
+            elif backend.format_package(operation) not in arguments:
+                problems.append(f"{backend.format_package(operation)} was never passed to a package manager")
+        return problems
+
+
+def _fake_archive(name, archive_format):
+    executable = f"#!/bin/sh\necho {name}\n".encode()
+    buffer = io.BytesIO()
+    if archive_format == "zip":
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr(zipfile.ZipInfo(f"{name}/bin/{name}"), executable)
+        return buffer.getvalue()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        info = tarfile.TarInfo(f"{name}/bin/{name}")
+        info.size, info.mode = len(executable), 0o755
+        archive.addfile(info, io.BytesIO(executable))
+    tar = buffer.getvalue()
+    if archive_format == "xz":
+        import lzma
+        return lzma.compress(tar)
+    if archive_format == "zst":
+        # No zstd module in the standard library; the zstd tool the script needs does the job
+        return subprocess.run(["zstd", "-q", "-c"], input=tar, stdout=subprocess.PIPE, check=True).stdout
+    import gzip
+    return gzip.compress(tar)
+
+
+def run_once(profile, platform, args):
+    with ScriptSandbox(args.latency, args.package_latency, args.fail, keep=args.keep) as sandbox:
+        result = sandbox.run_profile(profile, platform, run_commands=not args.skip_commands,
+                                     verify_downloads=args.verify_downloads,
+                                     stream_downloads=args.stream_downloads, install_chunk_size=args.chunk_size)
+        if args.keep:
+            print(f"Sandbox kept at {sandbox.directory}")
+        return result
+
+
+def report(results):
+    failed = [result for result in results if result.problems]
+    print(f"Runs:            {len(results)}, {len(failed)} with problems")
+    print(f"Total:           median {statistics.median(r.elapsed for r in results):.3f}s, "
+          f"max {max(r.elapsed for r in results):.3f}s")
+    for phase in PHASE_MARKERS:
+        timings = [result.phases[phase] for result in results if phase in result.phases]
+        if timings:
+            print(f"{phase + ':':17s}median {statistics.median(timings):.3f}s, max {max(timings):.3f}s")
+    calls = [tool for tool, _ in results[0].calls]
+    print(f"Calls:           {', '.join(f'{tool} x{calls.count(tool)}' for tool in sorted(set(calls)))}")
+    for result in failed[:1]:
+        for problem in result.problems[:20]:
+            print(f"Problem:         {problem}")
+        if len(result.problems) > 20:
+            print(f"Problem:         ... and {len(result.problems) - 20} more")
+        print("Output tail:\n" + "".join(result.output.splitlines(True)[-10:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run generated install scripts against stub package managers.")
+    parser.add_argument("--profile", help="stored profile to run (default: a synthetic profile)")
+    parser.add_argument("--packages", type=int, default=100, help="size of the synthetic profile")
+    parser.add_argument("--platform", default="ubuntu")
+    parser.add_argument("--runs", type=int, default=1, help="sandboxes to run, each in its own directory")
+    parser.add_argument("--parallel", type=int, default=1, help="sandboxes running at the same time")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stubbed call")
+    parser.add_argument("--package-latency", type=float, default=0.0,
+                        help="seconds added per package argument of a stubbed call")
+    parser.add_argument("--fail", action="append", default=[], metavar="PACKAGE",
+                        help="make the stub package managers fail for PACKAGE (repeatable)")
+    parser.add_argument("--stream-downloads", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=0)
+    parser.add_argument("--verify-downloads", action="store_true",
+                        help="pin downloads to the sha256 of their sandbox archives")
+    parser.add_argument("--skip-commands", action="store_true", help="leave the custom commands out")
+    parser.add_argument("--keep", action="store_true", help="keep the sandbox directories for inspection")
+    args = parser.parse_args()
+
+    if args.profile:
+        from database.db_manager import DBManager
+        profile = DBManager().load_profile(args.profile)
+        if profile is None:
+            raise SystemExit(f"Profile '{args.profile}' not found.")
+    else:
+        from benchmarks.synthetic import make_profile
+        profile = make_profile(args.packages)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        results = list(executor.map(lambda _: run_once(profile, args.platform.lower(), args), range(args.runs)))
+    report(results)
+    sys.exit(1 if any(result.problems for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()